@@ -3,15 +3,22 @@ Implements both an assembler, which converts Red Code instructions to a form
 suitable for the Core, and a loader, which maps the assembled instructions into
 the Core with a specified base address.
 
+The assembler makes two passes over the program. The first records the value
+of every label and EQU constant, and the second assembles the instructions,
+folding each operand expression to a single integer. Labels evaluate to the
+distance from the instruction being assembled to the labelled instruction.
+The start of the program may be given by ORG or by END, and END also marks
+the end of the program.
+
 >>> from assemblytoken import AssemblyToken as Token
 >>> from core import Core
 >>> from assembler import Assembler
 >>> core = Core()
 >>> assembler = Assembler()
 >>> opcode_token = Token(Token.MOV, 'MOV', 1, 1)
->>> a_val_token = Token(Token.INT, '0', 1, 1)
+>>> a_val_token = Token(Token.INT, 0, 1, 1)
 >>> comma_token = Token(Token.COMMA, ',', 1, 1)
->>> b_val_token = Token(Token.INT, '1', 1, 1)
+>>> b_val_token = Token(Token.INT, 1, 1, 1)
 >>> newline_token = Token(Token.NEWLINE, '\\n', 1, 1)
 >>> eof_token = Token(Token.EOF, '', 1, 1)
 >>> tokenlist = [opcode_token, a_val_token, comma_token, b_val_token, newline_token, eof_token]
@@ -19,7 +26,7 @@ the Core with a specified base address.
 >>> core.print_instruction(1)
 MOV 0, 1
 >>> opcode_token = Token(Token.JMP, 'JMP', 1, 1)
->>> a_val_token = Token(Token.INT, '3', 1, 1)
+>>> a_val_token = Token(Token.INT, 3, 1, 1)
 >>> tokenlist = [opcode_token, a_val_token, newline_token, eof_token]
 >>> assembler.assemble(tokenlist, 2, core)
 >>> core.print_instruction(2)
@@ -38,6 +45,28 @@ DAT 1
 >>> assembler.assemble(tokenlist, 5, core)
 >>> core.print_instruction(5)
 DAT 3, 1
+>>> minus_token = Token(Token.MINUS, '-', 1, 1)
+>>> tokenlist = [opcode_token, minus_token, a_val_token, newline_token, eof_token]
+>>> assembler.assemble(tokenlist, 6, core)
+>>> core.print_instruction(6)
+DAT -3
+>>> from lexer import Lexer
+>>> source = ['step  EQU 4 ; the bombing step',
+...           'bomb  DAT #0',
+...           'start ADD #step*2, bomb',
+...           '      MOV bomb, @bomb',
+...           '      JMP start',
+...           '      END start']
+>>> image = assembler.image(Lexer().tokenize_string('\\n'.join(source)))
+>>> print(len(image), assembler.start)
+4 1
+>>> core.load(image, 10)
+>>> for address in range(10, 14):
+...     core.print_instruction(address)
+DAT #0
+ADD #8, -1
+MOV -2, @-2
+JMP -2
 """
 
 from assemblytoken import AssemblyToken as Token
@@ -50,8 +79,13 @@ class Assembler:
         self.__tokenlist = []
         self.__tokenindex = 0
         self.__token = None
-        self.__core = None
-        self.__next_addr = 0  # The core address into which to map the instruction
+        self.__image = []        # The assembled instructions
+        self.__lines = []        # The source line of each instruction
+        self.__labels = {}       # Maps each label to its instruction offset
+        self.__equates = {}      # Maps each EQU constant to its expression
+        self.__start = 0         # Offset of the first instruction to execute
+        self.__offset = 0        # Offset of the instruction being assembled
+        self.__evaluating = []   # EQU constants being evaluated
 
     def __advance(self):
         """
@@ -86,44 +120,216 @@ class Assembler:
         :param core: The core in which to install the program
         """
 
-        if address < 0 or address > core.coresize:
+        if address < 0 or address >= core.coresize:
             raise IndexError('Invalid core address specified')
 
+        core.load(self.image(tokenlist), address)
+
+    @property
+    def start(self):
+        """
+        Returns the offset, from the start of the most recently
+        assembled image, of the first instruction to execute.
+        """
+
+        return self.__start
+
+    @property
+    def lines(self):
+        """
+        Returns the source line number of each instruction in
+        the most recently assembled image.
+        """
+
+        return self.__lines
+
+    @property
+    def symbols(self):
+        """
+        Returns the symbol table of the most recently assembled
+        image, as a pair of dictionaries mapping labels to their
+        offsets and EQU constants to their expression tokens.
+        """
+
+        return self.__labels, self.__equates
+
+    def image(self, tokenlist, symbols=None, offset=0):
+        """
+        Assembles a Red Code program into an image, which is
+        a list of instructions in the form taken by the core,
+        with the first instruction at offset zero. An image
+        may be loaded into any number of cores at any base
+        address without being assembled again.
+
+        :param tokenlist: The list of tokens representing a
+        Red Code program
+        :param symbols: If given, a symbol table as returned by the
+        symbols property, in which case the first pass is skipped
+        and the tokens are assembled as part of that program
+        :param offset: The offset of the first instruction within the
+        program, for use with a given symbol table
+
+        :return: The list of assembled instructions
+        """
+
         self.__tokenlist = tokenlist
+        self.__image = []
+        self.__lines = []
+        self.__evaluating = []
+
+        if symbols is None:
+            # First pass, to record the value of every symbol
+            self.__define_symbols()
+
+        else:
+            self.__labels, self.__equates = symbols
+
+        # Second pass, to assemble the instructions
         self.__tokenindex = 0
-        self.__core = core
-        self.__next_addr = address
+        self.__token = self.__tokenlist[self.__tokenindex]
+        self.__offset = offset
+
+        # Assemble all instructions until the end of file, or
+        # an END pseudo-opcode, is reached
+        while self.__token.category not in [Token.EOF, Token.END]:
+            self.__statement()
+            self.__consume(Token.NEWLINE)
+
+        return self.__image
+
+    def __define_symbols(self):
+        """
+        Makes the first pass over the program, recording the
+        offset of every label, the expression of every EQU
+        constant and the start of the program.
+        """
 
-        # Assign the first token
+        self.__labels = {}
+        self.__equates = {}
+        self.__start = 0
+
+        self.__tokenindex = 0
         self.__token = self.__tokenlist[self.__tokenindex]
 
-        # Assemble all instructions until the end of file is
-        # reached
+        offset = 0     # Offset of the next instruction
+        pending = []   # Labels awaiting an instruction
+        start = None   # Expression giving the start of the program
+
         while self.__token.category != Token.EOF:
-            self.__instruction()
+            # Collect any labels at the start of the line
+            while self.__token.category == Token.LABEL:
+                pending.append(self.__token)
+                self.__advance()  # Advance past the label
+
+                if self.__token.category == Token.COLON:
+                    self.__advance()  # Advance past the optional colon
+
+            category = self.__token.category
+
+            if category == Token.EQU:
+                if len(pending) != 1:
+                    raise RuntimeError('EQU requires a single label in line ' +
+                                       str(self.__token.line))
+
+                self.__advance()  # Advance past the EQU
+                self.__define(pending[0], self.__rest_of_line())
+                pending = []
+
+            elif category in [Token.ORG, Token.END]:
+                self.__advance()  # Advance past the pseudo-opcode
+                expression = self.__rest_of_line()
+
+                if len(expression) > 0:
+                    start = expression
+
+                if category == Token.END:
+                    break
+
+            elif category != Token.NEWLINE:
+                # An instruction, to which any pending labels refer.
+                # Labels on a line of their own refer to the next
+                # instruction.
+                for label in pending:
+                    self.__define(label, offset)
+
+                pending = []
+                offset += 1
+                self.__rest_of_line()
+
             self.__consume(Token.NEWLINE)
 
-            # Increment the address pointer
-            if self.__next_addr == self.__core.coresize - 1:
-                self.__next_addr = 0
+        # Any remaining labels refer to the end of the program
+        for label in pending:
+            self.__define(label, offset)
 
-            else:
-                self.__next_addr += 1
+        if start is not None:
+            self.__start = self.__evaluate(start, 0)
+
+    def __define(self, token, value):
+        """
+        Defines a symbol
+
+        :param token: The label token naming the symbol
+        :param value: The offset of a label, or the list of
+        expression tokens of an EQU constant
+        """
+
+        if token.lexeme in self.__labels or token.lexeme in self.__equates:
+            raise RuntimeError('Duplicate symbol ' + token.lexeme +
+                               ' in line ' + str(token.line))
+
+        if isinstance(value, list):
+            self.__equates[token.lexeme] = value
+
+        else:
+            self.__labels[token.lexeme] = value
+
+    def __rest_of_line(self):
+        """
+        Advances to the end of the current line
+
+        :return: The list of tokens passed over
+        """
+
+        tokens = []
+        while self.__token.category not in [Token.NEWLINE, Token.EOF]:
+            tokens.append(self.__token)
+            self.__advance()
+
+        return tokens
+
+    def __statement(self):
+        """
+        Assembles a single line of the program
+        """
+
+        # Skip any labels, which were recorded in the first pass
+        while self.__token.category in [Token.LABEL, Token.COLON]:
+            self.__advance()
+
+        if self.__token.category in [Token.EQU, Token.ORG]:
+            # Also recorded in the first pass
+            self.__rest_of_line()
+
+        elif self.__token.category not in [Token.NEWLINE, Token.END]:
+            self.__lines.append(self.__token.line)
+            self.__instruction()
+            self.__offset += 1
 
     def __instruction(self):
         """
-        Assembles the Red Code program given a list of tokens,
-        and maps to the core at the specified base address.
+        Assembles a single Red Code instruction, and appends
+        it to the image.
         """
 
         if self.__token.category in [Token.MOV, Token.SEQ, Token.SNE, Token.CMP,
                                      Token.ADD, Token.SUB, Token.MUL, Token.DIV,
-                                     Token.MOD]:
+                                     Token.MOD, Token.SLT, Token.LDP, Token.STP,
+                                     Token.JMZ, Token.JMN, Token.DJN]:
             # Assemble all instructions that take two operands
             self.__two_instr()
 
-        elif self.__token.category in [Token.SLT, Token.LDP, Token.STP, Token.JMP,
-                                       Token.JMZ, Token.JMN, Token.DJN, Token.SPL]:
+        elif self.__token.category in [Token.JMP, Token.SPL]:
             # Assemble all instructions that take one operand
             self.__one_instr()
 
@@ -137,7 +343,7 @@ class Assembler:
             self.__dat_instr()
 
         else:
-            raise RuntimeError('Invalid opcode in line ', self.__token.line)
+            raise RuntimeError('Invalid opcode in line ' + str(self.__token.line))
 
     def __two_instr(self):
         """
@@ -162,9 +368,9 @@ class Assembler:
         # Record the B-field value
         b_field_val = self.__operand()
 
-        # Map the instruction into the core at the next address
-        self.__core.put(opcode, a_field_mode, a_field_val,
-                        b_field_mode, b_field_val, self.__next_addr)
+        # Append the instruction to the image
+        self.__image.append([opcode, a_field_mode, a_field_val,
+                             b_field_mode, b_field_val])
 
     def __one_instr(self):
         """
@@ -180,9 +386,9 @@ class Assembler:
         # Record the A-field value
         a_field_val = self.__operand()
 
-        # Map the instruction into the core at the next address
-        self.__core.put(opcode, a_field_mode, a_field_val,
-                        Token.NULL, Token.NULL, self.__next_addr)
+        # Append the instruction to the image
+        self.__image.append([opcode, a_field_mode, a_field_val,
+                             Token.NULL, Token.NULL])
 
     def __zero_instr(self):
         """
@@ -192,9 +398,9 @@ class Assembler:
         # Record the opcode
         opcode = self.__opcode()
 
-        # Map the instruction into the core at the next address
-        self.__core.put(opcode, Token.NULL, Token.NULL,
-                        Token.NULL, Token.NULL, self.__next_addr)
+        # Append the instruction to the image
+        self.__image.append([opcode, Token.NULL, Token.NULL,
+                             Token.NULL, Token.NULL])
 
     def __dat_instr(self):
         """
@@ -230,9 +436,9 @@ class Assembler:
             a_field_mode = Token.NULL
             a_field_val = Token.NULL
 
-        # Map the instruction into the core at the next address
-        self.__core.put(opcode, a_field_mode, a_field_val,
-                        b_field_mode, b_field_val, self.__next_addr)
+        # Append the instruction to the image
+        self.__image.append([opcode, a_field_mode, a_field_val,
+                             b_field_mode, b_field_val])
 
     def __opcode(self):
         """
@@ -254,7 +460,8 @@ class Assembler:
         :return: The addressing mode value
         """
 
-        if self.__token.category == Token.INT:
+        if self.__token.category in [Token.INT, Token.MINUS, Token.PLUS,
+                                     Token.LABEL, Token.LEFTPAREN]:
             # No addressing mode specified, so assume the default
             # mode of direct
             mode = Token.DIRECT
@@ -264,34 +471,179 @@ class Assembler:
             self.__advance()  # Advance past the addressing mode
 
         else:
-            raise RuntimeError('Invalid A-field addressing mode in line ', self.__token.line)
+            raise RuntimeError('Invalid addressing mode in line ' + str(self.__token.line))
 
         return mode
 
     def __operand(self):
         """
-        Assembles an operand value.
+        Assembles an operand value, folding its expression
+        to a single integer.
 
         :return: The value of the operand
         """
 
-        negative = False
+        return self.__expression()
+
+    def __expression(self):
+        """
+        Evaluates an expression, consisting of terms
+        separated by additions and subtractions.
+
+        :return: The value of the expression
+        """
+
+        value = self.__term()
+
+        while self.__token.category in [Token.PLUS, Token.MINUS]:
+            operator = self.__token.category
+            self.__advance()  # Advance past the operator
+
+            if operator == Token.PLUS:
+                value += self.__term()
+
+            else:
+                value -= self.__term()
+
+        return value
+
+    def __term(self):
+        """
+        Evaluates a term, consisting of factors separated
+        by multiplications, divisions and moduli.
+
+        :return: The value of the term
+        """
+
+        value = self.__factor()
+
+        while self.__token.category in [Token.MULTIPLY, Token.DIVIDE, Token.MODULUS]:
+            operator = self.__token.category
+            line = self.__token.line
+            self.__advance()  # Advance past the operator
+
+            right = self.__factor()
+
+            if operator == Token.MULTIPLY:
+                value *= right
+                continue
+
+            if right == 0:
+                raise RuntimeError('Division by zero in line ' + str(line))
+
+            # Division truncates towards zero, as in C
+            quotient = abs(value) // abs(right)
+            if (value < 0) != (right < 0):
+                quotient = -quotient
+
+            if operator == Token.DIVIDE:
+                value = quotient
+
+            else:
+                value -= right * quotient
+
+        return value
+
+    def __factor(self):
+        """
+        Evaluates a factor, which is a number, a symbol or a
+        parenthesised expression, with optional unary signs.
+
+        :return: The value of the factor
+        """
+
         if self.__token.category == Token.MINUS:
-            negative = True
             self.__advance()  # Advance past the unary minus
+            return -self.__factor()
 
-        if self.__token.category == Token.INT:
-            operand = self.__token.lexeme
-            self.__advance()  # Advance past the operand
+        elif self.__token.category == Token.PLUS:
+            self.__advance()  # Advance past the unary plus
+            return self.__factor()
 
-            if negative:
-                # Negate the operand
-                operand = operand - (2 * operand)
+        elif self.__token.category == Token.INT:
+            value = self.__token.lexeme
+            self.__advance()  # Advance past the number
+            return value
 
-            return operand
+        elif self.__token.category == Token.LABEL:
+            value = self.__symbol(self.__token)
+            self.__advance()  # Advance past the symbol
+            return value
+
+        elif self.__token.category == Token.LEFTPAREN:
+            self.__advance()  # Advance past the parenthesis
+            value = self.__expression()
+            self.__consume(Token.RIGHTPAREN)
+            return value
 
         else:
-            raise RuntimeError('Invalid operand in line ', self.__token.line)
+            raise RuntimeError('Invalid operand in line ' + str(self.__token.line))
+
+    def __symbol(self, token):
+        """
+        Evaluates a symbol at the offset of the instruction
+        being assembled.
+
+        :param token: The label token naming the symbol
+
+        :return: The value of the symbol
+        """
+
+        name = token.lexeme
+
+        if name in self.__labels:
+            # Labels are relative to the current instruction
+            return self.__labels[name] - self.__offset
+
+        elif name in self.__equates:
+            if name in self.__evaluating:
+                raise RuntimeError('Circular definition of ' + name +
+                                   ' in line ' + str(token.line))
+
+            self.__evaluating.append(name)
+            value = self.__evaluate(self.__equates[name], self.__offset)
+            self.__evaluating.pop()
+
+            return value
+
+        else:
+            raise RuntimeError('Undefined symbol ' + name +
+                               ' in line ' + str(token.line))
+
+    def __evaluate(self, tokens, offset):
+        """
+        Evaluates a complete expression held in a separate
+        list of tokens, such as the definition of an EQU
+        constant, then returns to the current token.
+
+        :param tokens: The list of expression tokens
+        :param offset: The offset at which labels are evaluated
+
+        :return: The value of the expression
+        """
+
+        if len(tokens) == 0:
+            raise RuntimeError('Missing expression in line ' +
+                               str(self.__token.line))
+
+        # Save the current position
+        saved = (self.__tokenlist, self.__tokenindex, self.__token, self.__offset)
+
+        # Terminate the expression with a newline
+        self.__tokenlist = tokens + [Token(Token.NEWLINE, '\n', 0, tokens[-1].line)]
+        self.__tokenindex = 0
+        self.__token = self.__tokenlist[self.__tokenindex]
+        self.__offset = offset
+
+        value = self.__expression()
+
+        if self.__token.category != Token.NEWLINE:
+            raise RuntimeError('Invalid expression in line ' + str(self.__token.line))
+
+        # Restore the current position
+        (self.__tokenlist, self.__tokenindex, self.__token, self.__offset) = saved
+
+        return value
 
     if __name__ == "__main__":
         import doctest
@@ -6,7 +6,8 @@ assembly language. A token consists of
 four items:
 
 category    Category of the token
-lexeme      Token in string form
+lexeme      Token in string form, or the integer
+            value of an INT token
 column      Column in which token starts
 line        Line in the file on which token appears
 """
@@ -59,30 +60,61 @@ class AssemblyToken:
         COMMA = 26
         NULL =  27  # Denotes a null field
 
+        # Symbols
+
+        LABEL = 28
+
+        # Pseudo-opcodes
+
+        EQU = 29
+        ORG = 30
+        END = 31
+
+        # Expression operators and punctuation
+
+        PLUS =       32
+        MULTIPLY =   33
+        DIVIDE =     34
+        MODULUS =    35
+        LEFTPAREN =  36
+        RIGHTPAREN = 37
+        COLON =      38
+
         # Displayable names for each token category
         catnames = ['DAT', 'MOV', 'ADD', 'SUB', 'MUL',
                     'DIV', 'MOD', 'JMP', 'JMZ', 'JMN', 'DJN', 'SPL',
                     'CMP', 'SEQ', 'SNE', 'SLT', 'LDP', 'STP', 'NOP',
                     'IMMEDIATE', 'DIRECT', 'INDIRECT', 'INT',
-                    'MINUS', 'EOF', 'NEWLINE', 'COMMA', 'NULL']
+                    'MINUS', 'EOF', 'NEWLINE', 'COMMA', 'NULL',
+                    'LABEL', 'EQU', 'ORG', 'END', 'PLUS', 'MULTIPLY',
+                    'DIVIDE', 'MODULUS', 'LEFTPAREN', 'RIGHTPAREN',
+                    'COLON']
 
         smalltokens = {'#': IMMEDIATE, '$': DIRECT,
                        '@': INDIRECT, '': EOF,
-                       '\n': NEWLINE, ',': COMMA, '-': MINUS}
+                       '\n': NEWLINE, ',': COMMA, '-': MINUS,
+                       '+': PLUS, '*': MULTIPLY, '/': DIVIDE,
+                       '%': MODULUS, '(': LEFTPAREN, ')': RIGHTPAREN,
+                       ':': COLON}
 
-        # Dictionary of opcodes
+        # Dictionary of opcodes and pseudo-opcodes
         keywords = {'DAT': DAT, 'MOV': MOV,
                     'ADD': ADD, 'SUB': SUB, 'MUL': MUL,
                     'DIV': DIV, 'MOD': MOD, 'JMP': JMP,
                     'JMZ': JMZ, 'JMN': JMN, 'DJN': DJN,
                     'SPL': SPL, 'CMP': CMP, 'SEQ': SEQ,
                     'SNE': SNE, 'SLT': SLT, 'LDP': LDP,
-                    'STP': STP, 'NOP': NOP}
+                    'STP': STP, 'NOP': NOP,
+                    'EQU': EQU, 'ORG': ORG, 'END': END}
+
+        # Tokens are created in large numbers, so they carry
+        # no per-instance dictionary
+        __slots__ = ('category', 'lexeme', 'column', 'line')
 
         def __init__(self, category, lexeme, column, line):
 
             self.category = category  # Category of the token
-            self.lexeme = lexeme      # Token in string form
+            self.lexeme = lexeme      # Token in string form, or INT value
             self.column = column      # Column in which token starts
             self.line = line          # Line on which token appears
 
@@ -0,0 +1,272 @@
+#! /usr/bin/python
+
+"""
+Assembles a corpus of Red Code programs, held either in a
+directory or in a zip or tar archive, across a pool of
+worker processes. A file which fails to assemble does not
+abort the batch; instead its error is recorded against the
+file and the remaining files are assembled as normal.
+
+The results may be written out as one image file per
+program, in JSON form, together with a manifest listing
+every file, its image and any error encountered.
+
+>>> from batch import BatchAssembler, assemble_source
+>>> name, image, error = assemble_source('imp', 'MOV 0, 1\\n')
+>>> print(image, error)
+[[1, 20, 0, 20, 1]] None
+>>> name, image, error = assemble_source('bad', 'MOV 0, ?1\\n')
+>>> print(image, error)
+None SyntaxError: Syntax error in line 1
+>>> batch = BatchAssembler(workers=1)
+>>> results = batch.assemble_sources([('imp', 'MOV 0, 1'), ('bad', 'MOV 0')])
+>>> for result in results:
+...     print(result['name'], result['length'], result['error'])
+imp 1 None
+bad 0 RuntimeError: Expecting COMMA in line 1
+>>> import json, os, tempfile
+>>> directory = os.path.join(tempfile.mkdtemp(), 'images')
+>>> batch.write(batch.assemble_sources([('imp', 'MOV 0, 1'), ('../escape', 'MOV 0, 1')]),
+...             directory)
+>>> with open(os.path.join(directory, 'manifest.json')) as infile:
+...     manifest = json.load(infile)
+>>> for entry in manifest['programs']:
+...     print(entry['name'], entry['image'], entry['error'])
+imp imp.json None
+../escape None OSError: Image would be written outside the output directory
+>>> print(os.path.exists(os.path.join(directory, '..', 'escape.json')))
+False
+"""
+
+import json
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from assembler import Assembler
+from lexer import Lexer
+
+
+def assemble_source(name, source):
+    """
+    Lexes and assembles a single Red Code program. This is
+    the unit of work carried out by each worker process, so
+    any error is caught and returned rather than raised.
+
+    :param name: The name of the program
+    :param source: The Red Code source as a string
+
+    :return: A tuple of the name, the assembled image (None on
+    failure) and the error message (None on success)
+    """
+
+    try:
+        tokens = Lexer().tokenize_string(source)
+        return name, Assembler().image(tokens), None
+
+    except Exception as error:
+        return name, None, type(error).__name__ + ': ' + str(error)
+
+
+class BatchAssembler:
+
+    def __init__(self, workers=None, chunksize=16, extensions=None):
+        """
+        Initialise the batch assembler.
+
+        :param workers: The number of worker processes, defaulting
+        to the number of processors
+        :param chunksize: The number of programs sent to a worker at once
+        :param extensions: If given, a list of file extensions (e.g. ['.red'])
+        to which the batch is restricted, otherwise all files are assembled
+        """
+
+        self.__workers = workers
+        self.__chunksize = chunksize
+        self.__extensions = extensions
+
+    def assemble(self, path):
+        """
+        Assembles every program in the specified directory
+        or archive.
+
+        :param path: The path of a directory, zip file or tar file
+
+        :return: A list of results, one per program
+        """
+
+        return self.assemble_sources(self.__read_sources(path))
+
+    def assemble_sources(self, sources):
+        """
+        Assembles every program in a list of sources.
+
+        :param sources: A list of (name, source) pairs
+
+        :return: A list of results, one per program, in the same
+        order as the sources. Each result is a dictionary holding
+        the name, length, image and error of the program.
+        """
+
+        names = [name for name, source in sources]
+        texts = [source for name, source in sources]
+
+        if self.__workers == 1:
+            # Avoid the cost of a pool for a single worker
+            outcomes = map(assemble_source, names, texts)
+
+        else:
+            with ProcessPoolExecutor(max_workers=self.__workers) as executor:
+                outcomes = list(executor.map(assemble_source, names, texts,
+                                             chunksize=self.__chunksize))
+
+        results = []
+        for name, image, error in outcomes:
+            results.append({'name': name,
+                            'length': len(image) if image is not None else 0,
+                            'image': image,
+                            'error': error})
+
+        return results
+
+    def write(self, results, directory):
+        """
+        Writes each successfully assembled image to a JSON file
+        in the specified directory, mirroring the relative path
+        of its source, along with a manifest.json file describing
+        the whole batch. A program whose name would place its image
+        outside the directory, as a crafted archive member such as
+        ../name or /name may, is not written, and is recorded in the
+        manifest as failed.
+
+        :param results: The list of results returned by assemble()
+        :param directory: The output directory
+        """
+
+        root = os.path.realpath(directory)
+
+        entries = []
+        for result in results:
+            entry = {'name': result['name'],
+                     'length': result['length'],
+                     'image': None,
+                     'error': result['error']}
+
+            if result['image'] is not None:
+                entry['image'] = result['name'] + '.json'
+                filename = os.path.realpath(os.path.join(root, entry['image']))
+
+                if os.path.commonpath([root, filename]) != root:
+                    entry['image'] = None
+                    entry['error'] = 'OSError: Image would be written outside the output directory'
+                    entries.append(entry)
+                    continue
+
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+                with open(filename, 'w') as outfile:
+                    json.dump(result['image'], outfile)
+
+            entries.append(entry)
+
+        manifest = {'assembled': len([entry for entry in entries
+                                      if entry['error'] is None]),
+                    'failed': len([entry for entry in entries
+                                   if entry['error'] is not None]),
+                    'programs': entries}
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'manifest.json'), 'w') as outfile:
+            json.dump(manifest, outfile, indent=1)
+
+    def __read_sources(self, path):
+        """
+        Reads the source of every program in a directory or archive.
+
+        :param path: The path of a directory, zip file or tar file
+
+        :return: A list of (name, source) pairs, sorted by name
+        """
+
+        sources = []
+
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for filename in files:
+                    fullname = os.path.join(root, filename)
+                    name = os.path.relpath(fullname, path).replace(os.sep, '/')
+
+                    if self.__wanted(name):
+                        with open(fullname, 'rb') as infile:
+                            sources.append((name, self.__decode(infile.read())))
+
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and self.__wanted(info.filename):
+                        sources.append((info.filename,
+                                        self.__decode(archive.read(info))))
+
+        elif tarfile.is_tarfile(path):
+            with tarfile.open(path) as archive:
+                for member in archive.getmembers():
+                    if member.isfile() and self.__wanted(member.name):
+                        infile = archive.extractfile(member)
+                        sources.append((member.name,
+                                        self.__decode(infile.read())))
+
+        else:
+            raise OSError('Not a directory or archive: ' + path)
+
+        return sorted(sources)
+
+    def __wanted(self, name):
+        """
+        Returns True if the named file should be assembled
+
+        :param name: The name of the file
+        """
+
+        if self.__extensions is None:
+            return True
+
+        return os.path.splitext(name)[1] in self.__extensions
+
+    @staticmethod
+    def __decode(data):
+        """
+        Decodes the raw contents of a source file. Undecodable
+        bytes are replaced, so that they are reported as syntax
+        errors for that file alone.
+
+        :param data: The file contents as bytes
+
+        :return: The source as a string
+        """
+
+        return data.decode('utf-8', errors='replace').replace('\r\n', '\n')
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Assemble a corpus of Red Code programs')
+    parser.add_argument('source', help='directory, zip file or tar file of Red Code programs')
+    parser.add_argument('output', help='directory to which images and the manifest are written')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('-e', '--extension', action='append', dest='extensions',
+                        help='only assemble files with this extension (repeatable)')
+    args = parser.parse_args()
+
+    batch = BatchAssembler(workers=args.workers, extensions=args.extensions)
+    results = batch.assemble(args.source)
+    batch.write(results, args.output)
+
+    for result in results:
+        if result['error'] is not None:
+            print(result['name'] + ': ' + result['error'])
+
+    print(len(results), 'programs,',
+          len([result for result in results if result['error'] is None]), 'assembled')
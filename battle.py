@@ -0,0 +1,403 @@
+#! /usr/bin/python
+
+"""
+Classes to run battles between Red Code warriors. A warrior
+is an assembled image, which is assembled once and may then
+be loaded into any number of cores. A match consists of a
+number of rounds, in each of which the warriors are loaded
+into a new core and executed until either a single warrior
+survives (or none, if only one warrior is fighting), or the
+maximum number of cycles has been executed.
+
+A round with one survivor is a win for that warrior and a
+loss for the others. Otherwise each survivor scores a tie,
+and the others a loss. A win scores three points and a tie
+one point.
+
+Each warrior has its own P-space, which survives from one
+round of the match to the next.
+
+>>> from battle import Match, Warrior
+>>> imp = Warrior.from_source('Imp', 'MOV 0, 1')
+>>> dwarf = Warrior.from_source('dwarf', 'start ADD #4, bomb\\n MOV bomb, @bomb\\n'
+...                                       ' JMP start\\nbomb DAT #0, #0')
+>>> print(dwarf.name, dwarf.length, dwarf.start)
+dwarf 4 0
+>>> print(Warrior('Late', dwarf.image, 2).key == dwarf.key)
+False
+>>> match = Match([imp, dwarf], coresize=800, max_cycles=2000)
+>>> print(match.positions(0))
+[0, 400]
+>>> print(Match([imp, dwarf], coresize=800, seed=7).positions(3))
+[0, 513]
+>>> result = match.run(rounds=2)
+>>> print(result.wins, result.losses, result.ties)
+[0, 0] [0, 0] [2, 2]
+>>> print(result.score(0), result.rounds, result.cycles)
+2 2 4000
+>>> match = Match([imp, dwarf], coresize=800, max_cycles=2000, ownership=True)
+>>> result = match.run(rounds=1)
+>>> print(result.coverage, result.hits, result.self_hits)
+[799, 1] [1601, 1202] [0, 269]
+>>> counter = Warrior.from_source('Counter', '''
+...         LDP #1, count
+...         ADD #1, count
+...         STP count, #1
+... loop    JMP loop
+... count   DAT #0
+... ''')
+>>> match = Match([counter], coresize=800, max_cycles=10)
+>>> result = match.run(rounds=3)
+>>> print(match.pspace.cells[0][:2].tolist())
+[1, 3]
+"""
+
+import os
+import time
+from array import array
+
+from assembler import Assembler
+from core import Core
+from interpreter import Interpreter
+from lexer import Lexer
+from placement import Placement
+from pspace import PSpace
+
+
+def image_key(image, start=0):
+    """
+    Returns a hash of an image and the offset of its first
+    instruction to execute, which identifies a warrior in
+    caches and stores of results
+
+    :param image: The list of assembled instructions
+    :param start: The offset of the first instruction to execute
+
+    :return: The hash, as 16 bytes
+    """
+
+    import hashlib  # Only needed by caches, so not imported at start-up
+
+    values = array('q', [start])
+    for instruction in image:
+        values.extend(instruction)
+
+    return hashlib.blake2b(values.tobytes(), digest_size=16).digest()
+
+
+class Warrior:
+    """
+    Class to model a warrior, which is an assembled
+    image along with its name and the offset of its
+    first instruction to execute.
+    """
+
+    def __init__(self, name, image, start=0):
+        """
+        Initialise the warrior
+
+        :param name: The name of the warrior
+        :param image: The list of assembled instructions
+        :param start: The offset of the first instruction to execute
+        """
+
+        self.name = name
+        self.image = image
+        self.start = start
+
+    @property
+    def length(self):
+        """
+        Returns the number of instructions in the warrior.
+        """
+
+        return len(self.image)
+
+    @property
+    def key(self):
+        """
+        Returns the hash of the image and start of the
+        warrior, as a hexadecimal string.
+        """
+
+        return image_key(self.image, self.start).hex()
+
+    @staticmethod
+    def from_source(name, source):
+        """
+        Assembles a warrior from Red Code source
+
+        :param name: The name of the warrior
+        :param source: The Red Code source as a string
+
+        :return: The warrior
+        """
+
+        assembler = Assembler()
+        image = assembler.image(Lexer().tokenize_string(source))
+
+        return Warrior(name, image, assembler.start)
+
+    @staticmethod
+    def from_file(file):
+        """
+        Assembles a warrior from a Red Code file, naming
+        it after the file
+
+        :param file: The path of the Red Code file
+
+        :return: The warrior
+        """
+
+        assembler = Assembler()
+        image = assembler.image(Lexer().tokenize(file))
+        name = os.path.splitext(os.path.basename(file))[0]
+
+        return Warrior(name, image, assembler.start)
+
+
+class MatchResult:
+    """
+    Class to model the result of a match, which is the
+    number of wins, losses and ties of each warrior.
+    """
+
+    def __init__(self, count):
+        """
+        Initialise the result with no rounds
+
+        :param count: The number of warriors in the match
+        """
+
+        self.wins = [0] * count
+        self.losses = [0] * count
+        self.ties = [0] * count
+        self.rounds = 0  # Number of rounds fought
+        self.cycles = 0  # Total number of cycles executed
+
+        # Coverage and hit counts of each warrior, totalled over
+        # the rounds, if ownership was tracked
+        self.coverage = None
+        self.hits = None
+        self.self_hits = None
+
+    def record(self, survivors, cycles, ownership=None):
+        """
+        Records the result of a round
+
+        :param survivors: The numbers of the warriors which survived
+        :param cycles: The number of cycles executed in the round
+        :param ownership: The Ownership at the end of the round,
+        if ownership was tracked
+        """
+
+        if ownership is not None:
+            if self.coverage is None:
+                self.coverage = [0] * len(self.wins)
+                self.hits = [0] * len(self.wins)
+                self.self_hits = [0] * len(self.wins)
+
+            for index in range(len(self.wins)):
+                self.coverage[index] += ownership.coverage[index]
+                self.hits[index] += ownership.hits[index]
+                self.self_hits[index] += ownership.self_hits[index]
+
+        for index in range(len(self.wins)):
+            if index not in survivors:
+                self.losses[index] += 1
+
+            elif len(survivors) == 1:
+                self.wins[index] += 1
+
+            else:
+                self.ties[index] += 1
+
+        self.rounds += 1
+        self.cycles += cycles
+
+    def score(self, index):
+        """
+        Returns the score of a warrior
+
+        :param index: The number of the warrior
+
+        :return: Three points per win and one per tie
+        """
+
+        return 3 * self.wins[index] + self.ties[index]
+
+    def to_dict(self):
+        """
+        Returns the result as a dictionary, suitable for
+        conversion to JSON.
+        """
+
+        result = {'wins': self.wins, 'losses': self.losses, 'ties': self.ties,
+                  'scores': [self.score(index) for index in range(len(self.wins))],
+                  'rounds': self.rounds, 'cycles': self.cycles}
+
+        if self.coverage is not None:
+            result['coverage'] = self.coverage
+            result['hits'] = self.hits
+            result['self_hits'] = self.self_hits
+
+        return result
+
+
+class Match:
+
+    def __init__(self, warriors, coresize=8000, max_cycles=80000, max_processes=None,
+                 ownership=False, read_limit=None, write_limit=None,
+                 pspace=None, pspace_size=None, metrics=None, seed=None, separation=100):
+        """
+        Initialise the match
+
+        :param warriors: The list of warriors
+        :param coresize: The size of the core
+        :param max_cycles: The maximum number of cycles in each round
+        :param max_processes: The maximum number of processes per
+        warrior, defaulting to the size of the core
+        :param ownership: If True, the coverage and hit counts
+        of each warrior are tracked
+        :param read_limit: The read limit, defaulting to the size of the core
+        :param write_limit: The write limit, defaulting to the size of the core
+        :param pspace: The PSpace of the warriors, as saved by an earlier
+        match, otherwise a new P-space is created
+        :param pspace_size: The number of P-space cells of each warrior
+        in a new P-space, defaulting to a sixteenth of the size of the core
+        :param metrics: An optional Metrics, in which the rounds and
+        throughput of the match are recorded
+        :param seed: If given, the warriors are placed at random
+        positions, chosen from this seed, in each round, otherwise
+        they are spread evenly through the core
+        :param separation: The minimum number of words between
+        warriors placed at random
+        """
+
+        if sum(warrior.length for warrior in warriors) > coresize:
+            raise RuntimeError('Warriors do not fit in the core')
+
+        self.warriors = warriors
+        self.coresize = coresize
+        self.max_cycles = max_cycles
+        self.max_processes = max_processes
+        self.ownership = ownership
+        self.read_limit = read_limit
+        self.write_limit = write_limit
+        self.metrics = metrics
+        self.seed = seed
+        self.separation = separation
+
+        self.__placement = None
+        if seed is not None:
+            self.__placement = Placement(coresize, [warrior.length for warrior in warriors],
+                                         seed, separation)
+
+        # The P-space is shared by every round, so survives between them
+        if pspace is None:
+            pspace = PSpace(len(warriors), pspace_size or max(coresize // 16, 1))
+
+        elif len(pspace.cells) != len(warriors):
+            raise RuntimeError('P-space does not match the warriors')
+
+        self.pspace = pspace
+
+    def positions(self, round_number):
+        """
+        Returns the base address of each warrior in a round.
+        Without a seed, the warriors are spread evenly through the core.
+
+        :param round_number: The number of the round, starting at 0
+
+        :return: The list of base addresses
+        """
+
+        if self.__placement is not None:
+            return self.__placement.positions(round_number)
+
+        return [index * self.coresize // len(self.warriors)
+                for index in range(len(self.warriors))]
+
+    @property
+    def settings(self):
+        """
+        Returns the settings of the match which affect
+        its results, as a dictionary.
+        """
+
+        return {'coresize': self.coresize, 'max_cycles': self.max_cycles,
+                'max_processes': self.max_processes,
+                'read_limit': self.read_limit, 'write_limit': self.write_limit,
+                'seed': self.seed,
+                'separation': self.separation if self.seed is not None else None}
+
+    def run_round(self, round_number, core=None):
+        """
+        Runs a single round
+
+        :param round_number: The number of the round, starting at 0
+        :param core: A Core of the size of the match to reuse, which
+        is cleared first, otherwise a new core is created
+
+        :return: A tuple of the numbers of the warriors which
+        survived, the number of cycles executed and the Ownership,
+        which is None unless ownership is tracked
+        """
+
+        if core is None:
+            core = Core(self.coresize)
+
+        elif core.coresize != self.coresize:
+            raise RuntimeError('Core does not match the size of the match')
+
+        else:
+            core.clear()
+
+        positions = self.positions(round_number)
+
+        for warrior, position in zip(self.warriors, positions):
+            core.load(warrior.image, position)
+
+        interpreter = Interpreter(core,
+                                  [(position + warrior.start) % self.coresize
+                                   for warrior, position in zip(self.warriors, positions)],
+                                  max_processes=self.max_processes,
+                                  ownership=self.ownership,
+                                  read_limit=self.read_limit,
+                                  write_limit=self.write_limit,
+                                  pspace=self.pspace,
+                                  metrics=self.metrics)
+
+        if self.ownership:
+            for number, (warrior, position) in enumerate(zip(self.warriors, positions)):
+                interpreter.ownership.claim(position, warrior.length, number)
+
+        start = time.perf_counter()
+        survivors = interpreter.run(self.max_cycles)
+        self.pspace.record_result(survivors)
+
+        if self.metrics is not None:
+            self.metrics.record_round(interpreter.cycle, time.perf_counter() - start)
+
+        return survivors, interpreter.cycle, interpreter.ownership
+
+    def run(self, rounds=1, core=None):
+        """
+        Runs the match
+
+        :param rounds: The number of rounds
+        :param core: A Core of the size of the match to reuse
+        for every round, otherwise a new core is created for each
+
+        :return: The MatchResult
+        """
+
+        result = MatchResult(len(self.warriors))
+
+        for round_number in range(rounds):
+            result.record(*self.run_round(round_number, core))
+
+        if self.metrics is not None:
+            self.metrics.record_battle()
+
+        return result
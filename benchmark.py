@@ -0,0 +1,183 @@
+#! /usr/bin/python
+
+"""
+Measures the throughput of the simulator, in cycles and
+rounds per second, for a set of canonical warriors across
+a range of core sizes. In each scenario a warrior fights a
+copy of itself, so every scenario is reproducible.
+
+The results may be saved as a JSON baseline, against which
+later runs are compared. A run fails if the throughput of
+any scenario falls by more than a set fraction below its
+baseline. Baselines are specific to the machine on which
+they were measured.
+
+    python benchmark.py --save          # record a new baseline
+    python benchmark.py                 # compare against the baseline
+
+>>> from benchmark import compare
+>>> baseline = {'imp-800': {'cycles_per_second': 1000.0}}
+>>> print(compare({'imp-800': {'cycles_per_second': 950.0}}, baseline, 0.1))
+[]
+>>> print(compare({'imp-800': {'cycles_per_second': 850.0}}, baseline, 0.1))
+[('imp-800', 1000.0, 850.0)]
+"""
+
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+from battle import Match, Warrior
+
+# Directory holding the benchmark warriors and baseline
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+
+# The canonical warriors, and the files from which they are assembled
+WARRIORS = [('chang1', os.path.join(os.path.dirname(DIRECTORY), 'chang1')),
+            ('imp', os.path.join(DIRECTORY, 'imp.red')),
+            ('dwarf', os.path.join(DIRECTORY, 'dwarf.red')),
+            ('paper', os.path.join(DIRECTORY, 'paper.red'))]
+
+CORESIZES = [800, 8000, 55440]
+
+BASELINE = os.path.join(DIRECTORY, 'baseline.json')
+
+
+def run_scenario(warrior, coresize, rounds, max_cycles, repeat):
+    """
+    Measures the throughput of a warrior fighting a copy of itself,
+    taking the fastest of a number of repeated measurements.
+
+    :param warrior: The warrior
+    :param coresize: The size of the core
+    :param rounds: The number of rounds in each measurement
+    :param max_cycles: The maximum number of cycles in each round
+    :param repeat: The number of measurements
+
+    :return: A dictionary of the throughput in cycles and rounds per second
+    """
+
+    match = Match([warrior, warrior], coresize=coresize, max_cycles=max_cycles)
+
+    best = None
+    for count in range(repeat):
+        # As with timeit, garbage collection is suspended while
+        # measuring, so that it does not add noise to the results
+        gc.collect()
+        gc.disable()
+
+        try:
+            start = time.perf_counter()
+            result = match.run(rounds)
+            elapsed = time.perf_counter() - start
+
+        finally:
+            gc.enable()
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return {'cycles': result.cycles,
+            'rounds': result.rounds,
+            'seconds': best,
+            'cycles_per_second': result.cycles / best,
+            'rounds_per_second': result.rounds / best}
+
+
+def run_suite(rounds=4, max_cycles=4000, repeat=5):
+    """
+    Measures the throughput of every scenario
+
+    :param rounds: The number of rounds in each measurement
+    :param max_cycles: The maximum number of cycles in each round
+    :param repeat: The number of measurements of each scenario
+
+    :return: A dictionary mapping the name of each scenario to its results
+    """
+
+    results = {}
+    for name, file in WARRIORS:
+        warrior = Warrior.from_file(file)
+
+        for coresize in CORESIZES:
+            results[name + '-' + str(coresize)] = run_scenario(warrior, coresize, rounds,
+                                                               max_cycles, repeat)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results against a baseline
+
+    :param results: The results of each scenario
+    :param baseline: The baseline results of each scenario
+    :param threshold: The largest permitted fall in throughput,
+    as a fraction of the baseline
+
+    :return: A list of (scenario, baseline, measured) cycles per
+    second for each scenario which has regressed
+    """
+
+    regressions = []
+    for name in sorted(results):
+        if name in baseline:
+            expected = baseline[name]['cycles_per_second']
+            measured = results[name]['cycles_per_second']
+
+            if measured < expected * (1 - threshold):
+                regressions.append((name, expected, measured))
+
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure the throughput of the simulator')
+    parser.add_argument('--rounds', type=int, default=4, help='rounds per measurement')
+    parser.add_argument('--cycles', type=int, default=4000, help='maximum cycles per round')
+    parser.add_argument('--repeat', type=int, default=5, help='measurements per scenario')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='largest permitted fall in throughput, as a fraction')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    args = parser.parse_args()
+
+    settings = {'rounds': args.rounds, 'max_cycles': args.cycles}
+    results = run_suite(args.rounds, args.cycles, args.repeat)
+
+    for name in results:
+        print('{:<14} {:>12.0f} cycles/s {:>10.2f} rounds/s'.format(
+            name, results[name]['cycles_per_second'], results[name]['rounds_per_second']))
+
+    if args.save:
+        with open(args.baseline, 'w') as outfile:
+            json.dump({'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'settings': settings,
+                       'results': results}, outfile, indent=1, sort_keys=True)
+
+        print('Saved baseline to', args.baseline)
+
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+
+        if baseline['settings'] != settings:
+            print('Baseline was measured with different settings, not compared')
+
+        else:
+            regressions = compare(results, baseline['results'], args.threshold)
+
+            for name, expected, measured in regressions:
+                print('REGRESSION {}: {:.0f} cycles/s, baseline {:.0f} cycles/s'.format(
+                    name, measured, expected))
+
+            if len(regressions) > 0:
+                sys.exit(1)
+
+            print('No regressions beyond', args.threshold)
@@ -0,0 +1,618 @@
+#! /usr/bin/python
+
+"""
+A differential conformance harness, which checks that an engine,
+meaning an interpreter together with its core and options, behaves
+exactly as the reference engine does. Random cases are generated,
+each a small core filled with random instructions across every
+opcode and addressing mode, with programs starting at random
+addresses and random P-space, and each case is run on both
+engines side by side. After every cycle the cores, the processes
+of every program and the P-space are compared, together with the
+events and the ownership of the core when the engine records them,
+which the reference engine then records too. An engine which
+executes several cycles at once, such as one which fuses pairs of
+instructions, is instead run a stride of cycles at a time, and
+compared at the end of each stride.
+
+A case on which the engines diverge is shrunk to a minimal repro:
+programs are removed, words emptied, fields simplified and the
+P-space cleared, for as long as the engines still diverge, and the
+case is cut short at the first cycle at which they do.
+
+>>> from core import Core
+>>> from conformance import Engine, check
+>>> reference = Engine('reference')
+>>> for name in ['profiled', 'owned', 'limited', 'traced']:
+...     print(name, check(reference, Engine.builtin(name), cases=20, seed=1))
+profiled None
+owned None
+limited None
+traced None
+>>> fused = Engine.builtin('fused')
+>>> print(fused.programs, check(reference, fused, cases=20, seed=1))
+1 None
+>>> print(check(reference, Engine.builtin('fused_observed'), cases=20, seed=1))
+None
+>>> class LossyCore(Core):
+...     # Loses B-field values which are multiples of 7
+...     def put_b_field_val(self, value, address):
+...         Core.put_b_field_val(self, 0 if value % 7 == 0 else value, address)
+>>> case, divergence = check(reference, Engine('lossy', LossyCore), cases=20, seed=1)
+>>> print(divergence)
+cycle 1: word 37 [3, 20, 32, 19, 42] != [3, 20, 32, 19, 0]
+>>> print(case.source(), end='')
+# core 64, cycles 1, programs at 37
+37  SUB 32, #5
+"""
+
+import io
+import random
+
+from assemblytoken import AssemblyToken as Token
+from core import Core
+from interpreter import Interpreter
+from pspace import PSpace
+
+OPCODES = list(range(Token.DAT, Token.NOP + 1))
+
+# Addressing modes of generated fields. NULL is the mode the
+# assembler gives a missing operand, so is generated now and then.
+MODES = [Token.IMMEDIATE, Token.DIRECT, Token.INDIRECT] * 3 + [Token.NULL]
+
+NULL_WORD = [Token.NULL, Token.NULL, Token.NULL, Token.NULL, Token.NULL]
+
+
+class Case:
+    """
+    Class to model a case: the contents of a core, the addresses
+    at which the programs start, their P-space and the number of
+    cycles for which they run.
+    """
+
+    def __init__(self, words, bases, pspace, cycles):
+        """
+        Initialise the case
+
+        :param words: The five fields of each word of the core
+        :param bases: The address at which each program starts
+        :param pspace: The P-space cells of each program
+        :param cycles: The number of cycles to run
+        """
+
+        self.words = words
+        self.bases = bases
+        self.pspace = pspace
+        self.cycles = cycles
+
+    @property
+    def coresize(self):
+        """
+        Returns the size of the core.
+        """
+
+        return len(self.words)
+
+    def copy(self, **changes):
+        """
+        Returns a copy of the case, with any attributes given replaced
+
+        :param changes: The attributes to replace
+        """
+
+        case = Case([list(word) for word in self.words], list(self.bases),
+                    [list(cells) for cells in self.pspace], self.cycles)
+        case.__dict__.update(changes)
+
+        return case
+
+    def to_dict(self):
+        """
+        Returns the case as a dictionary, suitable for conversion to JSON.
+        """
+
+        return {'words': self.words, 'bases': self.bases,
+                'pspace': self.pspace, 'cycles': self.cycles}
+
+    def source(self):
+        """
+        Returns the case as disassembled Red Code, showing only
+        the words which hold instructions.
+        """
+
+        core = Core(self.coresize)
+        core.put_fields([field for word in self.words for field in word])
+
+        header = '# core %d, cycles %d, programs at %s\n' % (
+            self.coresize, self.cycles, ', '.join(str(base) for base in self.bases))
+
+        return header + core.disassemble(skip_null=True)
+
+
+class Engine:
+    """
+    Class to create interpreters of a particular kind, with
+    a particular class of core and interpreter options.
+    """
+
+    # Options of the engines which come with the simulator, each of
+    # which must behave as the reference engine does
+    builtins = {'reference': {},
+                'profiled': {'profile': True},
+                'owned': {'ownership': True},
+                'limited': {'read_limit': 0, 'write_limit': 0},
+                'traced': {'trace': 8},
+                'fused': {'stride': 16, 'programs': 1},
+                'fused_observed': {'stride': 16, 'programs': 1,
+                                   'events': True, 'ownership': True}}
+
+    def __init__(self, name, core_type=Core, stride=1, programs=None, **options):
+        """
+        Initialise the engine
+
+        :param name: The name of the engine, used in reports
+        :param core_type: The class of the core, which must take
+        the size of the core as its only argument
+        :param stride: The number of cycles for which the engine is
+        run between comparisons. An engine with a stride of 1 is
+        stepped, and any other is run by Interpreter.run().
+        :param programs: The number of programs in the cases on which
+        the engine is checked, unless given to check(). An engine which
+        fuses instructions needs a lone program to do so.
+        :param options: Keyword arguments to Interpreter. A limit of
+        0 stands for the size of the core of each case, and events
+        of True for an EventLog.
+        """
+
+        self.name = name
+        self.core_type = core_type
+        self.stride = stride
+        self.programs = programs
+        self.options = options
+
+    @staticmethod
+    def builtin(name):
+        """
+        Returns one of the engines which come with the simulator
+
+        :param name: The name of the engine, or 'shared' for the
+        reference engine with a core in shared memory
+        """
+
+        if name == 'shared':
+            from sharedcore import SharedCore
+
+            return Engine(name, SharedCore)
+
+        return Engine(name, **Engine.builtins[name])
+
+    def create(self, case, **observed):
+        """
+        Creates an interpreter for a case
+
+        :param case: The Case
+        :param observed: Further keyword arguments to Interpreter,
+        with which the reference engine records what a candidate does
+
+        :return: The interpreter
+        """
+
+        core = self.core_type(case.coresize)
+        core.put_fields([field for word in case.words for field in word])
+
+        pspace = PSpace(len(case.bases), len(case.pspace[0]))
+        for cells, values in zip(pspace.cells, case.pspace):
+            cells[:] = type(cells)(cells.typecode, values)
+
+        options = dict(self.options, **observed)
+        for limit in ('read_limit', 'write_limit'):
+            if options.get(limit) == 0:
+                options[limit] = case.coresize
+
+        if options.get('trace'):
+            options.setdefault('trace_stream', io.StringIO())
+
+        if options.get('events') is True:
+            options['events'] = EventLog()
+
+        return Interpreter(core, case.bases, pspace=pspace, **options)
+
+    @staticmethod
+    def release(interpreter):
+        """
+        Frees any resources held by the core of an interpreter.
+
+        :param interpreter: The interpreter
+        """
+
+        core = interpreter.core
+        if hasattr(core, 'unlink'):
+            core.close()
+            core.unlink()
+
+
+class EventLog:
+    """
+    Class to record the events of an interpreter in order, in
+    place of an EventSink, so that they can be compared.
+    """
+
+    def __init__(self):
+        """
+        Initialise the log, with no events
+        """
+
+        self.events = []
+
+    def write(self, address):
+        self.events.append(('write', address))
+
+    def spawn(self, program, address):
+        self.events.append(('spawn', program, address))
+
+    def death(self, program, address):
+        self.events.append(('death', program, address))
+
+
+def random_instruction(rng, coresize):
+    """
+    Returns a random instruction, with values ranging a little
+    beyond the core in either direction
+
+    :param rng: The random.Random from which to draw
+    :param coresize: The size of the core
+
+    :return: The five fields of the instruction
+    """
+
+    instruction = [rng.choice(OPCODES)]
+
+    for field in range(2):
+        mode = rng.choice(MODES)
+        value = Token.NULL if mode == Token.NULL else rng.randint(-coresize, 2 * coresize)
+        instruction += [mode, value]
+
+    return instruction
+
+
+def random_case(rng, coresize=64, programs=2, cycles=200, density=0.6):
+    """
+    Returns a random case
+
+    :param rng: The random.Random from which to draw
+    :param coresize: The size of the core
+    :param programs: The number of programs
+    :param cycles: The number of cycles to run
+    :param density: The chance of each word holding an instruction
+
+    :return: The Case
+    """
+
+    words = [random_instruction(rng, coresize) if rng.random() < density else list(NULL_WORD)
+             for address in range(coresize)]
+
+    bases = rng.sample(range(coresize), programs)
+
+    pspace = [[rng.randint(-coresize, coresize) for cell in range(max(coresize // 16, 1))]
+              for program in range(programs)]
+
+    return Case(words, bases, pspace, cycles)
+
+
+def snapshot(interpreter):
+    """
+    Returns the state of an interpreter which the engines must agree on
+
+    :param interpreter: The interpreter
+
+    :return: A tuple of the fields of the core, the processes
+    of each program, the P-space cells of each program, the events
+    recorded and the ownership, each of the last two None unless
+    it is recorded
+    """
+
+    events = None
+    if interpreter.events is not None:
+        events = list(interpreter.events.events)
+
+    ownership = None
+    if interpreter.ownership is not None:
+        ownership = dict(interpreter.ownership.to_dict(),
+                         owners=list(interpreter.ownership.owners))
+
+    return (interpreter.core.fields(),
+            [(list(processes), index) for processes, index in
+             (program.state() for program in interpreter.programs)],
+            [cells.tolist() for cells in interpreter.pspace.cells],
+            events, ownership)
+
+
+def difference(expected, actual):
+    """
+    Describes the first difference between two snapshots
+
+    :param expected: The snapshot of the reference engine
+    :param actual: The snapshot of the candidate engine
+
+    :return: A description, or None if the snapshots agree
+    """
+
+    (expected_fields, expected_programs, expected_pspace,
+     expected_events, expected_ownership) = expected
+    actual_fields, actual_programs, actual_pspace, actual_events, actual_ownership = actual
+
+    if expected_fields != actual_fields:
+        for address in range(len(expected_fields) // 5):
+            expected_word = expected_fields[5 * address:5 * address + 5].tolist()
+            actual_word = actual_fields[5 * address:5 * address + 5].tolist()
+
+            if expected_word != actual_word:
+                return 'word %d %s != %s' % (address, expected_word, actual_word)
+
+    for number, (expected_state, actual_state) in enumerate(zip(expected_programs,
+                                                                actual_programs)):
+        if expected_state != actual_state:
+            return 'program %d processes %s != %s' % (number, expected_state, actual_state)
+
+    for number, (expected_cells, actual_cells) in enumerate(zip(expected_pspace,
+                                                                actual_pspace)):
+        if expected_cells != actual_cells:
+            return 'program %d P-space %s != %s' % (number, expected_cells, actual_cells)
+
+    if expected_events != actual_events:
+        for number in range(max(len(expected_events), len(actual_events))):
+            expected_event = expected_events[number] if number < len(expected_events) else None
+            actual_event = actual_events[number] if number < len(actual_events) else None
+
+            if expected_event != actual_event:
+                return 'event %d %s != %s' % (number, expected_event, actual_event)
+
+    if expected_ownership != actual_ownership:
+        for key in expected_ownership:
+            if expected_ownership[key] != actual_ownership[key]:
+                return 'ownership %s %s != %s' % (key, expected_ownership[key],
+                                                   actual_ownership[key])
+
+    return None
+
+
+def step(interpreter):
+    """
+    Executes a cycle, catching any error which escapes the interpreter
+
+    :param interpreter: The interpreter
+
+    :return: None, or a description of the error
+    """
+
+    try:
+        interpreter.step()
+
+    except Exception as error:
+        return type(error).__name__ + ': ' + str(error)
+
+    return None
+
+
+def advance(interpreter, cycle):
+    """
+    Runs an interpreter until a cycle has been executed, stepping
+    it on once run() stops, so that it stops only at the cycle
+    as a stepped interpreter does
+
+    :param interpreter: The interpreter
+    :param cycle: The number of the cycle
+
+    :return: None, or a description of the error
+    """
+
+    try:
+        interpreter.run(cycle)
+
+        while interpreter.cycle < cycle:
+            interpreter.step()
+
+    except Exception as error:
+        return type(error).__name__ + ': ' + str(error)
+
+    return None
+
+
+def compare(case, reference, candidate):
+    """
+    Runs a case on two engines side by side, comparing their
+    state after every cycle, or every stride of the candidate
+
+    :param case: The Case
+    :param reference: The Engine whose behaviour is correct
+    :param candidate: The Engine to check
+
+    :return: None if the engines agree throughout, otherwise a
+    pair of the first cycle at which they diverge and a description
+    """
+
+    # The reference engine records whatever the candidate records
+    observed = {name: True for name in ('events', 'ownership')
+                if candidate.options.get(name)}
+
+    expected = reference.create(case, **observed)
+    actual = candidate.create(case)
+
+    try:
+        for cycle in range(case.cycles + 1):
+            if cycle > 0:
+                expected_error = step(expected)
+
+                if candidate.stride == 1:
+                    actual_error = step(actual)
+
+                elif (cycle % candidate.stride == 0 or cycle == case.cycles
+                      or expected_error is not None or not expected.survivors()):
+                    actual_error = advance(actual, cycle)
+
+                else:
+                    continue
+
+                if expected_error != actual_error:
+                    return cycle, 'cycle %d: error %s != %s' % (cycle, expected_error,
+                                                               actual_error)
+
+            description = difference(snapshot(expected), snapshot(actual))
+            if description is not None:
+                return cycle, 'cycle %d: %s' % (cycle, description)
+
+            # Stop once every program has died
+            if not expected.survivors():
+                break
+
+        return None
+
+    finally:
+        reference.release(expected)
+        candidate.release(actual)
+
+
+def shrink(case, reference, candidate):
+    """
+    Shrinks a case on which two engines diverge, for as long
+    as they still diverge
+
+    :param case: The Case
+    :param reference: The Engine whose behaviour is correct
+    :param candidate: The Engine which diverges
+
+    :return: A pair of the smallest case found and its divergence
+    """
+
+    divergence = compare(case, reference, candidate)
+    case = case.copy(cycles=divergence[0])
+
+    def attempt(smaller):
+        # Keeps a smaller case if the engines still diverge on it
+        nonlocal case, divergence
+
+        result = compare(smaller, reference, candidate)
+        if result is None:
+            return False
+
+        case = smaller.copy(cycles=result[0])
+        divergence = result
+        return True
+
+    changed = True
+    while changed:
+        changed = False
+
+        # Remove programs
+        for number in reversed(range(len(case.bases))):
+            if len(case.bases) > 1 and number < len(case.bases):
+                smaller = case.copy()
+                del smaller.bases[number]
+                del smaller.pspace[number]
+                changed |= attempt(smaller)
+
+        # Empty words, in ever smaller runs
+        addresses = [address for address, word in enumerate(case.words) if word != NULL_WORD]
+        size = len(addresses) // 2 or 1
+        while size > 0 and addresses:
+            for start in range(0, len(addresses), size):
+                smaller = case.copy()
+                for address in addresses[start:start + size]:
+                    smaller.words[address] = list(NULL_WORD)
+
+                changed |= attempt(smaller)
+
+            addresses = [address for address, word in enumerate(case.words)
+                         if word != NULL_WORD]
+            size //= 2
+
+        # Simplify the fields of the words left
+        for address, word in enumerate(case.words):
+            if word == NULL_WORD:
+                continue
+
+            for index, simpler in [(2, 0), (4, 0), (1, Token.DIRECT), (3, Token.DIRECT)]:
+                if case.words[address][index] != simpler and case.words[address][index] != Token.NULL:
+                    smaller = case.copy()
+                    smaller.words[address][index] = simpler
+                    changed |= attempt(smaller)
+
+        # Clear the P-space
+        if any(any(cells) for cells in case.pspace):
+            changed |= attempt(case.copy(pspace=[[0] * len(cells) for cells in case.pspace]))
+
+    return case, divergence[1]
+
+
+def check(reference, candidate, cases=100, seed=0, **generation):
+    """
+    Runs random cases on two engines until they diverge
+
+    :param reference: The Engine whose behaviour is correct
+    :param candidate: The Engine to check
+    :param cases: The number of cases to run
+    :param seed: The seed from which the cases are generated
+    :param generation: Keyword arguments to random_case(), by
+    default with the number of programs of the candidate
+
+    :return: None if the engines agree on every case, otherwise
+    a pair of the shrunk case and its divergence
+    """
+
+    if candidate.programs is not None:
+        generation = dict({'programs': candidate.programs}, **generation)
+
+    rng = random.Random(seed)
+
+    for number in range(cases):
+        case = random_case(rng, **generation)
+
+        if compare(case, reference, candidate) is not None:
+            return shrink(case, reference, candidate)
+
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description='Check engines against the reference engine')
+    parser.add_argument('engines', nargs='*',
+                        default=[name for name in Engine.builtins if name != 'reference'] + ['shared'],
+                        help='engines to check')
+    parser.add_argument('--cases', type=int, default=200, help='random cases per engine')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the cases')
+    parser.add_argument('--coresize', type=int, default=64, help='size of the core of each case')
+    parser.add_argument('--programs', type=int, default=None,
+                        help='programs in each case, by default 2, or 1 for the fused engine')
+    parser.add_argument('--cycles', type=int, default=200, help='cycles in each case')
+    parser.add_argument('--repro', default=None,
+                        help='file to which to write the repro of a divergence, as JSON')
+    args = parser.parse_args()
+
+    generation = {'coresize': args.coresize, 'cycles': args.cycles}
+    if args.programs is not None:
+        generation['programs'] = args.programs
+
+    status = 0
+    for name in args.engines:
+        failure = check(Engine.builtin('reference'), Engine.builtin(name), cases=args.cases,
+                        seed=args.seed, **generation)
+
+        if failure is None:
+            print(name, 'agrees on', args.cases, 'cases')
+            continue
+
+        case, divergence = failure
+        print(name, 'diverges at', divergence)
+        print(case.source(), end='')
+
+        if args.repro is not None:
+            with open(args.repro, 'w') as outfile:
+                json.dump(dict(case.to_dict(), engine=name, divergence=divergence), outfile)
+
+        status = 1
+
+    sys.exit(status)
@@ -21,13 +21,38 @@ address above coresize-1 is 0.
 8000
 >>> core.print_instruction(4000)
 MOV 0, 1
+>>> core.put_instr(Token.DAT, Token.NULL, Token.NULL, Token.IMMEDIATE, 5, 4002)
+>>> print(core.disassemble(3999, 4003), end='')
+3999  NULL
+4000  MOV 0, 1
+4001  NULL
+4002  DAT #5
+>>> import io
+>>> stream = io.StringIO()
+>>> core.disassemble(stream=stream, skip_null=True)
+>>> print(stream.getvalue(), end='')
+4000  MOV 0, 1
+4002  DAT #5
+>>> core.clear()
+>>> print(core.disassemble(4000, 4001), end='')
+4000  NULL
 """
 
+from array import array
+
 from assemblytoken import AssemblyToken as Token
 
 
 class Core:
 
+    # Addressing mode prefixes, used when disassembling
+    mode_prefixes = {Token.IMMEDIATE: '#', Token.DIRECT: '',
+                     Token.INDIRECT: '@'}
+
+    # Format strings for each combination of opcode and addressing
+    # modes, created as each is first needed and shared by all cores
+    formats = {}
+
     def __init__(self, size=8000):
         """
         Initialise the core with a specified size. The core
@@ -102,6 +127,19 @@ class Core:
 
         return self.__core[address][4]
 
+    def instruction(self, address):
+        """
+        Returns the whole instruction at the specified address,
+        as a list of the opcode, A-field mode, A-field value,
+        B-field mode and B-field value. The list is that held
+        by the core, so must not be modified.
+        """
+
+        if address < 0 or address >= self.coresize:
+            raise IndexError('Invalid address specified')
+
+        return self.__core[address]
+
     def put_instr(self, opcode, a_field_mode, a_field_val,
             b_field_mode, b_field_val, address):
         """
@@ -109,6 +147,7 @@ class Core:
         specified word position. The instruction
         is assumed to be valid, and the original
         contents of the word are overwritten.
+        Values are reduced as load() reduces them.
 
         :param opcode: The numeric value representing the opcode
         :param a_field_mode: A-field addressing mode
@@ -121,8 +160,113 @@ class Core:
         if address < 0 or address >= self.coresize:
             raise IndexError('Invalid address specified')
 
-        self.__core[address] = [opcode, a_field_mode, a_field_val,
-                                b_field_mode, b_field_val]
+        self.__core[address] = self.__reduce((opcode, a_field_mode, a_field_val,
+                                              b_field_mode, b_field_val))
+
+    def load(self, image, address):
+        """
+        Loads an assembled image into the core, placing
+        the first instruction at the specified address
+        and wrapping around the end of the core if
+        necessary. The original contents of the words
+        are overwritten.
+
+        :param image: The list of assembled instructions
+        :param address: The address at which to load the first instruction
+        """
+
+        if address < 0 or address >= self.coresize:
+            raise IndexError('Invalid address specified')
+
+        for instruction in image:
+            self.__core[address] = self.__reduce(instruction)
+
+            # Increment the address, wrapping around
+            # to the start of the core if necessary
+            address += 1
+            if address == self.coresize:
+                address = 0
+
+    def clear(self):
+        """
+        Fills the whole core with NULLs again, so that it may be
+        reused for another round. The words are reset in place,
+        which is cheaper than creating a new core.
+        """
+
+        null = [Token.NULL, Token.NULL, Token.NULL, Token.NULL, Token.NULL]
+
+        for instruction in self.__core:
+            # Most of the core is usually untouched by a round
+            if instruction != null:
+                instruction[:] = null
+
+    def fields(self):
+        """
+        Returns the contents of the whole core as a flat array of
+        32-bit integers, holding the five fields of each word in
+        address order.
+        """
+
+        values = array('i')
+        for instruction in self.__core:
+            values.extend(instruction)
+
+        return values
+
+    def put_fields(self, values):
+        """
+        Replaces the contents of the whole core from a flat
+        sequence of fields, as returned by fields().
+
+        :param values: The five fields of each word, in address order
+        """
+
+        if len(values) != 5 * self.coresize:
+            raise IndexError('Fields do not match the size of the core')
+
+        self.__core = [self.__reduce(values[index:index + 5])
+                       for index in range(0, len(values), 5)]
+
+    def __reduce(self, instruction):
+        """
+        Returns a copy of an instruction as a list, with any field
+        value a core size or more from zero taken modulo the size of
+        the core, as the interpreter would use it. Smaller values,
+        including the usual negative offsets, are left as written,
+        and so are the values of absent operands. Every value then
+        fits in the 32-bit fields returned by fields().
+
+        :param instruction: The five fields of the instruction
+
+        :return: The list of the five fields
+        """
+
+        [opcode, a_field_mode, a_field_val, b_field_mode, b_field_val] = instruction
+
+        if a_field_mode != Token.NULL:
+            a_field_val = self.__reduce_value(a_field_val)
+
+        if b_field_mode != Token.NULL:
+            b_field_val = self.__reduce_value(b_field_val)
+
+        return [opcode, a_field_mode, a_field_val, b_field_mode, b_field_val]
+
+    def __reduce_value(self, value):
+        """
+        Returns a field value as __reduce() leaves it, taken modulo
+        the size of the core if it is a core size or more from zero
+
+        :param value: The field value
+
+        :return: The value to store
+        """
+
+        size = len(self.__core)
+        if -size < value < size:
+            return value
+
+        return value % size
 
     def put_opcode(self, opcode, address):
         """
@@ -162,6 +306,7 @@ class Core:
         specified word position. The A-field value
         is assumed to be valid, and the original
         contents are overwritten.
+        The value is reduced as load() reduces it.
 
         :param a_field_val: A-field value
         :param address: The address at which to insert the value
@@ -170,7 +315,7 @@ class Core:
         if address < 0 or address >= self.coresize:
             raise IndexError('Invalid address specified')
 
-        self.__core[address][2] = a_field_val
+        self.__core[address][2] = self.__reduce_value(a_field_val)
 
     def put_b_field_mode(self, b_field_mode, address):
         """
@@ -194,6 +339,7 @@ class Core:
         specified word position. The B-field value
         is assumed to be valid, and the original
         contents are overwritten.
+        The value is reduced as load() reduces it.
 
         :param b_field_val: B-field value
         :param address: The address at which to insert the value
@@ -202,55 +348,122 @@ class Core:
         if address < 0 or address >= self.coresize:
             raise IndexError('Invalid address specified')
 
-        self.__core[address][4] = b_field_val
+        self.__core[address][4] = self.__reduce_value(b_field_val)
 
-    def print_instruction(self, address):
+    def put_field_vals(self, a_field_val, b_field_val, address):
         """
-        Pretty prints the instruction at the specified address
+        Puts the specified A-field and B-field values in the
+        specified word position, together. The values are
+        assumed to be valid, and the original contents are
+        overwritten. The values are reduced as load() reduces them.
+
+        :param a_field_val: A-field value
+        :param b_field_val: B-field value
+        :param address: The address at which to insert the values
         """
 
         if address < 0 or address >= self.coresize:
             raise IndexError('Invalid address specified')
 
+        instruction = self.__core[address]
+        instruction[2] = self.__reduce_value(a_field_val)
+        instruction[4] = self.__reduce_value(b_field_val)
+
+    def print_instruction(self, address):
+        """
+        Pretty prints the instruction at the specified address
+        """
+
         [opcode, a_field_mode, a_field_val,
-         b_field_mode, b_field_val] = self.__core[address]
+         b_field_mode, b_field_val] = self.instruction(address)
 
-        # Generate a string to represent the A-field
-        # addressing mode
-        a_mode_str = ''  # DIRECT mode
+        print(self.__format(opcode, a_field_mode, b_field_mode).format(a_field_val,
+                                                                       b_field_val))
 
-        if a_field_mode == Token.IMMEDIATE:
-            a_mode_str = '#'
+    def disassemble(self, start=0, end=None, stream=None, skip_null=False):
+        """
+        Disassembles a range of the core, one instruction per
+        line, each preceded by its address.
+
+        :param start: The first address to disassemble
+        :param end: The address following the last to disassemble,
+        defaulting to the end of the core
+        :param stream: If given, a stream to which the disassembly
+        is written, otherwise the disassembly is returned
+        :param skip_null: If True, words which hold no instruction
+        are omitted
+
+        :return: The disassembly as a string, unless a stream is given
+        """
+
+        if end is None:
+            end = self.coresize
+
+        if start < 0 or end > self.coresize or start > end:
+            raise IndexError('Invalid address range specified')
+
+        # Pad every address to the width of the largest
+        address_format = '{:>' + str(len(str(self.coresize - 1))) + '}  '
+
+        formats = Core.formats
+        fetch = self.instruction
+        lines = []
+
+        for address in range(start, end):
+            [opcode, a_field_mode, a_field_val,
+             b_field_mode, b_field_val] = fetch(address)
+
+            if skip_null and opcode == Token.NULL:
+                continue
+
+            instruction_format = formats.get((opcode, a_field_mode, b_field_mode))
+            if instruction_format is None:
+                instruction_format = self.__format(opcode, a_field_mode, b_field_mode)
+
+            lines.append(address_format.format(address) +
+                         instruction_format.format(a_field_val, b_field_val) + '\n')
 
-        elif a_field_mode == Token.INDIRECT:
-            a_mode_str = '@'
+        text = ''.join(lines)
+
+        if stream is None:
+            return text
+
+        stream.write(text)
+
+    def __format(self, opcode, a_field_mode, b_field_mode):
+        """
+        Returns the format string for an instruction with the
+        specified opcode and addressing modes, into which the
+        A-field and B-field values are formatted. A field
+        whose addressing mode is NULL is absent.
+
+        :param opcode: The numeric value representing the opcode
+        :param a_field_mode: A-field addressing mode
+        :param b_field_mode: B-field addressing mode
+
+        :return: The format string
+        """
 
-        # Generate a string to represent the B-field
-        # addressing mode
-        b_mode_str = ''  # DIRECT mode
+        key = (opcode, a_field_mode, b_field_mode)
 
-        if b_field_mode == Token.IMMEDIATE:
-            b_mode_str = '#'
+        if key not in Core.formats:
+            instruction_format = Token.catnames[opcode]
 
-        elif b_field_mode == Token.INDIRECT:
-            b_mode_str = '@'
+            if a_field_mode != Token.NULL:
+                instruction_format += ' ' + self.mode_prefixes.get(a_field_mode, '') + '{0}'
 
-        print(Token.catnames[opcode], end='')
+            if b_field_mode != Token.NULL:
+                if a_field_mode == Token.NULL:
+                    instruction_format += ' '
 
-        if a_field_val != Token.NULL:
-            print (' ', end='')
-            print(a_mode_str, end='')
-            print(a_field_val, end='')
+                else:
+                    instruction_format += ', '
 
-        if b_field_val != Token.NULL:
-            if opcode == Token.DAT and a_field_val == Token.NULL:
-                print(' ', end='')
+                instruction_format += self.mode_prefixes.get(b_field_mode, '') + '{1}'
 
-            else:
-                print(', ', end='')
+            Core.formats[key] = instruction_format
 
-            print(b_mode_str, end='')
-            print(b_field_val)
+        return Core.formats[key]
 
     if __name__ == "__main__":
         import doctest
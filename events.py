@@ -0,0 +1,326 @@
+#! /usr/bin/python
+
+"""
+Classes to stream the events of a battle to a live view. The
+events are writes to the core, and the spawning and death of
+processes. They are recorded in fixed-size chunks of integer
+arrays, and each full chunk is handed to a background thread,
+which writes frames to a stream no more often than a set frame
+rate. Writes to the same word within a frame are merged, so
+each frame lists each written address once.
+
+Recording never waits for the background thread. If it falls
+behind, so that its queue of chunks is full, a full chunk is
+dropped, and the number of events dropped is reported in the
+next frame.
+
+If writing to the stream fails, for example because the other end
+of a socket has closed, the background thread stops, recording goes
+on dropping chunks, and the error is raised when the sink is closed.
+
+Each frame is written as a line of JSON, holding the frame
+number, the addresses written, a [program, address] pair for
+each process spawned and each process which died, and the
+number of events dropped. The stream may be a file, or a
+socket opened with makefile('w').
+
+>>> import io
+>>> import json
+>>> from core import Core
+>>> from interpreter import Interpreter
+>>> from assemblytoken import AssemblyToken as Token
+>>> from events import EventSink
+>>> core = Core(100)
+>>> core.put_instr(Token.SPL, Token.DIRECT, 3, Token.NULL, Token.NULL, 0)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 0, Token.DIRECT, 1, 1)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 3)
+>>> stream = io.StringIO()
+>>> sink = EventSink(stream, chunk_size=4)
+>>> interpreter = Interpreter(core, [0], events=sink)
+>>> survivors = interpreter.run(6)
+>>> sink.close()
+>>> frames = [json.loads(line) for line in stream.getvalue().splitlines()]
+>>> print(sorted(set(address for frame in frames for address in frame['writes'])))
+[2, 3, 4, 5]
+>>> print([spawn for frame in frames for spawn in frame['spawns']])
+[[0, 3]]
+>>> print([death for frame in frames for death in frame['deaths']])
+[[0, 3]]
+>>> class BrokenStream(io.StringIO):
+...     def write(self, text):
+...         raise BrokenPipeError('Broken pipe')
+>>> sink = EventSink(BrokenStream(), chunk_size=2, queue_size=1)
+>>> for address in range(100):
+...     sink.write(address)
+>>> try:
+...     sink.close()
+... except OSError as error:
+...     print(error)
+Broken pipe
+"""
+
+import json
+import queue
+import threading
+import time
+from array import array
+
+
+class EventSink:
+
+    # Kinds of event
+    WRITE = 0
+    SPAWN = 1
+    DEATH = 2
+
+    def __init__(self, stream, chunk_size=4096, frame_rate=30, queue_size=16):
+        """
+        Initialise the sink, and start the background thread
+        which writes frames to the stream
+
+        :param stream: The text stream to which to write frames
+        :param chunk_size: The number of events in each chunk
+        :param frame_rate: The maximum number of frames per second
+        :param queue_size: The number of chunks which may wait for
+        the background thread before chunks are dropped
+        """
+
+        self.chunk_size = chunk_size
+        self.dropped = 0  # Number of events dropped
+
+        self.__stream = stream
+        self.__period = 1.0 / frame_rate
+        self.__queue = queue.Queue(queue_size)
+        self.__error = None  # Error which stopped the background thread
+
+        # The chunk being filled, holding the kind, program and
+        # address of each event, and the number of events in it
+        self.__chunk = array('l', [0]) * (3 * chunk_size)
+        self.__length = 0
+
+        self.__thread = threading.Thread(target=self.__write_frames, daemon=True)
+        self.__thread.start()
+
+    def write(self, address):
+        """
+        Records a write to the core
+
+        :param address: The address written
+        """
+
+        self.__record(self.WRITE, -1, address)
+
+    def spawn(self, program, address):
+        """
+        Records the spawning of a process
+
+        :param program: The number of the program
+        :param address: The address of the new process
+        """
+
+        self.__record(self.SPAWN, program, address)
+
+    def death(self, program, address):
+        """
+        Records the death of a process
+
+        :param program: The number of the program
+        :param address: The address at which the process died
+        """
+
+        self.__record(self.DEATH, program, address)
+
+    def close(self):
+        """
+        Hands any partly filled chunk to the background thread,
+        waits for it to write the final frame and stops it. Raises
+        any error which stopped the thread writing to the stream.
+        """
+
+        if self.__length > 0:
+            self.__put((self.__chunk, self.__length))
+            self.__length = 0
+
+        self.__put(None)
+        self.__thread.join()
+
+        if self.__error is not None:
+            raise self.__error
+
+    def __put(self, item):
+        """
+        Hands an item to the background thread, waiting for room
+        in the queue for as long as the thread is running, so that
+        a thread stopped by an error cannot leave the caller waiting
+
+        :param item: The item to queue
+        """
+
+        while self.__thread.is_alive():
+            try:
+                self.__queue.put(item, timeout=self.__period)
+                return
+
+            except queue.Full:
+                pass
+
+    def __record(self, kind, program, address):
+        """
+        Records an event in the current chunk, handing the
+        chunk to the background thread once it is full
+
+        :param kind: The kind of event
+        :param program: The number of the program, or -1
+        :param address: The address of the event
+        """
+
+        index = 3 * self.__length
+        self.__chunk[index] = kind
+        self.__chunk[index + 1] = program
+        self.__chunk[index + 2] = address
+        self.__length += 1
+
+        if self.__length == self.chunk_size:
+            try:
+                self.__queue.put_nowait((self.__chunk, self.__length))
+                self.__chunk = array('l', [0]) * (3 * self.chunk_size)
+
+            except queue.Full:
+                # The chunk is dropped and reused
+                self.dropped += self.__length
+
+            self.__length = 0
+
+    def __write_frames(self):
+        """
+        Runs in the background thread, writing frames until the
+        sink is closed. An error writing to the stream stops the
+        thread, and is kept to be raised by close().
+        """
+
+        try:
+            self.__write_frames_until_closed()
+
+        except (OSError, ValueError) as error:
+            self.__error = error
+
+    def __write_frames_until_closed(self):
+        """
+        Merges the events from each chunk into the current frame,
+        and writes the frame once the frame period has passed.
+        """
+
+        writes = set()
+        spawns = []
+        deaths = []
+        frame = 0
+        reported = 0     # Number of dropped events already reported
+        last = 0.0       # Time the last frame was written
+        finished = False
+
+        while not finished:
+            try:
+                item = self.__queue.get(timeout=self.__period)
+
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                finished = True
+
+            elif item:
+                chunk, length = item
+                for index in range(0, 3 * length, 3):
+                    kind = chunk[index]
+
+                    if kind == self.WRITE:
+                        writes.add(chunk[index + 2])
+
+                    elif kind == self.SPAWN:
+                        spawns.append([chunk[index + 1], chunk[index + 2]])
+
+                    else:  # Event is DEATH
+                        deaths.append([chunk[index + 1], chunk[index + 2]])
+
+            now = time.monotonic()
+            dropped = self.dropped
+            if ((writes or spawns or deaths or dropped > reported) and
+                    (finished or now - last >= self.__period)):
+                self.__stream.write(json.dumps({'frame': frame,
+                                                'writes': sorted(writes),
+                                                'spawns': spawns,
+                                                'deaths': deaths,
+                                                'dropped': dropped - reported}) + '\n')
+                self.__stream.flush()
+
+                writes = set()
+                spawns = []
+                deaths = []
+                frame += 1
+                reported = dropped
+                last = now
+
+
+class EventCore:
+    """
+    Class to wrap a core, recording each write to it in
+    an event sink. Reads are passed straight to the core.
+    """
+
+    def __init__(self, core, sink):
+        """
+        Initialise the wrapped core
+
+        :param core: The core to wrap
+        :param sink: The event sink in which to record writes
+        """
+
+        self.__core = core
+        self.__write = sink.write
+
+        # Reads are bound directly to the core, so they cost no more
+        # than they would without the wrapper
+        self.instruction = core.instruction
+        self.opcode = core.opcode
+        self.a_field_mode = core.a_field_mode
+        self.a_field_val = core.a_field_val
+        self.b_field_mode = core.b_field_mode
+        self.b_field_val = core.b_field_val
+
+    @property
+    def coresize(self):
+        """
+        Returns the size of the core.
+        """
+
+        return self.__core.coresize
+
+    def put_instr(self, opcode, a_field_mode, a_field_val,
+                  b_field_mode, b_field_val, address):
+        self.__core.put_instr(opcode, a_field_mode, a_field_val,
+                              b_field_mode, b_field_val, address)
+        self.__write(address)
+
+    def put_opcode(self, opcode, address):
+        self.__core.put_opcode(opcode, address)
+        self.__write(address)
+
+    def put_a_field_mode(self, a_field_mode, address):
+        self.__core.put_a_field_mode(a_field_mode, address)
+        self.__write(address)
+
+    def put_a_field_val(self, a_field_val, address):
+        self.__core.put_a_field_val(a_field_val, address)
+        self.__write(address)
+
+    def put_b_field_mode(self, b_field_mode, address):
+        self.__core.put_b_field_mode(b_field_mode, address)
+        self.__write(address)
+
+    def put_b_field_val(self, b_field_val, address):
+        self.__core.put_b_field_val(b_field_val, address)
+        self.__write(address)
+
+    def put_field_vals(self, a_field_val, b_field_val, address):
+        self.__core.put_field_vals(a_field_val, b_field_val, address)
+        self.__write(address)
@@ -0,0 +1,468 @@
+#! /usr/bin/python
+
+"""
+Evolves Red Code warriors with a genetic algorithm. Candidates
+are assembled images, which are mutated and crossed over directly,
+without being lexed or assembled again. Each candidate starts at
+its first instruction.
+
+The fitness of a candidate is its total score in matches against
+a set of opponents. Candidates are scored across a pool of worker
+processes, and every fitness is cached by a hash of the image, so
+a candidate which has been seen before is never simulated again.
+
+With early abandoning, a candidate is abandoned as soon as it can
+no longer beat the least fit of the elite of the last generation,
+and its fitness is the score it had reached. Such a candidate could
+not have joined the elite, so the fittest are found as before.
+
+>>> from assemblytoken import AssemblyToken as Token
+>>> from battle import Warrior, image_key
+>>> from evolver import Evolver
+>>> imp = Warrior.from_source('Imp', 'MOV 0, 1')
+>>> print(len(image_key(imp.image)))
+16
+>>> evolver = Evolver([imp], population=8, coresize=800, max_cycles=400,
+...                   workers=1, seed=1)
+>>> evolver.seed_population([imp])
+>>> fitness, image = evolver.run(4)
+>>> print(fitness >= 1, len(evolver.cache) == evolver.evaluations)
+True True
+>>> print(evolver.evaluations + evolver.cache_hits >= 8 * 5)
+True
+>>> evolver = Evolver([imp, imp], population=8, coresize=800, max_cycles=400,
+...                   early_abandon=True, workers=1, seed=1)
+>>> evolver.seed_population([imp])
+>>> fitness, image = evolver.run(4)
+>>> print(fitness >= 2)
+True
+>>> from evolver import image_source
+>>> print(image_source([[Token.ADD, Token.IMMEDIATE, 795, Token.DIRECT, 3],
+...                     [Token.JMP, Token.DIRECT, 799, Token.NULL, Token.NULL]], 800), end='')
+ADD #795, 3
+JMP 799
+"""
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from assemblytoken import AssemblyToken as Token
+from battle import Warrior, image_key
+from core import Core
+from scoring import BenchmarkRunner
+
+# Opcodes which may appear in evolved instructions
+OPCODES = [Token.DAT, Token.MOV, Token.ADD, Token.SUB, Token.MUL, Token.DIV,
+           Token.MOD, Token.JMP, Token.JMZ, Token.JMN, Token.DJN, Token.SPL,
+           Token.CMP, Token.SEQ, Token.SNE, Token.SLT, Token.LDP, Token.STP,
+           Token.NOP]
+
+MODES = [Token.IMMEDIATE, Token.DIRECT, Token.INDIRECT]
+
+# The runner of a worker process, which scores candidates against
+# the opponents, created once when the worker starts
+worker_runner = None
+
+
+def initialise_worker(opponents, rounds, settings):
+    """
+    Creates the runner of a worker process, so that the opponents
+    and match settings are sent to each worker only once
+
+    :param opponents: The list of opponent warriors
+    :param rounds: The number of rounds against each opponent
+    :param settings: A dictionary of keyword arguments to Match
+    """
+
+    global worker_runner
+
+    worker_runner = BenchmarkRunner(opponents, rounds, **settings)
+
+
+def evaluate_in_worker(image, threshold):
+    """
+    Scores a candidate with the runner of a worker process
+
+    :param image: The list of assembled instructions of the candidate
+    :param threshold: The score to beat, or None to fight every round
+
+    :return: The score of the candidate
+    """
+
+    return worker_runner.score(Warrior('candidate', image), threshold)[0]
+
+
+def image_source(image, coresize=8000):
+    """
+    Returns the Red Code source of an image. The image is loaded
+    into a core of the size in which it fights, so that its values
+    are shown as they are in a battle.
+
+    :param image: The list of assembled instructions
+    :param coresize: The size of the core
+
+    :return: The source, one instruction per line
+    """
+
+    core = Core(coresize)
+    core.load(image, 0)
+
+    lines = core.disassemble(0, min(len(image), coresize)).splitlines()
+
+    return ''.join(line.split(None, 1)[1] + '\n' for line in lines)
+
+
+class Evolver:
+
+    def __init__(self, opponents, population=32, coresize=8000, max_cycles=8000,
+                 rounds=1, max_length=20, crossover_rate=0.5, elite=2,
+                 early_abandon=False, workers=None, chunksize=4, seed=None):
+        """
+        Initialise the evolver
+
+        :param opponents: The list of warriors against which candidates are scored
+        :param population: The number of candidates in each generation
+        :param coresize: The size of the core
+        :param max_cycles: The maximum number of cycles in each round
+        :param rounds: The number of rounds against each opponent
+        :param max_length: The maximum number of instructions in a candidate
+        :param crossover_rate: The fraction of offspring bred by crossover
+        :param elite: The number of the fittest candidates kept unchanged
+        in the next generation
+        :param early_abandon: If True, candidates which cannot beat
+        the elite are abandoned
+        :param workers: The number of worker processes, defaulting
+        to the number of processors
+        :param chunksize: The number of candidates sent to a worker at once
+        :param seed: The seed of the random number generator
+        """
+
+        self.opponents = opponents
+        self.size = population
+        self.coresize = coresize
+        self.max_length = max_length
+        self.crossover_rate = crossover_rate
+        self.elite = elite
+        self.early_abandon = early_abandon
+
+        self.rounds = rounds
+        self.settings = {'coresize': coresize, 'max_cycles': max_cycles}
+
+        self.population = []  # The images of the current generation
+        self.fitnesses = []   # The fitness of each candidate
+        self.generations = 0  # Number of generations bred
+
+        self.cache = {}       # Fitness of each image, by image_key()
+        self.evaluations = 0  # Number of candidates simulated
+        self.cache_hits = 0   # Number of candidates found in the cache
+
+        self.__random = random.Random(seed)
+        self.__workers = workers
+        self.__chunksize = chunksize
+        self.__executor = None
+        self.__runner = None
+
+    def seed_population(self, warriors=()):
+        """
+        Fills the population with the specified warriors, then
+        with random candidates, and scores them
+
+        :param warriors: The warriors with which to seed the population
+        """
+
+        population = []
+        for warrior in warriors[:self.size]:
+            image = [list(instruction) for instruction in warrior.image]
+
+            # Candidates start at their first instruction,
+            # so jump to the start of the warrior
+            if warrior.start != 0:
+                image.insert(0, [Token.JMP, Token.DIRECT, warrior.start + 1,
+                                 Token.NULL, Token.NULL])
+
+            population.append(image[:self.max_length])
+
+        while len(population) < self.size:
+            population.append([self.random_instruction()
+                               for count in range(self.__random.randint(1, self.max_length))])
+
+        self.population = population
+        self.fitnesses = self.evaluate(population)
+
+    def random_instruction(self):
+        """
+        Returns a random instruction.
+        """
+
+        instruction = [self.__random.choice(OPCODES),
+                       self.__random.choice(MODES), self.random_value(),
+                       self.__random.choice(MODES), self.random_value()]
+
+        return self.__fix_operands(instruction)
+
+    def random_value(self):
+        """
+        Returns a random field value, which is more
+        often a small offset than any address in the core.
+        """
+
+        if self.__random.random() < 0.5:
+            return self.__random.randint(-self.max_length, self.max_length) % self.coresize
+
+        return self.__random.randrange(self.coresize)
+
+    def mutate(self, image):
+        """
+        Returns a copy of an image with a random change made, which is
+        to replace, insert or delete an instruction, or change a field
+
+        :param image: The list of assembled instructions
+
+        :return: The mutated image
+        """
+
+        image = [list(instruction) for instruction in image]
+        index = self.__random.randrange(len(image))
+        choice = self.__random.random()
+
+        if choice < 0.1:
+            image[index] = self.random_instruction()
+
+        elif choice < 0.2:
+            if len(image) < self.max_length:
+                image.insert(index, self.random_instruction())
+
+        elif choice < 0.3:
+            if len(image) > 1:
+                del image[index]
+
+        else:
+            instruction = image[index]
+            field = self.__random.randrange(5)
+
+            if field == 0:
+                instruction[0] = self.__random.choice(OPCODES)
+
+            elif field == 1 or field == 3:
+                instruction[field] = self.__random.choice(MODES)
+
+            else:
+                instruction[field] = self.random_value()
+
+            self.__fix_operands(instruction)
+
+        return image
+
+    def crossover(self, first, second):
+        """
+        Returns the head of one image joined to the tail of another,
+        cut at random points
+
+        :param first: The image providing the head
+        :param second: The image providing the tail
+
+        :return: The new image
+        """
+
+        head = first[:self.__random.randint(1, len(first))]
+        tail = second[self.__random.randrange(len(second)):]
+
+        return [list(instruction) for instruction in (head + tail)[:self.max_length]]
+
+    def evaluate(self, images, threshold=None):
+        """
+        Scores a list of candidates, simulating only those not
+        already in the cache, each of them once
+
+        :param images: The list of images
+        :param threshold: The score to beat, below which a
+        candidate is abandoned, or None to score it fully
+
+        :return: The list of fitnesses, in the same order
+        """
+
+        keys = [image_key(image) for image in images]
+
+        pending = {}
+        for key, image in zip(keys, images):
+            if key in self.cache or key in pending:
+                self.cache_hits += 1
+
+            else:
+                pending[key] = image
+
+        if len(pending) > 0:
+            if self.__workers == 1:
+                # Avoid the cost of a pool for a single worker
+                if self.__runner is None:
+                    self.__runner = BenchmarkRunner(self.opponents, self.rounds,
+                                                    **self.settings)
+
+                fitnesses = [self.__runner.score(Warrior('candidate', image), threshold)[0]
+                             for image in pending.values()]
+
+            else:
+                if self.__executor is None:
+                    self.__executor = ProcessPoolExecutor(max_workers=self.__workers,
+                                                          initializer=initialise_worker,
+                                                          initargs=(self.opponents,
+                                                                    self.rounds,
+                                                                    self.settings))
+
+                fitnesses = list(self.__executor.map(evaluate_in_worker, pending.values(),
+                                                     [threshold] * len(pending),
+                                                     chunksize=self.__chunksize))
+
+            for key, fitness in zip(pending, fitnesses):
+                self.cache[key] = fitness
+
+            self.evaluations += len(pending)
+
+        return [self.cache[key] for key in keys]
+
+    def generation(self):
+        """
+        Breeds and scores the next generation. The fittest candidates
+        survive unchanged, and the rest are offspring of candidates
+        chosen by tournament, bred by crossover and mutation.
+
+        :return: A pair of the best fitness and image in the generation
+        """
+
+        if len(self.population) == 0:
+            self.seed_population()
+
+        ranked = sorted(range(len(self.population)),
+                        key=lambda index: self.fitnesses[index], reverse=True)
+
+        offspring = [self.population[index] for index in ranked[:self.elite]]
+
+        threshold = None
+        if self.early_abandon and self.elite > 0:
+            threshold = self.fitnesses[ranked[:self.elite][-1]]
+
+        while len(offspring) < self.size:
+            parent = self.__select()
+
+            if self.__random.random() < self.crossover_rate:
+                parent = self.crossover(parent, self.__select())
+
+            offspring.append(self.mutate(parent))
+
+        self.population = offspring
+        self.fitnesses = self.evaluate(offspring, threshold)
+        self.generations += 1
+
+        return self.best()
+
+    def run(self, generations):
+        """
+        Breeds a number of generations
+
+        :param generations: The number of generations
+
+        :return: A pair of the best fitness and image in the last generation
+        """
+
+        for count in range(generations):
+            self.generation()
+
+        return self.best()
+
+    def best(self):
+        """
+        Returns a pair of the best fitness and image in the population.
+        """
+
+        index = max(range(len(self.population)), key=lambda index: self.fitnesses[index])
+
+        return self.fitnesses[index], self.population[index]
+
+    def close(self):
+        """
+        Shuts down the worker processes, if any were started.
+        """
+
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def __select(self):
+        """
+        Chooses a candidate by a tournament between three
+        at random, returning the image of the fittest.
+        """
+
+        indices = [self.__random.randrange(len(self.population)) for count in range(3)]
+        index = max(indices, key=lambda index: self.fitnesses[index])
+
+        return self.population[index]
+
+    @staticmethod
+    def __fix_operands(instruction):
+        """
+        Gives an instruction the operands its opcode takes, as the
+        assembler would: JMP and SPL have no B operand, NOP has no
+        operands, and every other opcode has two.
+
+        :param instruction: The instruction, which is changed in place
+
+        :return: The instruction
+        """
+
+        opcode = instruction[0]
+
+        if opcode == Token.NOP:
+            instruction[1:] = [Token.NULL] * 4
+
+        else:
+            if instruction[1] == Token.NULL:
+                instruction[1:3] = [Token.DIRECT, 0]
+
+            if opcode == Token.JMP or opcode == Token.SPL:
+                instruction[3:] = [Token.NULL] * 2
+
+            elif instruction[3] == Token.NULL:
+                instruction[3:] = [Token.DIRECT, 0]
+
+        return instruction
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Evolve a warrior against a set of opponents')
+    parser.add_argument('opponents', nargs='+', help='Red Code files of the opponents')
+    parser.add_argument('--generations', type=int, default=50, help='generations to breed')
+    parser.add_argument('--population', type=int, default=32, help='candidates per generation')
+    parser.add_argument('--coresize', type=int, default=8000, help='size of the core')
+    parser.add_argument('--cycles', type=int, default=8000, help='maximum cycles per round')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--early-abandon', action='store_true',
+                        help='abandon candidates which cannot beat the elite')
+    parser.add_argument('--output', default=None, help='file to which to write the best warrior')
+    args = parser.parse_args()
+
+    evolver = Evolver([Warrior.from_file(file) for file in args.opponents],
+                      population=args.population, coresize=args.coresize,
+                      max_cycles=args.cycles, early_abandon=args.early_abandon,
+                      workers=args.workers, seed=args.seed)
+
+    try:
+        evolver.seed_population()
+
+        for generation in range(args.generations):
+            fitness, image = evolver.generation()
+            print('Generation', generation + 1, 'best fitness', fitness,
+                  'simulated', evolver.evaluations, 'cached', evolver.cache_hits)
+
+    finally:
+        evolver.close()
+
+    if args.output is not None:
+        with open(args.output, 'w') as outfile:
+            outfile.write(image_source(evolver.best()[1], args.coresize))
+
+    else:
+        print(image_source(evolver.best()[1], args.coresize), end='')
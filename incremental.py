@@ -0,0 +1,264 @@
+#! /usr/bin/python
+
+"""
+Supports incremental re-assembly of a Red Code program
+as it is edited. The program is held line by line, along
+with the instructions assembled from each line, so that an
+edit to a range of lines requires only those lines to be
+lexed and assembled again.
+
+Each edit returns a patch, which holds only the core words
+that differ from the previously assembled image, and which
+can be applied to a core into which that image has already
+been loaded.
+
+An edit which adds or removes a symbol definition, or which
+moves labelled instructions, changes the values of operands
+on other lines, so the whole program is assembled again.
+
+>>> from core import Core
+>>> from incremental import IncrementalAssembler
+>>> program = IncrementalAssembler('MOV 0, 1\\nJMP -1\\n')
+>>> core = Core()
+>>> core.load(program.image, 100)
+>>> patch = program.edit(2, 1, 'MOV 0, 2')
+>>> print(patch.writes)
+[(1, [1, 20, 0, 20, 2])]
+>>> patch.apply(core, 100)
+>>> core.print_instruction(101)
+MOV 0, 2
+>>> patch = program.edit(1, 0, 'NOP')
+>>> print(len(patch.writes))
+3
+>>> patch.apply(core, 100)
+>>> core.print_instruction(100)
+NOP
+>>> core.print_instruction(102)
+MOV 0, 2
+>>> patch = program.edit(1, 2, '')
+>>> patch.apply(core, 100)
+>>> core.print_instruction(100)
+MOV 0, 2
+>>> print(core.opcode(101) == core.opcode(102) == Token.NULL)
+True
+>>> print(program.source, end='')
+MOV 0, 2
+>>> program = IncrementalAssembler('top MOV 0, 1\\nJMP top\\n')
+>>> print(program.edit(1, 1, 'top MOV 0, 2').writes)
+[(0, [1, 20, 0, 20, 2])]
+>>> print(program.edit(1, 0, 'NOP').writes)
+[(0, [18, 27, 27, 27, 27]), (1, [1, 20, 0, 20, 2]), (2, [7, 20, -1, 27, 27])]
+"""
+
+from assembler import Assembler
+from assemblytoken import AssemblyToken as Token
+from lexer import Lexer
+
+
+class Patch:
+    """
+    Class to model a patch, which is a list of
+    (offset, instruction) pairs giving the words of
+    a loaded image that have changed.
+    """
+
+    def __init__(self, writes):
+        """
+        Initialise the patch
+
+        :param writes: A list of (offset, instruction) pairs, where
+        each offset is relative to the base address of the image
+        """
+
+        self.writes = writes
+
+    def apply(self, core, address):
+        """
+        Applies the patch to a core in which the original
+        image was loaded at the specified base address.
+
+        :param core: The core to patch
+        :param address: The base address of the image
+        """
+
+        for offset, instruction in self.writes:
+            core.put_instr(*instruction, (address + offset) % core.coresize)
+
+
+class IncrementalAssembler:
+
+    def __init__(self, source):
+        """
+        Initialise the incremental assembler by assembling
+        the whole of the specified program.
+
+        :param source: The Red Code source as a string
+        """
+
+        self.__lexer = Lexer()
+        self.__assembler = Assembler()
+
+        # The source lines, the list of instructions assembled
+        # from each line, and whether each line defines a symbol
+        # or the start or end of the program
+        self.__lines = source.splitlines()
+        (self.__line_images, self.__defines,
+         self.__symbols, self.__start) = self.__assemble_all(self.__lines)
+
+    @property
+    def source(self):
+        """
+        Returns the current source of the program.
+        """
+
+        return ''.join(text + '\n' for text in self.__lines)
+
+    @property
+    def image(self):
+        """
+        Returns the current assembled image of the program.
+        """
+
+        return [instruction for line_image in self.__line_images
+                for instruction in line_image]
+
+    @property
+    def start(self):
+        """
+        Returns the offset of the first instruction to execute.
+        """
+
+        return self.__start
+
+    def edit(self, line, count, text):
+        """
+        Replaces a range of lines in the program, and re-assembles
+        only the new lines where possible. If the new lines fail to
+        assemble, the error is raised and the program is left unchanged.
+
+        :param line: The number of the first line to replace, starting at 1
+        :param count: The number of lines to replace, which may be zero
+        to insert lines before the specified line
+        :param text: The replacement source, which may be empty
+        to delete lines
+
+        :return: The patch which updates a core in which the
+        previous image was loaded
+        """
+
+        if line < 1 or count < 0 or line + count - 1 > len(self.__lines):
+            raise IndexError('Invalid line range specified')
+
+        new_lines = text.splitlines()
+        new_tokens = [self.__lexer.tokenize_string(new_text, line + number)
+                      for number, new_text in enumerate(new_lines)]
+        new_defines = [self.__defines_symbol(tokens) for tokens in new_tokens]
+
+        # The offset in the image of the first instruction affected
+        start = 0
+        for line_image in self.__line_images[:line - 1]:
+            start += len(line_image)
+
+        old_count = 0
+        for line_image in self.__line_images[line - 1:line - 1 + count]:
+            old_count += len(line_image)
+
+        new_count = 0
+        for tokens in new_tokens:
+            if tokens[0].category not in [Token.NEWLINE, Token.EOF]:
+                new_count += 1
+
+        # Only the new lines need to be assembled if no symbol
+        # is defined or removed, and no labelled instruction moves
+        symbolic = any(self.__defines)
+        if (not any(self.__defines[line - 1:line - 1 + count]) and
+                not any(new_defines) and
+                (not symbolic or new_count == old_count)):
+
+            new_line_images = []
+            offset = start
+            for tokens in new_tokens:
+                new_line_images.append(self.__assembler.image(tokens, self.__symbols, offset))
+                offset += len(new_line_images[-1])
+
+            old = [instruction for line_image in self.__line_images[line - 1:]
+                   for instruction in line_image]
+
+            # Instructions following the edit are moved rather
+            # than re-assembled
+            new = [instruction for line_image in
+                   new_line_images + self.__line_images[line - 1 + count:]
+                   for instruction in line_image]
+
+            self.__lines[line - 1:line - 1 + count] = new_lines
+            self.__line_images[line - 1:line - 1 + count] = new_line_images
+            self.__defines[line - 1:line - 1 + count] = new_defines
+
+        else:
+            lines = self.__lines[:line - 1] + new_lines + self.__lines[line - 1 + count:]
+            old = self.image
+
+            (self.__line_images, self.__defines,
+             self.__symbols, self.__start) = self.__assemble_all(lines)
+
+            self.__lines = lines
+            new = self.image
+            start = 0
+
+        writes = []
+        for index in range(max(len(old), len(new))):
+            if index >= len(new):
+                # The image has shrunk, so clear the word
+                writes.append((start + index, [Token.NULL] * 5))
+
+            elif index >= len(old) or new[index] != old[index]:
+                writes.append((start + index, new[index]))
+
+        return Patch(writes)
+
+    def __assemble_all(self, lines):
+        """
+        Lexes and assembles a whole program
+
+        :param lines: The source lines of the program
+
+        :return: A tuple of the list of instructions assembled from
+        each line, whether each line defines a symbol, the symbol
+        table and the start offset
+        """
+
+        tokens = self.__lexer.tokenize_string(''.join(text + '\n' for text in lines))
+        image = self.__assembler.image(tokens)
+
+        line_images = [[] for text in lines]
+        for instruction, number in zip(image, self.__assembler.lines):
+            line_images[number - 1].append(instruction)
+
+        # Group the tokens by line, to find the defining lines
+        line_tokens = [[] for text in lines]
+        for token in tokens:
+            if token.category != Token.EOF:
+                line_tokens[token.line - 1].append(token)
+
+        defines = [self.__defines_symbol(tokens) for tokens in line_tokens]
+
+        return (line_images, defines,
+                self.__assembler.symbols, self.__assembler.start)
+
+    @staticmethod
+    def __defines_symbol(tokens):
+        """
+        Returns True if a line defines a symbol, or the start
+        or end of the program
+
+        :param tokens: The tokens of the line
+        """
+
+        if len(tokens) > 0 and tokens[0].category == Token.LABEL:
+            return True
+
+        for token in tokens:
+            if token.category in [Token.EQU, Token.ORG, Token.END]:
+                return True
+
+        return False
@@ -97,6 +97,98 @@ DAT #39, #0
 >>> core.print_instruction(2800)
 DAT #39, #0
 >>>
+>>> # Test arithmetic. An immediate A-field is combined with the
+>>> # B-field of the destination, and otherwise both fields of the
+>>> # source with both fields of the destination.
+>>> core.put_instr(Token.ADD, Token.IMMEDIATE, 5, Token.DIRECT, 1, 10)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 3, Token.IMMEDIATE, 7998, 11)
+>>> print(interpreter.execute(10))
+11
+>>> core.print_instruction(11)
+DAT #3, #3
+>>> core.put_instr(Token.SUB, Token.DIRECT, 1, Token.DIRECT, 2, 20)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 3, Token.IMMEDIATE, 10, 21)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 5, Token.IMMEDIATE, 4, 22)
+>>> next_address = interpreter.execute(20)
+>>> core.print_instruction(22)
+DAT #2, #7994
+>>> core.put_instr(Token.MUL, Token.IMMEDIATE, 3, Token.DIRECT, 1, 30)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 7, 31)
+>>> next_address = interpreter.execute(30)
+>>> core.print_instruction(31)
+DAT #0, #21
+>>> core.put_instr(Token.DIV, Token.DIRECT, 1, Token.DIRECT, 2, 40)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 2, Token.IMMEDIATE, 3, 41)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 9, Token.IMMEDIATE, 10, 42)
+>>> next_address = interpreter.execute(40)
+>>> core.print_instruction(42)
+DAT #4, #3
+>>> core.put_instr(Token.MOD, Token.IMMEDIATE, 4, Token.DIRECT, 1, 50)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 10, 51)
+>>> next_address = interpreter.execute(50)
+>>> core.print_instruction(51)
+DAT #0, #2
+>>> core.put_instr(Token.DIV, Token.IMMEDIATE, 0, Token.DIRECT, 1, 60)
+>>> next_address = interpreter.execute(60)
+Traceback (most recent call last):
+    ...
+RuntimeError: Attempt to divide by zero
+>>>
+>>> # Test the conditional jumps
+>>> core.put_instr(Token.JMZ, Token.DIRECT, 5, Token.DIRECT, 1, 70)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 71)
+>>> print(interpreter.execute(70))
+75
+>>> core.put_instr(Token.JMN, Token.DIRECT, 5, Token.DIRECT, 1, 70)
+>>> print(interpreter.execute(70))
+71
+>>> core.put_instr(Token.DJN, Token.DIRECT, 5, Token.DIRECT, 1, 80)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 2, 81)
+>>> print(interpreter.execute(80), interpreter.execute(80))
+85 81
+>>> core.print_instruction(81)
+DAT #0, #0
+>>>
+>>> # Test the comparisons, which skip the next instruction
+>>> core.put_instr(Token.SEQ, Token.DIRECT, 1, Token.DIRECT, 2, 90)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 1, Token.IMMEDIATE, 2, 91)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 1, Token.IMMEDIATE, 2, 92)
+>>> print(interpreter.execute(90))
+92
+>>> core.put_instr(Token.CMP, Token.DIRECT, 1, Token.DIRECT, 2, 90)
+>>> print(interpreter.execute(90))
+92
+>>> core.put_instr(Token.SNE, Token.DIRECT, 1, Token.DIRECT, 2, 90)
+>>> print(interpreter.execute(90))
+91
+>>> core.put_instr(Token.SLT, Token.IMMEDIATE, 1, Token.DIRECT, 1, 90)
+>>> print(interpreter.execute(90))
+92
+>>> core.put_instr(Token.SLT, Token.IMMEDIATE, 2, Token.DIRECT, 1, 90)
+>>> print(interpreter.execute(90))
+91
+>>> # Opcodes and modes are compared exactly, even in a core so
+>>> # small that they would be equal modulo its size
+>>> small = Core(7)
+>>> small.put_instr(Token.SEQ, Token.DIRECT, 1, Token.DIRECT, 2, 0)
+>>> small.put_instr(Token.DAT, Token.DIRECT, 1, Token.DIRECT, 9, 1)
+>>> small.put_instr(Token.JMP, Token.DIRECT, 1, Token.DIRECT, 2, 2)
+>>> print(Interpreter(small, [0]).execute(0))
+1
+>>> small.put_instr(Token.DAT, Token.DIRECT, 1, Token.DIRECT, 2, 2)
+>>> print(Interpreter(small, [0]).execute(0))
+2
+>>>
+>>> # Test SPL, which queues a new process after the current one
+>>> core.put_instr(Token.SPL, Token.DIRECT, 2, Token.NULL, Token.NULL, 0)
+>>> core.put_instr(Token.JMP, Token.DIRECT, 0, Token.NULL, Token.NULL, 1)
+>>> core.put_instr(Token.JMP, Token.DIRECT, 0, Token.NULL, Token.NULL, 2)
+>>> interpreter = Interpreter(core, [0])
+>>> print(interpreter.step(), interpreter.programs[0].process_count())
+1 2
+>>> print(interpreter.run(10), interpreter.cycle)
+[0] 10
+>>>
 >>> # Test processing of JMP
 >>> core.put_instr(Token.JMP, Token.IMMEDIATE, 2000, Token.NULL, Token.NULL, 4002)
 >>> core.print_instruction(4002)
@@ -104,9 +196,148 @@ JMP #2000
 >>> next_address = interpreter.execute(4002)
 >>> print(next_address)
 2000
+>>> core.put_instr(Token.JMP, Token.DIRECT, -2, Token.NULL, Token.NULL, 4003)
+>>> print(interpreter.execute(4003))
+4001
+>>>
+>>> # Test folding of addresses within read and write limits
+>>> core = Core(100)
+>>> interpreter = Interpreter(core, [0], read_limit=10, write_limit=10)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 12, Token.DIRECT, 8, 50)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 7, Token.IMMEDIATE, 7, 52)
+>>> next_address = interpreter.execute(50)
+>>> core.print_instruction(48)
+DAT #7, #7
+>>>
+>>> # Test P-space
+>>> core = Core(100)
+>>> interpreter = Interpreter(core, [0])
+>>> core.put_instr(Token.STP, Token.IMMEDIATE, 7, Token.IMMEDIATE, 3, 10)
+>>> core.put_instr(Token.LDP, Token.IMMEDIATE, 3, Token.DIRECT, 1, 11)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 12)
+>>> next_address = interpreter.execute(interpreter.execute(10))
+>>> core.print_instruction(12)
+DAT #0, #7
+>>> print(interpreter.pspace.cells[0].tolist()[:4])
+[-1, 0, 0, 7]
+>>>
+>>> # Test saving and restoring the state of a battle
+>>> import io
+>>> core = Core(100)
+>>> core.put_instr(Token.SPL, Token.DIRECT, 0, Token.NULL, Token.NULL, 0)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 0, Token.DIRECT, 1, 1)
+>>> interpreter = Interpreter(core, [0])
+>>> remaining = interpreter.run(2)
+>>> stream = io.BytesIO()
+>>> interpreter.save_state(stream)
+>>> print(len(stream.getvalue()))
+2044
+>>> print(interpreter.run(6), interpreter.cycle, interpreter.programs[0].state())
+[0] 6 ([3, 2, 1, 0], 0)
+>>> interpreter.load_state(stream.getvalue())
+>>> print(interpreter.cycle, interpreter.programs[0].state())
+2 ([2, 0], 1)
+>>> core.print_instruction(3)
+NULL
+>>> print(interpreter.run(6), interpreter.cycle, interpreter.programs[0].state())
+[0] 6 ([3, 2, 1, 0], 0)
+>>>
+>>> # Values too large for the 32-bit fields of the saved state are
+>>> # taken modulo the size of the core when an image is loaded
+>>> from battle import Warrior
+>>> warrior = Warrior.from_source('Big', 'big EQU 100000*100000+7\\nMOV #big, 1\\nJMP -1')
+>>> core = Core(100)
+>>> core.load(warrior.image, 0)
+>>> core.print_instruction(0)
+MOV #7, 1
+>>> interpreter = Interpreter(core, [0])
+>>> print(interpreter.run(4))
+[0]
+>>> stream = io.BytesIO()
+>>> interpreter.save_state(stream)
+>>> print(len(stream.getvalue()))
+2040
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 10**12 + 3, Token.IMMEDIATE, -10**12, 5)
+>>> core.print_instruction(5)
+DAT #3, #0
+>>> stream = io.BytesIO()
+>>> interpreter.save_state(stream)
+>>> try:
+...     interpreter.load_state(stream.getvalue()[:-1])
+... except RuntimeError as error:
+...     print(error)
+Saved state is truncated
+>>>
+>>> # The P-space is saved and restored along with the battle
+>>> core = Core(100)
+>>> core.put_instr(Token.STP, Token.IMMEDIATE, 42, Token.IMMEDIATE, 1, 0)
+>>> core.put_instr(Token.LDP, Token.IMMEDIATE, 1, Token.DIRECT, 1, 1)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 2)
+>>> interpreter = Interpreter(core, [0])
+>>> print(interpreter.run(1))
+[0]
+>>> stream = io.BytesIO()
+>>> interpreter.save_state(stream)
+>>> restored = Interpreter(Core(100), [])
+>>> restored.load_state(stream.getvalue())
+>>> print(restored.pspace.cells[0].tolist()[:2])
+[-1, 42]
+>>> print(restored.run(2))
+[0]
+>>> restored.core.print_instruction(2)
+DAT #0, #42
+>>>
+>>> # Test fusing pairs of instructions, which a lone program with a
+>>> # single process executes in one dispatch, with the same result,
+>>> # also when sampled in blocks of an odd number of cycles
+>>> from metrics import Metrics
+>>> fields = []
+>>> for fuse, metrics in [(True, None), (False, None), (True, Metrics(5))]:
+...     core = Core(100)
+...     core.put_instr(Token.ADD, Token.IMMEDIATE, 4, Token.DIRECT, 3, 0)
+...     core.put_instr(Token.MOV, Token.DIRECT, 2, Token.INDIRECT, 2, 1)
+...     core.put_instr(Token.JMP, Token.DIRECT, -2, Token.NULL, Token.NULL, 2)
+...     core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 3)
+...     interpreter = Interpreter(core, [0], metrics=metrics, fuse=fuse)
+...     print(interpreter.run(41), interpreter.cycle)
+...     fields.append(core.fields())
+[0] 41
+[0] 41
+[0] 41
+>>> print(fields[0] == fields[1] == fields[2], sum(metrics.process_count.counts))
+True 9
+>>>
+>>> # A process which dies executing the second instruction of a
+>>> # fused pair dies at its address, as it does unfused
+>>> import io
+>>> import json
+>>> from events import EventSink
+>>> for fuse in [True, False]:
+...     core = Core(100)
+...     core.put_instr(Token.ADD, Token.IMMEDIATE, 1, Token.DIRECT, 5, 0)
+...     core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 1)
+...     stream = io.StringIO()
+...     sink = EventSink(stream)
+...     print(Interpreter(core, [0], events=sink, fuse=fuse).run(10))
+...     sink.close()
+...     print(json.loads(stream.getvalue())['deaths'])
+[]
+[[0, 1]]
+[]
+[[0, 1]]
 """
 
+import struct
+import sys
+import time
+from array import array
+
 from assemblytoken import AssemblyToken as Token
+from pspace import PSpace
+
+# The modules of optional features, such as profiling and tracing,
+# are imported only when a feature is used, so that they do not
+# slow the start-up of programs which do not use them
 
 
 class Program:
@@ -130,6 +361,9 @@ class Program:
         # the first entry
         self.__index = 0
 
+        # The P-space cells of the program, if it has any
+        self.pspace = None
+
     def add_process(self, address):
         """
         Adds a new process to the process list
@@ -140,6 +374,32 @@ class Program:
 
         self.__processes.append(address)
 
+    def split_process(self, address, limit):
+        """
+        Adds a new process which will run after every other
+        process, including the current one, has had its turn.
+        The new process is placed after the current process,
+        and the index moved on to it, so that next_process()
+        continues in turn.
+
+        :param address: The base address of the process
+        :param limit: The maximum number of processes, beyond
+        which the new process is not added
+        """
+
+        if len(self.__processes) < limit:
+            self.__index += 1
+            self.__processes.insert(self.__index, address)
+
+    def process_count(self):
+        """
+        Returns the number of processes
+
+        :return: The number of processes
+        """
+
+        return len(self.__processes)
+
     def current_process_pc(self):
         """
         Returns the program counter
@@ -181,6 +441,11 @@ class Program:
 
         del self.__processes[self.__index]
 
+        # The index now refers to the following process,
+        # wrapping around to the start of the list if necessary
+        if self.__index == len(self.__processes):
+            self.__index = 0
+
     def update_current_process_pc(self, address):
         """
         Updates the program counter of the current
@@ -194,26 +459,366 @@ class Program:
 
         self.__processes[self.__index] = address
 
+    def state(self):
+        """
+        Returns the state of the program
+
+        :return: A pair of the list of program counters of
+        the processes, and the index of the current process
+        """
+
+        return self.__processes, self.__index
+
+    def restore(self, processes, index):
+        """
+        Restores the state of the program, as returned by state()
+
+        :param processes: The program counters of the processes
+        :param index: The index of the current process
+        """
+
+        if index < 0 or index > max(len(processes) - 1, 0):
+            raise IndexError('Invalid process index specified')
+
+        self.__processes = list(processes)
+        self.__index = index
+
+
+class ObservedProgram(Program):
+    """
+    Class to model a program which records the spawning and
+    death of its processes in an event sink, and marks itself
+    as the writer in an ownership as each of its turns begins.
+    """
+
+    def __init__(self, base_address, number, sink=None, ownership=None):
+        """
+        Initialise the program
+
+        :param base_address: The core base address of the program
+        :param number: The number of the program
+        :param sink: An optional event sink in which to record events
+        :param ownership: An optional ownership in which to mark the writer
+        """
+
+        super().__init__(base_address)
+
+        self.__number = number
+        self.__sink = sink
+        self.__ownership = ownership
+
+    def current_process_pc(self):
+        # The program counter is fetched as the turn of the
+        # program begins, so it is the writer until the next turn
+        if self.__ownership is not None:
+            self.__ownership.writer = self.__number
+
+        return super().current_process_pc()
+
+    def split_process(self, address, limit):
+        count = self.process_count()
+        super().split_process(address, limit)
+
+        # The process is not added if the limit has been reached
+        if self.__sink is not None and self.process_count() > count:
+            self.__sink.spawn(self.__number, address)
+
+    def kill_current_process(self):
+        address = super().current_process_pc()
+        super().kill_current_process()
+
+        if self.__sink is not None:
+            self.__sink.death(self.__number, address)
+
 
 class Interpreter:
 
-    def __init__(self, core, base_addresses):
+    # Layout of the header of a saved state: an identifying tag,
+    # the format version, the size of the core, the number of
+    # programs, the cycle counter and the number of P-space cells
+    # of each program, or 0 if there is no P-space, all little-endian
+    state_header = struct.Struct('<4sIIIqI')
+    state_tag = b'RCST'
+    state_version = 2
+
+    def __init__(self, core, base_addresses, profile=False, max_processes=None,
+                 trace=0, trace_stream=None, events=None, ownership=False,
+                 read_limit=None, write_limit=None, pspace=None, metrics=None,
+                 fuse=True):
         """
         Initialises the interpreter with the given core.
 
         :param core: The core in which the program to be executed resides
         :param base_addresses: List of base addresses at which programs reside
+        :param profile: If True, executions and core accesses are
+        counted in a profile
+        :param max_processes: The maximum number of processes per program,
+        defaulting to the size of the core
+        :param trace: If non-zero, the number of most recent executions
+        held in a trace, which is dumped whenever a process dies by
+        executing a DAT or an empty word
+        :param trace_stream: The stream to which the trace is dumped,
+        defaulting to standard error
+        :param events: An optional EventSink, in which writes to the
+        core and the spawning and death of processes are recorded
+        :param ownership: If True, the owner of each word of the core
+        is tracked, along with coverage and hit counts for each program
+        :param read_limit: The range of addresses around an instruction
+        from which it may read, defaulting to the whole core
+        :param write_limit: The range of addresses around an instruction
+        to which it may write, defaulting to the whole core
+        :param pspace: The PSpace holding the P-space of each program,
+        which by default is created if LDP or STP is executed
+        :param metrics: An optional Metrics, in which the throughput
+        and number of processes are sampled while running
+        :param fuse: If True, common pairs of instructions are executed
+        together by a lone program with a single process, in run()
 
         """
 
         self.__core = core
+        self.__base_core = core  # The core itself, even when wrapped
+        self.__coresize = core.coresize
+
+        if max_processes is None:
+            max_processes = core.coresize
+
+        self.__max_processes = max_processes
+
+        # Writes through the B operand are resolved as reads are, unless
+        # there is a limit, in which case every operand is resolved by
+        # folding its offsets with precomputed tables
+        self.__b_write_address = self.__b_address
+        self.__read_limit = read_limit
+        self.__write_limit = write_limit
+        self.__read_fold = None
+        self.__write_fold = None
+
+        if read_limit is not None or write_limit is not None:
+            self.__read_fold = self.__fold_table(read_limit or core.coresize)
+            self.__write_fold = self.__fold_table(write_limit or core.coresize)
+
+            self.__a_address = self.__folded_a_address
+            self.__b_address = self.__folded_b_address
+            self.__b_write_address = self.__folded_b_write_address
+
+        # Table of the handler for each opcode, indexed by opcode value
+        self.__handlers = [self.__execute_unrecognised] * len(Token.catnames)
+        self.__handlers[Token.DAT] = self.__execute_dat
+        self.__handlers[Token.MOV] = self.__execute_mov
+        self.__handlers[Token.ADD] = self.__execute_arithmetic
+        self.__handlers[Token.SUB] = self.__execute_arithmetic
+        self.__handlers[Token.MUL] = self.__execute_arithmetic
+        self.__handlers[Token.DIV] = self.__execute_arithmetic
+        self.__handlers[Token.MOD] = self.__execute_arithmetic
+        self.__handlers[Token.JMP] = self.__execute_jmp
+        self.__handlers[Token.JMZ] = self.__execute_jmz
+        self.__handlers[Token.JMN] = self.__execute_jmz
+        self.__handlers[Token.DJN] = self.__execute_djn
+        self.__handlers[Token.SPL] = self.__execute_spl
+        self.__handlers[Token.CMP] = self.__execute_seq
+        self.__handlers[Token.SEQ] = self.__execute_seq
+        self.__handlers[Token.SNE] = self.__execute_sne
+        self.__handlers[Token.SLT] = self.__execute_slt
+        self.__handlers[Token.LDP] = self.__execute_ldp
+        self.__handlers[Token.STP] = self.__execute_stp
+        self.__handlers[Token.NOP] = self.__execute_nop
+        self.__handlers[Token.NULL] = self.__execute_null
+
+        # Table of the fused handler for each opcode which begins a pair
+        # of instructions executed together, indexed by opcode value.
+        # Pairs are executed only by a lone program with a single process,
+        # as otherwise another process runs between the two instructions.
+        # The fused handlers resolve operands directly, so they are not
+        # used with limits, nor when profiling or tracing replace
+        # execute() or step().
+        self.__fuse = (fuse and read_limit is None and write_limit is None
+                       and not profile and not trace)
+        self.__fused = [None] * len(Token.catnames)
+        if self.__fuse:
+            self.__fused[Token.ADD] = self.__fused_add
+            self.__fused[Token.DJN] = self.__fused_djn
+
+        # When profiling, core accesses are counted by wrapping the core,
+        # and executions by replacing execute(), so that an interpreter
+        # which is not profiling does no extra work. Instructions read
+        # whole as operands are then read through the profiled core,
+        # which counts them, rather than as fetches, which it does not.
+        self.__read_instruction = core.instruction
+        self.__profile = None
+        if profile:
+            from profiler import Profile, ProfiledCore
+
+            self.__profile = Profile(core.coresize)
+            self.__core = ProfiledCore(core, self.__profile)
+            self.__read_instruction = self.__core.read_instruction
+            self.execute = self.__execute_profiled
+
+        # Likewise, executions are traced by replacing step()
+        self.__trace = None
+        if trace:
+            from tracer import Trace
+
+            self.__trace = Trace(trace)
+            self.__trace_stream = trace_stream if trace_stream is not None else sys.stderr
+            self.step = self.__step_traced
+
+            # Table of the fold applied to the B operand of each opcode,
+            # indexed by opcode value, which is the write fold for opcodes
+            # which write through it
+            self.__trace_b_folds = [self.__read_fold] * len(Token.catnames)
+            for opcode in (Token.MOV, Token.ADD, Token.SUB, Token.MUL,
+                           Token.DIV, Token.MOD, Token.DJN, Token.LDP):
+                self.__trace_b_folds[opcode] = self.__write_fold
+
+        # Events are recorded by wrapping the core, and by
+        # programs which record their own processes
+        self.__events = events
+        if events is not None:
+            from events import EventCore
+
+            self.__core = EventCore(self.__core, events)
+
+        # Ownership is tracked by wrapping the core, and by programs
+        # which mark themselves as the writer during their turns
+        self.__ownership = None
+        if ownership:
+            from ownership import Ownership, OwnedCore
+
+            self.__ownership = Ownership(core.coresize, len(base_addresses))
+            self.__core = OwnedCore(self.__core, self.__ownership)
+
+        # Metrics are sampled by replacing run(), which then runs
+        # in blocks of cycles, timing each block as a whole
+        self.__metrics = metrics
+        if metrics is not None:
+            self.run = self.__run_sampled
+
+        # Initialise a list of programs, each of which holds the processes that
+        # it has spawned, where each process is defined by its program counter.
+        # Upon creation there will be just one process per program, at the base
+        # address. Programs are identified by their index in the list.
+        self.__pspace = pspace
+        self.__programs = [self.__new_program(base_address, number)
+                           for number, base_address in enumerate(base_addresses)]
+
+        # The program whose turn it is
+        self.__program = self.__programs[0] if self.__programs else None
+
+        self.__cycle = 0               # Number of cycles executed
+        self.__split_address = None    # Address of a process to be split off
+        self.__divide_by_zero = False  # Set by a division by zero
+
+    def __new_program(self, base_address, number):
+        """
+        Creates a program, which records events if there is an event
+        sink, and marks its turns if ownership is being tracked
+
+        :param base_address: The core base address of the program
+        :param number: The number of the program
+
+        :return: The program
+        """
 
-        # Initialise a dictionary to map programs to processes that they have spawned,
-        # where each process is defined by its program counter. Upon creation
-        # there will be just one process per program, with the base address as key.
-        self.__programs = {}
-        for base_address in base_addresses:
-            self.__programs[base_address] = Program(base_address)
+        if self.__events is not None or self.__ownership is not None:
+            program = ObservedProgram(base_address, number,
+                                      self.__events, self.__ownership)
+
+        else:
+            program = Program(base_address)
+
+        if self.__pspace is not None:
+            program.pspace = self.__pspace.cells[number]
+
+        return program
+
+    @property
+    def core(self):
+        """
+        Returns the core in which the programs are executed.
+        """
+
+        return self.__base_core
+
+    @property
+    def max_processes(self):
+        """
+        Returns the maximum number of processes per program.
+        """
+
+        return self.__max_processes
+
+    @property
+    def read_limit(self):
+        """
+        Returns the read limit, or None if there is none.
+        """
+
+        return self.__read_limit
+
+    @property
+    def write_limit(self):
+        """
+        Returns the write limit, or None if there is none.
+        """
+
+        return self.__write_limit
+
+    @property
+    def profile(self):
+        """
+        Returns the profile, or None if not profiling.
+        """
+
+        return self.__profile
+
+    @property
+    def trace(self):
+        """
+        Returns the trace, or None if not tracing.
+        """
+
+        return self.__trace
+
+    @property
+    def events(self):
+        """
+        Returns the event sink, or None if not recording events.
+        """
+
+        return self.__events
+
+    @property
+    def ownership(self):
+        """
+        Returns the ownership, or None if not tracking ownership.
+        """
+
+        return self.__ownership
+
+    @property
+    def pspace(self):
+        """
+        Returns the PSpace, or None if there is none.
+        """
+
+        return self.__pspace
+
+    @property
+    def cycle(self):
+        """
+        Returns the number of cycles executed.
+        """
+
+        return self.__cycle
+
+    @property
+    def programs(self):
+        """
+        Returns the list of programs, indexed by program number.
+        """
+
+        return self.__programs
 
     def __next(self, address):
         """
@@ -232,104 +837,289 @@ class Interpreter:
         else:
             return address + 1
 
-    def __get_direct_address(self, direct_val, address):
+    def __a_address(self, a_mode, a_val, address):
         """
-        Resolve the absolute address pointed to by the direct value,
-        relative to the specified address
+        Resolve the absolute address referred to by an A-field operand.
+        An immediate operand refers to the instruction itself, and an
+        indirect operand is taken through the A-field of the
+        intermediate word.
 
-        :param direct_val: A direct addressing mode value
-        :param address: The address from which to calculate the address being
-        pointed to
+        :param a_mode: The A-field addressing mode
+        :param a_val: The A-field value
+        :param address: The address of the instruction
 
         :return: The absolute address which is being pointed to
         """
 
-        if address < 0 or address >= self.__core.coresize:
-            raise IndexError('Invalid address specified')
+        if a_mode == Token.IMMEDIATE:
+            return address
+
+        elif a_mode == Token.DIRECT:
+            return (a_val + address) % self.__coresize
 
-        return (direct_val + address) % self.__core.coresize
+        else:  # A-field is INDIRECT
+            intermediate_address = (a_val + address) % self.__coresize
+            intermediate_a_val = self.__core.a_field_val(intermediate_address)
+            return (a_val + intermediate_a_val + address) % self.__coresize
 
-    def __execute_add(self, address):
+    def __b_address(self, b_mode, b_val, address):
         """
-        Executes the ADD instruction.
+        Resolve the absolute address referred to by a B-field operand.
+        An immediate operand refers to the instruction itself, and an
+        indirect operand is taken through the B-field of the
+        intermediate word.
 
-        :param address: The address of the ADD instruction
+        :param b_mode: The B-field addressing mode
+        :param b_val: The B-field value
+        :param address: The address of the instruction
 
-        :return: The address of the next instruction
+        :return: The absolute address which is being pointed to
         """
 
-        # Acquire operand modes and values
-        a_mode = self.__core.a_field_mode(address)
-        a_val = self.__core.a_field_val(address)
+        if b_mode == Token.IMMEDIATE:
+            return address
 
-        b_mode = self.__core.b_field_mode(address)
-        b_val = self.__core.b_field_val(address)
+        elif b_mode == Token.DIRECT:
+            return (b_val + address) % self.__coresize
+
+        else:  # B-field is INDIRECT
+            intermediate_address = (b_val + address) % self.__coresize
+            intermediate_b_val = self.__core.b_field_val(intermediate_address)
+            return (b_val + intermediate_b_val + address) % self.__coresize
+
+    def __folded_a_address(self, a_mode, a_val, address):
+        """
+        Resolve the absolute address referred to by an A-field operand
+        as __a_address() does, folding each offset within the read limit.
+        Replaces __a_address() when there is a read limit.
+
+        :param a_mode: The A-field addressing mode
+        :param a_val: The A-field value
+        :param address: The address of the instruction
+
+        :return: The absolute address which is being pointed to
+        """
 
         if a_mode == Token.IMMEDIATE:
-            if b_mode == Token.IMMEDIATE:
-                self.__core.put_b_field_val(b_val + a_val, address)
+            return address
 
-            elif b_mode == Token.DIRECT:
-                dest_address = self.__get_direct_address(b_val, address)
-                b_val = self.__core.b_field_val(dest_address)
-                self.__core.put_b_field_val(b_val + a_val, dest_address)
+        offset = self.__read_fold[a_val % self.__coresize]
 
-            elif b_mode == Token.INDIRECT:
-                intermediate_address = self.__get_direct_address(b_val, address)
-                intermediate_b_val = self.__core.b_field_val(intermediate_address)
-                dest_address = self.__get_direct_address(b_val + intermediate_b_val, address)
-                b_val = self.__core.b_field_val(dest_address)
-                self.__core.put_b_field_val(b_val + a_val, dest_address)
+        if a_mode != Token.DIRECT:  # A-field is INDIRECT
+            intermediate_a_val = self.__core.a_field_val((offset + address) % self.__coresize)
+            offset = self.__read_fold[(offset + intermediate_a_val) % self.__coresize]
 
-        elif a_mode == Token.DIRECT:
-            src_address = self.__get_direct_address(a_val, address)
-            src_b_val = self.__core.b_field_val(src_address)
+        return (offset + address) % self.__coresize
 
-            if b_mode == Token.IMMEDIATE:
-                self.__core.put_b_field_val(b_val + src_b_val, address)
+    def __folded_b_address(self, b_mode, b_val, address):
+        """
+        Resolve the absolute address read through a B-field operand
+        as __b_address() does, folding each offset within the read limit.
+        Replaces __b_address() when there is a read limit.
+
+        :param b_mode: The B-field addressing mode
+        :param b_val: The B-field value
+        :param address: The address of the instruction
 
-            elif b_mode == Token.DIRECT:
-                # Add both fields of source to both fields of destination
-                src_a_val = self.__core.a_field_val(src_address)
+        :return: The absolute address which is being pointed to
+        """
 
-                dest_address = self.__get_direct_address(b_val, address)
+        if b_mode == Token.IMMEDIATE:
+            return address
 
-                a_val = self.__core.a_field_val(dest_address)
-                b_val = self.__core.b_field_val(dest_address)
-                self.__core.put_a_field_val(a_val + src_a_val, dest_address)
-                self.__core.put_b_field_val(b_val + src_b_val, dest_address)
+        offset = self.__read_fold[b_val % self.__coresize]
 
-            elif b_mode == Token.INDIRECT:
-                # Add both fields of source to both fields of destination
-                src_a_val = self.__core.a_field_val(src_address)
+        if b_mode != Token.DIRECT:  # B-field is INDIRECT
+            intermediate_b_val = self.__core.b_field_val((offset + address) % self.__coresize)
+            offset = self.__read_fold[(offset + intermediate_b_val) % self.__coresize]
 
-                intermediate_address = self.__get_direct_address(b_val, address)
-                intermediate_b_val = self.__core.b_field_val(intermediate_address)
-                dest_address = self.__get_direct_address(b_val + intermediate_b_val, address)
+        return (offset + address) % self.__coresize
 
-                a_val = self.__core.a_field_val(dest_address)
-                b_val = self.__core.b_field_val(dest_address)
-                self.__core.put_a_field_val(a_val + src_a_val, dest_address)
-                self.__core.put_b_field_val(b_val + src_b_val, dest_address)
+    def __folded_b_write_address(self, b_mode, b_val, address):
+        """
+        Resolve the absolute address written through a B-field operand.
+        The intermediate word of an indirect operand is read, so is
+        folded within the read limit, while the final offset is folded
+        within the write limit. Replaces __b_write_address() when there
+        is a read or write limit.
+
+        :param b_mode: The B-field addressing mode
+        :param b_val: The B-field value
+        :param address: The address of the instruction
+
+        :return: The absolute address which is being pointed to
+        """
+
+        if b_mode == Token.IMMEDIATE:
+            return address
+
+        if b_mode == Token.DIRECT:
+            offset = self.__write_fold[b_val % self.__coresize]
+
+        else:  # B-field is INDIRECT
+            offset = self.__read_fold[b_val % self.__coresize]
+            intermediate_b_val = self.__core.b_field_val((offset + address) % self.__coresize)
+            offset = self.__write_fold[(offset + intermediate_b_val) % self.__coresize]
+
+        return (offset + address) % self.__coresize
+
+    def __fold_table(self, limit):
+        """
+        Creates the table which folds an offset from the executing
+        instruction into the window of a read or write limit, as in
+        pMARS. The offset, taken modulo the size of the core, indexes
+        the table, which gives the folded offset.
+
+        :param limit: The limit, between 1 and the size of the core
+
+        :return: The table, as a list
+        """
+
+        if limit < 1 or limit > self.__coresize:
+            raise RuntimeError('Limit must be between 1 and the size of the core')
+
+        table = []
+        for offset in range(self.__coresize):
+            folded = offset % limit
+
+            # Offsets beyond half the limit fold back behind
+            # the instruction
+            if folded > limit // 2:
+                folded += self.__coresize - limit
+
+            table.append(folded)
+
+        return table
+
+    def __jump_address(self, a_mode, a_val, address):
+        """
+        Resolve the address to which a jump or split is made.
+        An immediate operand gives the absolute address.
+
+        :param a_mode: The A-field addressing mode
+        :param a_val: The A-field value
+        :param address: The address of the instruction
+
+        :return: The address to which to jump
+        """
+
+        if a_mode == Token.IMMEDIATE:
+            return a_val % self.__coresize
+
+        return self.__a_address(a_mode, a_val, address)
+
+    def __skip(self, address):
+        """
+        Returns the address two words after the specified
+        address, skipping the next instruction.
+
+        :param address: The address
+
+        :return: The address of the instruction after next
+        """
+
+        return (address + 2) % self.__coresize
+
+    def __execute_arithmetic(self, address):
+        """
+        Executes the ADD, SUB, MUL, DIV and MOD instructions. An immediate
+        A-field is combined with the B-field of the destination. Otherwise
+        the B-field of the source is combined with the B-field of the
+        instruction itself if the B-field is immediate, or both fields of
+        the source with both fields of the destination. Results are taken
+        modulo the size of the core.
+
+        A division by zero terminates the process, after any division in
+        the other field has been made.
+
+        :param address: The address of the instruction
+
+        :return: The address of the next instruction
+        """
+
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+
+        if a_mode == Token.IMMEDIATE:
+            dest_address = self.__b_write_address(b_mode, b_val, address)
+            dest_b_val = self.__core.b_field_val(dest_address)
+            results = [None, self.__arithmetic(opcode, dest_b_val, a_val)]
+
+        else:
+            src_address = self.__a_address(a_mode, a_val, address)
+            src_a_val = self.__core.a_field_val(src_address)
+            src_b_val = self.__core.b_field_val(src_address)
 
-        else:  # A-field is INDIRECT
             if b_mode == Token.IMMEDIATE:
-                pass
+                dest_address = address
+                results = [None, self.__arithmetic(opcode, b_val, src_b_val)]
+
+            else:
+                # Combine both fields of source with both fields of destination
+                dest_address = self.__b_write_address(b_mode, b_val, address)
+                results = [self.__arithmetic(opcode, self.__core.a_field_val(dest_address),
+                                             src_a_val),
+                           self.__arithmetic(opcode, self.__core.b_field_val(dest_address),
+                                             src_b_val)]
+
+                # Both fields are written together, as a single write
+                # to the instruction
+                if results[0] is not None and results[1] is not None:
+                    self.__core.put_field_vals(results[0], results[1], dest_address)
+                    results = [None, None]
+
+        if results[0] is not None:
+            self.__core.put_a_field_val(results[0], dest_address)
 
-            elif b_mode == Token.DIRECT:
-                pass
+        if results[1] is not None:
+            self.__core.put_b_field_val(results[1], dest_address)
 
-            elif b_mode == Token.INDIRECT:
-                pass
+        if self.__divide_by_zero:
+            self.__divide_by_zero = False
+            raise RuntimeError('Attempt to divide by zero')
 
         # Return the next instruction address
         return self.__next(address)
 
+    def __arithmetic(self, opcode, value, operand):
+        """
+        Combines two field values with an arithmetic opcode
+
+        :param opcode: The arithmetic opcode
+        :param value: The destination value
+        :param operand: The source value
+
+        :return: The result modulo the size of the core, or None
+        if the opcode divides by zero
+        """
+
+        value %= self.__coresize
+        operand %= self.__coresize
+
+        if opcode == Token.ADD:
+            return (value + operand) % self.__coresize
+
+        elif opcode == Token.SUB:
+            return (value - operand) % self.__coresize
+
+        elif opcode == Token.MUL:
+            return (value * operand) % self.__coresize
+
+        elif operand == 0:
+            self.__divide_by_zero = True
+            return None
+
+        elif opcode == Token.DIV:
+            return value // operand
+
+        else:  # Opcode is MOD
+            return value % operand
+
     def __execute_jmp(self, address):
         """
         Executes the JMP instruction. Only the A-field is used.
-        Addressing mode is expected to be either immediate or
-        direct.
+        An immediate A-field gives the absolute address to
+        which to jump.
 
         :param address: The address of the JMP instruction
 
@@ -337,98 +1127,204 @@ class Interpreter:
         """
 
         # Acquire operand modes and values
-        a_mode = self.__core.a_field_mode(address)
-        a_val = self.__core.a_field_val(address)
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
 
-        if a_mode == Token.IMMEDIATE:
-            return self.__core.a_field_val(address)
+        return self.__jump_address(a_mode, a_val, address)
 
-        elif a_mode == Token.DIRECT:
-            dest_address = self.__get_direct_address(a_val, address)
-            return self.__core.a_field_val(dest_address)
+    def __execute_jmz(self, address):
+        """
+        Executes the JMZ and JMN instructions, which jump to the A-field
+        address if the B-field at the B-field address is zero, or
+        non-zero, respectively.
 
-        else:
-            raise RuntimeError('Invalid JMP addressing mode')
+        :param address: The address of the instruction
 
-    def __execute_mov(self, address):
+        :return: The address of the next instruction
         """
-        Executes the MOV instruction.
 
-        :param address: The address of the MOV instruction
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+
+        test_address = self.__b_address(b_mode, b_val, address)
+        zero = self.__core.b_field_val(test_address) % self.__coresize == 0
+
+        if zero == (opcode == Token.JMZ):
+            return self.__jump_address(a_mode, a_val, address)
+
+        return self.__next(address)
+
+    def __execute_djn(self, address):
+        """
+        Executes the DJN instruction, which decrements the B-field at
+        the B-field address, then jumps to the A-field address if the
+        result is non-zero.
+
+        :param address: The address of the DJN instruction
+
+        :return: The address of the next instruction
+        """
+
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+
+        dest_address = self.__b_write_address(b_mode, b_val, address)
+        value = (self.__core.b_field_val(dest_address) - 1) % self.__coresize
+        self.__core.put_b_field_val(value, dest_address)
+
+        if value != 0:
+            return self.__jump_address(a_mode, a_val, address)
+
+        return self.__next(address)
+
+    def __execute_spl(self, address):
+        """
+        Executes the SPL instruction, which continues with the next
+        instruction and splits off a new process at the A-field address.
+        The new process is added to the program by step().
+
+        :param address: The address of the SPL instruction
 
         :return: The address of the next instruction
         """
 
         # Acquire operand modes and values
-        a_mode = self.__core.a_field_mode(address)
-        a_val = self.__core.a_field_val(address)
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
 
-        b_mode = self.__core.b_field_mode(address)
-        b_val = self.__core.b_field_val(address)
+        self.__split_address = self.__jump_address(a_mode, a_val, address)
+
+        return self.__next(address)
+
+    def __compare(self, address):
+        """
+        Acquires the operands compared by the CMP, SEQ, SNE and SLT
+        instructions. An immediate A-field is compared with the B-field
+        at the B-field address. Otherwise the B-field at the A-field
+        address is compared with the B-field of the instruction itself
+        if the B-field is immediate, or with the B-field at the B-field
+        address for SLT. Otherwise the whole instructions at the two
+        addresses are compared.
+
+        :param address: The address of the instruction
+
+        :return: A pair of lists of values, compared in order
+        """
+
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
 
         if a_mode == Token.IMMEDIATE:
-            if b_mode == Token.IMMEDIATE:
-                self.__core.put_b_field_val(a_val, address)
+            dest_address = self.__b_address(b_mode, b_val, address)
+            return [a_val], [self.__core.b_field_val(dest_address)]
 
-            elif b_mode == Token.DIRECT:
-                dest_address = self.__get_direct_address(b_val, address)
-                self.__core.put_b_field_val(a_val, dest_address)
+        src_address = self.__a_address(a_mode, a_val, address)
 
-            elif b_mode == Token.INDIRECT:
-                intermediate_address = self.__get_direct_address(b_val, address)
-                intermediate_b_val = self.__core.b_field_val(intermediate_address)
-                dest_address = self.__get_direct_address(b_val + intermediate_b_val, address)
-                self.__core.put_b_field_val(a_val, dest_address)
+        if b_mode == Token.IMMEDIATE:
+            return [self.__core.b_field_val(src_address)], [b_val]
 
-        elif a_mode == Token.DIRECT:
-            src_address = self.__get_direct_address(a_val, address)
+        dest_address = self.__b_address(b_mode, b_val, address)
 
-            if b_mode == Token.IMMEDIATE:
-                b_val = self.__core.b_field_val(src_address)
-                self.__core.put_b_field_val(b_val, address)
+        if opcode == Token.SLT:
+            return ([self.__core.b_field_val(src_address)],
+                    [self.__core.b_field_val(dest_address)])
 
-            elif b_mode == Token.DIRECT:
-                dest_address = self.__get_direct_address(b_val, address)
-                self.__core.put_instr(self.__core.opcode(src_address),
-                                      self.__core.a_field_mode(src_address),
-                                      self.__core.a_field_val(src_address),
-                                      self.__core.b_field_mode(src_address),
-                                      self.__core.b_field_val(src_address),
-                                      dest_address)
+        return (self.__read_instruction(src_address),
+                self.__read_instruction(dest_address))
 
-            elif b_mode == Token.INDIRECT:
-                intermediate_address = self.__get_direct_address(b_val, address)
-                intermediate_b_val = self.__core.b_field_val(intermediate_address)
-                dest_address = self.__get_direct_address(b_val + intermediate_b_val, address)
-                self.__core.put_instr(self.__core.opcode(src_address),
-                                      self.__core.a_field_mode(src_address),
-                                      self.__core.a_field_val(src_address),
-                                      self.__core.b_field_mode(src_address),
-                                      self.__core.b_field_val(src_address),
-                                      dest_address)
+    def __equal(self, src, dest):
+        """
+        Returns True if two lists of values acquired by __compare()
+        are equal, taking the values modulo the size of the core.
+        The opcodes and modes of whole instructions are compared exactly.
+        """
 
-        else:  # A-field is INDIRECT
-            intermediate_address = self.__get_direct_address(a_val, address)
-            intermediate_a_val = self.__core.a_field_val(intermediate_address)
-            src_address = self.__get_direct_address(a_val + intermediate_a_val, address)
+        if len(src) == 1:
+            return (src[0] - dest[0]) % self.__coresize == 0
+
+        return (src[0] == dest[0] and src[1] == dest[1] and src[3] == dest[3]
+                and (src[2] - dest[2]) % self.__coresize == 0
+                and (src[4] - dest[4]) % self.__coresize == 0)
+
+    def __execute_seq(self, address):
+        """
+        Executes the CMP and SEQ instructions, which skip the next
+        instruction if the operands are equal.
+
+        :param address: The address of the instruction
+
+        :return: The address of the next instruction
+        """
+
+        if self.__equal(*self.__compare(address)):
+            return self.__skip(address)
+
+        return self.__next(address)
+
+    def __execute_sne(self, address):
+        """
+        Executes the SNE instruction, which skips the next
+        instruction if the operands are not equal.
+
+        :param address: The address of the SNE instruction
+
+        :return: The address of the next instruction
+        """
+
+        if not self.__equal(*self.__compare(address)):
+            return self.__skip(address)
+
+        return self.__next(address)
+
+    def __execute_slt(self, address):
+        """
+        Executes the SLT instruction, which skips the next instruction
+        if the A operand is less than the B operand.
+
+        :param address: The address of the SLT instruction
+
+        :return: The address of the next instruction
+        """
+
+        [src_val], [dest_val] = self.__compare(address)
+
+        if src_val % self.__coresize < dest_val % self.__coresize:
+            return self.__skip(address)
+
+        return self.__next(address)
+
+    def __execute_mov(self, address):
+        """
+        Executes the MOV instruction. An immediate A-field is moved to
+        the B-field of the destination. Otherwise, if the B-field is
+        immediate, the B-field of the source (or its A-field, if the
+        A-field is indirect) is moved to the B-field of the instruction
+        itself, or else the whole source instruction is moved.
+
+        :param address: The address of the MOV instruction
+
+        :return: The address of the next instruction
+        """
+
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+
+        if a_mode == Token.IMMEDIATE:
+            dest_address = self.__b_write_address(b_mode, b_val, address)
+            self.__core.put_b_field_val(a_val, dest_address)
+
+        else:
+            src_address = self.__a_address(a_mode, a_val, address)
 
             if b_mode == Token.IMMEDIATE:
-                src_a_val = self.__core.a_field_val(src_address)
-                self.__core.put_b_field_val(src_a_val, address)
+                if a_mode == Token.INDIRECT:
+                    value = self.__core.a_field_val(src_address)
 
-            elif b_mode == Token.DIRECT:
-                dest_address = self.__get_direct_address(b_val, address)
-                self.__core.put_instr(self.__core.opcode(src_address),
-                                      self.__core.a_field_mode(src_address),
-                                      self.__core.a_field_val(src_address),
-                                      self.__core.b_field_mode(src_address),
-                                      self.__core.b_field_val(src_address),
-                                      dest_address)
+                else:
+                    value = self.__core.b_field_val(src_address)
+
+                self.__core.put_b_field_val(value, address)
 
-            elif b_mode == Token.INDIRECT:
-                intermediate_address = self.__get_direct_address(b_val, address)
-                intermediate_b_val = self.__core.b_field_val(intermediate_address)
-                dest_address = self.__get_direct_address(b_val + intermediate_b_val, address)
+            else:
+                dest_address = self.__b_write_address(b_mode, b_val, address)
                 self.__core.put_instr(self.__core.opcode(src_address),
                                       self.__core.a_field_mode(src_address),
                                       self.__core.a_field_val(src_address),
@@ -439,6 +1335,115 @@ class Interpreter:
         # Return the next instruction address
         return self.__next(address)
 
+    def __execute_nop(self, address):
+        """
+        Executes the NOP instruction, which has no effect.
+
+        :param address: The address of the NOP instruction
+
+        :return: The address of the next instruction
+        """
+
+        return self.__next(address)
+
+    def __execute_dat(self, address):
+        """
+        Executes the DAT instruction, which cannot be executed.
+
+        :param address: The address of the DAT instruction
+        """
+
+        raise RuntimeError('Attempt to execute DAT')
+
+    def __execute_null(self, address):
+        """
+        Executes an empty core word, which cannot be executed.
+
+        :param address: The address of the empty word
+        """
+
+        raise RuntimeError('Attempt to execute null instruction')
+
+    def __execute_ldp(self, address):
+        """
+        Executes the LDP instruction, which loads the P-space cell
+        indexed by the A operand into the B-field at the B-field
+        address. An immediate A-field is the index itself, otherwise
+        the index is the B-field at the A-field address.
+
+        :param address: The address of the LDP instruction
+
+        :return: The address of the next instruction
+        """
+
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+
+        cells = self.__pspace_cells()
+
+        if a_mode == Token.IMMEDIATE:
+            index = a_val
+
+        else:
+            index = self.__core.b_field_val(self.__a_address(a_mode, a_val, address))
+
+        dest_address = self.__b_write_address(b_mode, b_val, address)
+        self.__core.put_b_field_val(cells[index % len(cells)], dest_address)
+
+        return self.__next(address)
+
+    def __execute_stp(self, address):
+        """
+        Executes the STP instruction, which stores the A operand in
+        the P-space cell indexed by the B-field at the B-field address.
+        An immediate A-field is the value itself, otherwise the value
+        is the B-field at the A-field address.
+
+        :param address: The address of the STP instruction
+
+        :return: The address of the next instruction
+        """
+
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+
+        cells = self.__pspace_cells()
+
+        if a_mode == Token.IMMEDIATE:
+            value = a_val
+
+        else:
+            value = self.__core.b_field_val(self.__a_address(a_mode, a_val, address))
+
+        index = self.__core.b_field_val(self.__b_address(b_mode, b_val, address))
+        cells[index % len(cells)] = value % self.__coresize
+
+        return self.__next(address)
+
+    def __pspace_cells(self):
+        """
+        Returns the P-space cells of the executing program. Without
+        a P-space, one is created for the programs when first needed.
+        """
+
+        if self.__program.pspace is None:
+            pspace = PSpace(len(self.__programs), max(self.__coresize // 16, 1))
+            for program, cells in zip(self.__programs, pspace.cells):
+                program.pspace = cells
+
+            self.__pspace = pspace
+
+        return self.__program.pspace
+
+    def __execute_unrecognised(self, address):
+        """
+        Executes a word holding an unrecognised opcode.
+
+        :param address: The address of the word
+        """
+
+        raise RuntimeError('Unrecognised opcode')
+
     def execute(self, address):
         """
         Executes an instruction, and returns the address of the
@@ -453,112 +1458,502 @@ class Interpreter:
         if address < 0 or address >= self.__core.coresize:
             raise RuntimeError('Attempt to execute instruction at invalid address')
 
-        opcode = self.__core.opcode(address)
+        try:
+            handler = self.__handlers[self.__core.instruction(address)[0]]
 
-        if opcode == Token.NOP:
-            # Instruction has no effect
-            return self.__next(address)
+        except IndexError:
+            raise RuntimeError('Unrecognised opcode')
 
-        elif opcode == Token.DAT:
-            # Cannot execute a DAT
-            raise RuntimeError('Attempt to execute DAT')
+        return handler(address)
 
-        elif opcode == Token.MOV:
-            return self.__execute_mov(address)
+    def __execute_profiled(self, address):
+        """
+        Executes an instruction as execute() does, first recording
+        it in the profile. Replaces execute() when profiling.
 
-        elif opcode == Token.ADD:
-            # TODO
-            pass
+        :param address: The address of the instruction
 
-        elif opcode == Token.SUB:
-            # todo
-            pass
+        :return: The new address of the program counter.
+        """
 
-        elif opcode == Token.MUL:
-            # todo
-            pass
+        if address < 0 or address >= self.__core.coresize:
+            raise RuntimeError('Attempt to execute instruction at invalid address')
 
-        elif opcode == Token.DIV:
-            # todo
-            pass
+        instruction = self.__core.instruction(address)
 
-        elif opcode == Token.MOD:
-            # todo
-            pass
+        try:
+            handler = self.__handlers[instruction[0]]
 
-        elif opcode == Token.JMP:
-            return self.__execute_jmp(address)
+        except IndexError:
+            raise RuntimeError('Unrecognised opcode')
 
-        elif opcode == Token.JMZ:
-            # todo
-            pass
+        self.__profile.record_execute(address, instruction)
 
-        elif opcode == Token.JMN:
-            # todo
-            pass
+        return handler(address)
 
-        elif opcode == Token.DJN:
-            # todo
-            pass
+    def __fused_add(self, address):
+        """
+        Executes an ADD and the instruction after it, as two cycles of a
+        lone process. ADD #n, x followed by MOV y, @x, the loop of a
+        bomber such as the dwarf, is executed as a single operation,
+        in which the MOV writes through the pointer just advanced by
+        the ADD without fetching and resolving it again.
 
-        elif opcode == Token.SPL:
-            # todo
-            pass
+        :param address: The address of the ADD instruction
 
-        elif opcode == Token.CMP:
-            # todo
-            pass
+        :return: The address of the instruction after the pair
+        """
 
-        elif opcode == Token.SEQ:
-            # todo
-            pass
+        # Acquire operand modes and values
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(address)
+        next_address = self.__next(address)
+
+        if a_mode != Token.IMMEDIATE or b_mode != Token.DIRECT:
+            self.__execute_arithmetic(address)
+            self.__program.update_current_process_pc(next_address)
+            return self.execute(next_address)
+
+        # Advance the pointer
+        pointer = (b_val + address) % self.__coresize
+        value = (self.__core.b_field_val(pointer) + a_val) % self.__coresize
+        self.__core.put_b_field_val(value, pointer)
+
+        # The ADD may have changed the instruction after it,
+        # so it is only fetched now
+        [opcode, a_mode, a_val, b_mode, b_val] = self.__core.instruction(next_address)
+
+        if (opcode != Token.MOV or a_mode == Token.IMMEDIATE or b_mode != Token.INDIRECT
+                or (b_val + next_address) % self.__coresize != pointer):
+            self.__program.update_current_process_pc(next_address)
+            return self.execute(next_address)
+
+        # Move through the pointer, as __execute_mov() does
+        src_address = self.__a_address(a_mode, a_val, next_address)
+        dest_address = (pointer + value) % self.__coresize
+        self.__core.put_instr(self.__core.opcode(src_address),
+                              self.__core.a_field_mode(src_address),
+                              self.__core.a_field_val(src_address),
+                              self.__core.b_field_mode(src_address),
+                              self.__core.b_field_val(src_address),
+                              dest_address)
+
+        return self.__next(next_address)
+
+    def __fused_djn(self, address):
+        """
+        Executes a DJN and the instruction to which it jumps, or which
+        follows it, as two cycles of a lone process, so that a loop
+        closed by a DJN starts again in the same dispatch.
 
-        elif opcode == Token.SNE:
-            # todo
-            pass
+        :param address: The address of the DJN instruction
 
-        elif opcode == Token.SLT:
-            # todo
-            pass
+        :return: The address of the instruction after the pair
+        """
 
-        elif opcode == Token.LDP:
-            # todo
-            pass
+        next_address = self.__execute_djn(address)
+        self.__program.update_current_process_pc(next_address)
 
-        elif opcode == Token.STP:
-            # todo
-            pass
+        return self.execute(next_address)
 
-        elif opcode == Token.NULL:
-            raise RuntimeError('Attempt to execute null instruction')
+    def step(self):
+        """
+        Executes a single cycle, in which each program with
+        processes left executes the instruction of its current
+        process, in turn. A process which cannot execute its
+        instruction is terminated.
 
-        else:
-            raise RuntimeError('Unrecognised opcode')
+        :return: The number of programs with processes left
+        """
+
+        remaining = 0
+
+        for program in self.__programs:
+            if program.process_count() == 0:
+                continue
+
+            self.__program = program
+            address = program.current_process_pc()
+
+            try:
+                new_address = self.execute(address)
+
+            except RuntimeError:
+                # Exception in program execution, kill
+                # the current process
+                program.kill_current_process()
+
+                if program.process_count() > 0:
+                    remaining += 1
+
+                continue
+
+            program.update_current_process_pc(new_address)
+
+            # Add any process split off by the instruction
+            if self.__split_address is not None:
+                program.split_process(self.__split_address, self.__max_processes)
+                self.__split_address = None
+
+            # Move to the next process
+            program.next_process()
+            remaining += 1
+
+        self.__cycle += 1
+
+        return remaining
 
-    def run(self):
+    def __step_traced(self):
         """
-        Executes all of the programs in the core.
+        Executes a single cycle as step() does, first recording each
+        execution in the trace. If a process dies by executing a DAT
+        or an empty word, the trace is dumped. Replaces step() when
+        tracing.
+
+        :return: The number of programs with processes left
+        """
+
+        remaining = 0
+
+        for number, program in enumerate(self.__programs):
+            if program.process_count() == 0:
+                continue
+
+            self.__program = program
+            address = program.current_process_pc()
+
+            # Resolve the operands from the unwrapped core, so that
+            # tracing is not counted in any profile
+            instruction = self.__base_core.instruction(address)
+            opcode = instruction[0]
+            self.__trace.record(
+                self.__cycle, number, address, opcode,
+                self.__trace_address(instruction[1], instruction[2], 2, address,
+                                     self.__read_fold),
+                self.__trace_address(instruction[3], instruction[4], 4, address,
+                                     self.__trace_b_folds[opcode]))
+
+            try:
+                new_address = self.execute(address)
+
+            except RuntimeError:
+                # Exception in program execution, kill
+                # the current process
+                program.kill_current_process()
+
+                if opcode == Token.DAT or opcode == Token.NULL:
+                    self.__trace_stream.write(
+                        'Process of program {} died executing {} at {} in cycle {}\n'.format(
+                            number, Token.catnames[opcode], address, self.__cycle))
+                    self.__trace.dump(self.__trace_stream)
+
+                if program.process_count() > 0:
+                    remaining += 1
+
+                continue
+
+            program.update_current_process_pc(new_address)
+
+            # Add any process split off by the instruction
+            if self.__split_address is not None:
+                program.split_process(self.__split_address, self.__max_processes)
+                self.__split_address = None
+
+            # Move to the next process
+            program.next_process()
+            remaining += 1
+
+        self.__cycle += 1
+
+        return remaining
+
+    def __trace_address(self, mode, val, field, address, fold):
+        """
+        Resolve the address referred to by an operand of an
+        instruction, for the trace, without counting any reads.
+        The intermediate word of an indirect operand is read, so its
+        offset is folded within any read limit, while the final offset
+        is folded with the given table. Nothing is allocated, as this
+        is called for both operands in every cycle.
+
+        :param mode: The addressing mode of the operand
+        :param val: The value of the operand
+        :param field: The index of the field of the intermediate word
+        which is read by an indirect operand, 2 for A and 4 for B
+        :param address: The address of the instruction
+        :param fold: The table folding the final offset, or None
+        if there are no limits
+
+        :return: The address of the operand, or -1 if it is absent
+        """
+
+        if mode == Token.IMMEDIATE:
+            return address
+
+        if mode != Token.DIRECT and mode != Token.INDIRECT:
+            return -1  # Operand is absent
+
+        offset = val % self.__coresize
+
+        if mode == Token.INDIRECT:
+            if fold is not None:
+                offset = self.__read_fold[offset]
+
+            intermediate_val = self.__base_core.instruction(
+                (offset + address) % self.__coresize)[field]
+            offset = (offset + intermediate_val) % self.__coresize
+
+        if fold is not None:
+            offset = fold[offset]
+
+        return (offset + address) % self.__coresize
+
+    def save_state(self, stream):
         """
+        Writes the state of the battle to a binary stream: the
+        contents of the core, the processes of every program and
+        the cycle counter. A fixed-size header is followed by
+        little-endian 32-bit integers, holding the five fields of
+        each word of the core, then for each program the number of
+        processes, the index of the current process and the program
+        counter of each process. Any P-space follows, as the cells
+        of each program in little-endian 64-bit integers.
+
+        :param stream: The binary stream to which to write
+        """
+
+        pspace_size = self.__pspace.size if self.__pspace is not None else 0
 
-        # Keep executing programs for as long
-        # as they have processes
+        stream.write(self.state_header.pack(self.state_tag, self.state_version,
+                                            self.__coresize, len(self.__programs),
+                                            self.__cycle, pspace_size))
+
+        values = self.__base_core.fields()
         for program in self.__programs:
+            processes, index = program.state()
+            values.append(len(processes))
+            values.append(index)
+            values.extend(processes)
+
+        if sys.byteorder == 'big':
+            values.byteswap()
+
+        stream.write(values.tobytes())
+
+        if pspace_size:
+            for program in self.__programs:
+                cells = program.pspace
+                if sys.byteorder == 'big':
+                    cells = array('q', cells)
+                    cells.byteswap()
+
+                stream.write(cells.tobytes())
+
+    def load_state(self, buffer):
+        """
+        Restores the state of the battle written by save_state(),
+        replacing the contents of the core, the programs and the
+        cycle counter. The buffer may be any bytes-like object,
+        including a memory-mapped file, and is read in place:
+
+            with open(file, 'rb') as infile:
+                with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    interpreter.load_state(buffer)
+
+        :param buffer: The saved state
+        """
+
+        view = memoryview(buffer)
+
+        if len(view) < self.state_header.size:
+            raise RuntimeError('Saved state is truncated')
+
+        tag, version, coresize, count, cycle, pspace_size = self.state_header.unpack_from(view)
+
+        if tag != self.state_tag or version != self.state_version:
+            raise RuntimeError('Unrecognised saved state')
+
+        if coresize != self.__coresize:
+            raise RuntimeError('Saved state does not match the size of the core')
+
+        # The P-space, if any, is at the end
+        end = len(view) - 8 * count * pspace_size
+        if end < self.state_header.size or (end - self.state_header.size) % 4 != 0:
+            raise RuntimeError('Saved state is truncated')
+
+        values = array('i')
+        values.frombytes(view[self.state_header.size:end])
+
+        cells = array('q')
+        cells.frombytes(view[end:])
+
+        if sys.byteorder == 'big':
+            values.byteswap()
+            cells.byteswap()
+
+        # Read the processes of each program, following the core
+        states = []
+        position = 5 * coresize
+        for number in range(count):
+            if position + 2 > len(values):
+                raise RuntimeError('Saved state is truncated')
+
+            length, index = values[position], values[position + 1]
+            processes = values[position + 2:position + 2 + length]
+            position += 2 + length
+
+            if len(processes) != length:
+                raise RuntimeError('Saved state is truncated')
+
+            states.append((processes.tolist(), index))
+
+        # Restore the P-space into that of the interpreter where it
+        # matches, so that a P-space shared with a match is kept
+        pspace = None
+        if pspace_size:
+            pspace = self.__pspace
+            if pspace is None or pspace.size != pspace_size or len(pspace.cells) != count:
+                pspace = PSpace(count, pspace_size)
+
+            for number, program_cells in enumerate(pspace.cells):
+                program_cells[:] = cells[number * pspace_size:(number + 1) * pspace_size]
+
+        self.__pspace = pspace
+
+        programs = []
+        for number, (processes, index) in enumerate(states):
+            program = self.__new_program(0, number)
+            program.restore(processes, index)
+            programs.append(program)
+
+        self.__base_core.put_fields(values[:5 * coresize])
+        self.__programs = programs
+        self.__program = programs[0] if programs else None
+        self.__cycle = cycle
+        self.__split_address = None
+        self.__divide_by_zero = False
+
+    def survivors(self):
+        """
+        Returns the numbers of the programs with processes left.
+
+        :return: A list of indices into the list of programs
+        """
+
+        return [index for index, program in enumerate(self.__programs)
+                if program.process_count() > 0]
+
+    def run(self, max_cycles=80000):
+        """
+        Executes all of the programs in the core, until only one
+        program has processes left (or none, if only one program
+        is being executed), or the maximum number of cycles has
+        been executed.
+
+        :param max_cycles: The maximum number of cycles to execute
+
+        :return: The numbers of the programs with processes left
+        """
+
+        # A lone program runs until it dies, otherwise
+        # execution stops when there is a single survivor
+        finish = 1 if len(self.__programs) > 1 else 0
+
+        remaining = len(self.survivors())
+        if finish == 0 and remaining > 0 and self.__fuse:
+            self.__run_alone(max_cycles)
+            return self.survivors()
+
+        while remaining > finish and self.__cycle < max_cycles:
+            remaining = self.step()
+
+        return self.survivors()
+
+    def __run_alone(self, max_cycles):
+        """
+        Runs a lone program until it dies, or the maximum number of
+        cycles has been executed. While the program has a single
+        process, no other instruction is executed between one of its
+        instructions and the next, so a pair of instructions with a
+        fused handler is executed in a single dispatch, taking two
+        cycles. Otherwise the program is stepped a cycle at a time.
+
+        :param max_cycles: The maximum number of cycles to execute
+        """
+
+        program = self.__programs[0]
+        self.__program = program
+
+        while self.__cycle < max_cycles:
+            count = program.process_count()
+            if count != 1:
+                if count == 0:
+                    break
+
+                self.step()
+                continue
+
+            address = program.current_process_pc()
+            handler = self.execute
+            cycles = 1
+
+            # A pair is begun only if both of its cycles may be executed
+            if self.__cycle + 1 < max_cycles and 0 <= address < self.__coresize:
+                opcode = self.__core.opcode(address)
+                if 0 <= opcode < len(self.__fused) and self.__fused[opcode] is not None:
+                    handler = self.__fused[opcode]
+                    cycles = 2
+
+            self.__cycle += cycles
+
             try:
-                address = program.current_process_pc()
+                new_address = handler(address)
+
+            except RuntimeError:
+                # The first instruction of a pair cannot fail, and the
+                # program counter is moved on to the second before it
+                # is executed, so it holds the address of the
+                # instruction which failed
+                program.kill_current_process()
+                continue
+
+            program.update_current_process_pc(new_address)
+
+            # Add any process split off by the last instruction
+            if self.__split_address is not None:
+                program.split_process(self.__split_address, self.__max_processes)
+                self.__split_address = None
+
+            program.next_process()
+
+    def __run_sampled(self, max_cycles=80000):
+        """
+        Runs the programs as run() does, recording the throughput
+        and the number of processes in the metrics after every
+        block of cycles. A lone program runs each block as
+        __run_alone() does, so pairs of instructions are fused.
+
+        :param max_cycles: The maximum number of cycles to execute
+
+        :return: The numbers of the programs with processes left
+        """
+
+        finish = 1 if len(self.__programs) > 1 else 0
+        interval = self.__metrics.sample_interval
+
+        remaining = len(self.survivors())
+        while remaining > finish and self.__cycle < max_cycles:
+            start_cycle = self.__cycle
+            start = time.perf_counter()
 
-                try:
-                    new_address = self.execute(address)
-                    program.update_current_process_pc(new_address)
+            end_cycle = min(self.__cycle + interval, max_cycles)
+            if finish == 0 and self.__fuse:
+                self.__run_alone(end_cycle)
+                remaining = len(self.survivors())
 
-                    # Move to the next process
-                    program.next_process()
+            while remaining > finish and self.__cycle < end_cycle:
+                remaining = self.step()
 
-                except RuntimeError:
-                    # Exception in program execution, kill
-                    # the current process
-                    program.kill_current_process()
+            self.__metrics.sample(self.__cycle - start_cycle, time.perf_counter() - start,
+                                  sum(program.process_count() for program in self.__programs))
 
-            except IndexError:
-                # No processes left for this
-                # program, so remove it
-                del self.__programs[program]
+        return self.survivors()
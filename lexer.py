@@ -31,14 +31,37 @@ class Lexer:
         # Read the Red Code from a file
         try:
             with open(file, 'r') as infile:
-                self.__program = infile.read()
+                program = infile.read()
                 infile.close()
 
         except OSError:
             raise OSError("Could not read Red Code file")
 
+        return self.tokenize_string(program)
+
+    def tokenize_string(self, program, line=1):
+        """
+        Returns a list of tokens obtained by
+        lexical analysis of the specified
+        Red Code source.
+
+        :param program: The Red Code source as a string
+        :param line: The line number of the first line of the
+        source, for when it is a fragment of a larger program
+        """
+
+        # Reset the lexer state, so that a single lexer
+        # may be used for any number of programs
+        self.__program = program
+        self.__programindex = 0
+        self.__line = line - 1
+        self.__column = 0
+        self.__tokenlist = []
+        self.__prevchar = '\n'
+        self.__blankline = True
+
         # If file not terminated by a newline, then add one
-        if self.__program[-1] != '\n':
+        if not self.__program.endswith('\n'):
             self.__program = self.__program + '\n'
 
         # Process every character until we
@@ -67,27 +90,37 @@ class Lexer:
                     if not c.isdigit():
                         break
 
-            # Process opcodes
-            elif c.isalpha():
-                # Consume all of the letters
+                # Convert the lexeme once, here, rather than
+                # every time it is assembled
+                token.lexeme = int(token.lexeme)
+
+            # Process opcodes and labels
+            elif c.isalpha() or c == '_':
+                # Consume all of the letters, digits and underscores
                 while True:
                     token.lexeme += c  # append the current char to the lexeme
                     c = self.__get_next_char()
 
-                    # Break if not a letter
-                    if not c.isalpha():
+                    # Break if not part of a name
+                    if not (c.isalnum() or c == '_'):
                         break
 
-                # Normalise opcodes to upper case
-                token.lexeme = token.lexeme.upper()
-
-                # Determine if the lexeme is a variable name or a
-                # reserved word
-                if token.lexeme in Token.keywords:
+                # Determine if the lexeme is a label or a
+                # reserved word. Opcodes are normalised to upper
+                # case, but labels are case sensitive.
+                if token.lexeme.upper() in Token.keywords:
+                    token.lexeme = token.lexeme.upper()
                     token.category = Token.keywords[token.lexeme]
 
                 else:
-                    raise SyntaxError('Invalid opcode')
+                    token.category = Token.LABEL
+
+            # Skip comments, up to but not including the newline
+            elif c == ';':
+                while c not in ['\n', '']:
+                    c = self.__get_next_char()
+
+                continue
 
             # Process operand addressing modes and EOF
             elif c in Token.smalltokens:
@@ -97,11 +130,10 @@ class Lexer:
 
             # We do not recognise this token
             else:
-                raise SyntaxError('Syntax error')
+                raise SyntaxError('Syntax error in line ' + str(token.line))
 
             # Append the new token to the list
             self.__tokenlist.append(token)
-            token.pretty_print()
 
             if token.category == Token.EOF:  # Stop lexical analysis at EOF
                 break
@@ -146,7 +178,13 @@ class Lexer:
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Print the tokens of Red Code files')
+    parser.add_argument('files', nargs='*', default=['chang1'], help='Red Code files')
+    args = parser.parse_args()
+
     lexer = Lexer()
-    tokens = lexer.tokenize('chang1')
-    for token in tokens:
-        token.pretty_print()
+    for file in args.files:
+        for token in lexer.tokenize(file):
+            token.pretty_print()
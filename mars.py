@@ -0,0 +1,326 @@
+#! /usr/bin/python
+
+"""
+The command line driver of the simulator, run as
+
+    python -m mars <command> [options]
+
+with the commands
+
+    assemble     assemble Red Code files, reporting each image or error
+    battle       run a single round between warriors
+    match        run a match of several rounds between warriors
+    tournament   run a round-robin tournament between warriors
+
+each of which writes its results to standard output, or a file,
+as a single JSON document or as CSV.
+
+Scripts may run the driver thousands of times, so it does no work
+when imported, and each command imports only the modules it needs
+when it runs.
+
+>>> import io
+>>> from mars import main
+>>> stream = io.StringIO()
+>>> main(['assemble', 'benchmarks/imp.red', 'missing.red', '--format', 'csv'], stream)
+0
+>>> print(stream.getvalue().replace('\\r', ''), end='')
+file,name,length,start,error
+benchmarks/imp.red,imp,1,0,
+missing.red,missing,0,0,OSError: Could not read Red Code file
+>>> stream = io.StringIO()
+>>> main(['match', 'benchmarks/imp.red', 'benchmarks/dwarf.red', '--rounds', '2',
+...       '--coresize', '800', '--cycles', '1000'], stream)
+0
+>>> print(stream.getvalue(), end='')
+{"warriors": ["imp", "dwarf"], "wins": [0, 0], "losses": [0, 0], "ties": [2, 2], "scores": [2, 2], "rounds": 2, "cycles": 2000}
+>>> stream = io.StringIO()
+>>> main(['tournament', 'benchmarks/imp.red', 'benchmarks/dwarf.red',
+...       'benchmarks/paper.red', '--rounds', '2', '--coresize', '800',
+...       '--cycles', '1000', '--workers', '1', '--format', 'csv'], stream)
+0
+>>> print(stream.getvalue().replace('\\r', ''), end='')
+warrior,score
+paper,8
+imp,4
+dwarf,2
+>>> import contextlib, os, tempfile
+>>> path = os.path.join(tempfile.mkdtemp(), 'bad.red')
+>>> with open(path, 'w') as outfile:
+...     length = outfile.write('MOV 0, ?1\\n')
+>>> errors = io.StringIO()
+>>> with contextlib.redirect_stderr(errors):
+...     print(main(['battle', path], io.StringIO()))
+1
+>>> print(errors.getvalue(), end='')
+mars: Syntax error in line 1
+"""
+
+import argparse
+import json
+import sys
+
+
+def assemble(args):
+    """
+    Assembles each file, recording any error against
+    it rather than stopping
+
+    :param args: The parsed arguments
+
+    :return: A list of dictionaries, one per file
+    """
+
+    import os
+
+    from assembler import Assembler
+    from lexer import Lexer
+
+    results = []
+    for file in args.files:
+        result = {'file': file, 'name': os.path.splitext(os.path.basename(file))[0],
+                  'length': 0, 'start': 0, 'image': None, 'error': None}
+
+        try:
+            assembler = Assembler()
+            result['image'] = assembler.image(Lexer().tokenize(file))
+            result['length'] = len(result['image'])
+            result['start'] = assembler.start
+
+        except Exception as error:
+            result['error'] = type(error).__name__ + ': ' + str(error)
+
+        results.append(result)
+
+    return results
+
+
+def load_warriors(files):
+    """
+    Assembles the warriors for a battle
+
+    :param files: The paths of the Red Code files
+
+    :return: The list of warriors
+    """
+
+    from battle import Warrior
+
+    return [Warrior.from_file(file) for file in files]
+
+
+def match_settings(args):
+    """
+    Returns the keyword arguments to Match given on the command line.
+
+    :param args: The parsed arguments
+    """
+
+    return {'coresize': args.coresize, 'max_cycles': args.cycles,
+            'max_processes': args.max_processes,
+            'read_limit': args.read_limit, 'write_limit': args.write_limit,
+            'seed': args.seed, 'separation': args.separation}
+
+
+def battle(args):
+    """
+    Runs a single round between the warriors
+
+    :param args: The parsed arguments
+
+    :return: A dictionary of the names of the warriors, the numbers
+    of those which survived and the cycles executed
+    """
+
+    from battle import Match
+
+    warriors = load_warriors(args.files)
+    survivors, cycles, ownership = Match(warriors, **match_settings(args)).run_round(0)
+
+    return {'warriors': [warrior.name for warrior in warriors],
+            'survivors': sorted(survivors),
+            'cycles': cycles}
+
+
+def match(args):
+    """
+    Runs a match between the warriors
+
+    :param args: The parsed arguments
+
+    :return: A dictionary of the warriors and the result of the match
+    """
+
+    from battle import Match
+
+    warriors = load_warriors(args.files)
+    result = Match(warriors, **match_settings(args)).run(args.rounds)
+
+    return dict({'warriors': [warrior.name for warrior in warriors]}, **result.to_dict())
+
+
+def tournament(args):
+    """
+    Runs a round-robin tournament between the warriors
+
+    :param args: The parsed arguments
+
+    :return: A dictionary of the standings, best first, and the
+    result of each pairing
+    """
+
+    from tournament import Tournament
+
+    warriors = load_warriors(args.files)
+    runner = Tournament(warriors, rounds=args.rounds, workers=args.workers,
+                        **match_settings(args))
+    results = runner.run()
+
+    standings = sorted(zip(runner.scores(), range(len(warriors))),
+                       key=lambda entry: -entry[0])
+
+    return {'standings': [{'warrior': warriors[number].name, 'score': score}
+                          for score, number in standings],
+            'pairings': [dict({'warriors': [warriors[first].name, warriors[second].name]},
+                              **result.to_dict())
+                         for (first, second), result in sorted(results.items())]}
+
+
+def write_json(output, stream):
+    """
+    Writes the output of a command as a single JSON document
+
+    :param output: The output of the command
+    :param stream: The text stream to which to write
+    """
+
+    json.dump(output, stream)
+    stream.write('\n')
+
+
+def write_csv(command, output, stream):
+    """
+    Writes the output of a command as CSV, with a header row
+
+    :param command: The name of the command
+    :param output: The output of the command
+    :param stream: The text stream to which to write
+    """
+
+    import csv
+
+    writer = csv.writer(stream)
+
+    if command == 'assemble':
+        writer.writerow(['file', 'name', 'length', 'start', 'error'])
+        for result in output:
+            writer.writerow([result['file'], result['name'], result['length'],
+                             result['start'], result['error'] or ''])
+
+    elif command == 'battle':
+        writer.writerow(['warrior', 'survived', 'cycles'])
+        for index, name in enumerate(output['warriors']):
+            writer.writerow([name, int(index in output['survivors']), output['cycles']])
+
+    elif command == 'match':
+        writer.writerow(['warrior', 'wins', 'losses', 'ties', 'score'])
+        for index, name in enumerate(output['warriors']):
+            writer.writerow([name, output['wins'][index], output['losses'][index],
+                             output['ties'][index], output['scores'][index]])
+
+    else:
+        writer.writerow(['warrior', 'score'])
+        for standing in output['standings']:
+            writer.writerow([standing['warrior'], standing['score']])
+
+
+# The function which runs each command
+COMMANDS = {'assemble': assemble, 'battle': battle, 'match': match, 'tournament': tournament}
+
+
+def parser():
+    """
+    Returns the parser of the command line.
+    """
+
+    parser = argparse.ArgumentParser(prog='mars', description='Red Code simulator')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for command, help in [('assemble', 'assemble Red Code files'),
+                          ('battle', 'run a single round between warriors'),
+                          ('match', 'run a match between warriors'),
+                          ('tournament', 'run a round-robin tournament')]:
+        subparser = commands.add_parser(command, help=help)
+        subparser.add_argument('files', nargs='+', help='Red Code files')
+        subparser.add_argument('--format', choices=['json', 'csv'], default='json',
+                               help='format of the output')
+        subparser.add_argument('--output', default=None,
+                               help='file to which to write, instead of standard output')
+
+        if command != 'assemble':
+            subparser.add_argument('--coresize', type=int, default=8000, help='size of the core')
+            subparser.add_argument('--cycles', type=int, default=80000,
+                                   help='maximum cycles per round')
+            subparser.add_argument('--max-processes', type=int, default=None,
+                                   help='maximum processes per warrior')
+            subparser.add_argument('--read-limit', type=int, default=None, help='read limit')
+            subparser.add_argument('--write-limit', type=int, default=None, help='write limit')
+            subparser.add_argument('--seed', type=int, default=None,
+                                   help='seed from which to place warriors at random')
+            subparser.add_argument('--separation', type=int, default=100,
+                                   help='minimum words between warriors placed at random')
+
+        if command in ('match', 'tournament'):
+            subparser.add_argument('--rounds', type=int, default=1,
+                                   help='rounds per match' if command == 'match'
+                                   else 'rounds per pairing')
+
+        if command == 'tournament':
+            subparser.add_argument('--workers', type=int, default=None,
+                                   help='worker processes')
+
+    return parser
+
+
+def main(argv=None, stream=None):
+    """
+    Runs a command
+
+    :param argv: The arguments, defaulting to those of the process
+    :param stream: The text stream to which to write, defaulting to
+    standard output unless an output file is given
+
+    :return: The exit status
+    """
+
+    args = parser().parse_args(argv)
+
+    try:
+        output = COMMANDS[args.command](args)
+
+    except (RuntimeError, IndexError, OSError, SyntaxError, ValueError) as error:
+        print('mars: ' + str(error), file=sys.stderr)
+        return 1
+
+    if args.output is not None:
+        stream = open(args.output, 'w', newline='')
+
+    elif stream is None:
+        stream = sys.stdout
+
+    try:
+        if args.format == 'csv':
+            write_csv(args.command, output, stream)
+
+        else:
+            write_json(output, stream)
+
+    finally:
+        if args.output is not None:
+            stream.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
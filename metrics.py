@@ -0,0 +1,280 @@
+#! /usr/bin/python
+
+"""
+Collects metrics of the throughput and resource usage of the
+simulator, and exports them in the Prometheus text format,
+either to a file for a textfile collector or from a local HTTP
+endpoint. The metrics are
+
+    mars_cycles_total            cycles executed
+    mars_rounds_total            rounds run
+    mars_battles_total           matches, or pairings, completed
+    mars_round_seconds           histogram of the wall time of each round
+    mars_cycles_per_second       throughput over the last sample or round
+    mars_processes               processes alive at the last sample
+    mars_process_count           histogram of sampled process counts
+    mars_queue_depth             jobs waiting to be run
+    mars_peak_rss_bytes          peak resident memory of the process
+                                 and of its finished child processes
+
+Timing is sampled, rather than taken around every cycle: an
+interpreter with metrics runs in blocks of a number of cycles,
+timing each block and counting its processes at the end, and a
+round is timed as a whole.
+
+>>> from battle import Match, Warrior
+>>> from metrics import Metrics
+>>> metrics = Metrics(sample_interval=100)
+>>> imp = Warrior.from_source('Imp', 'MOV 0, 1')
+>>> dwarf = Warrior.from_file('benchmarks/dwarf.red')
+>>> result = Match([imp, dwarf], coresize=800, max_cycles=1000, metrics=metrics).run(2)
+>>> print(metrics.cycles, metrics.rounds, metrics.battles, metrics.processes)
+2000 2 1 2
+>>> text = metrics.exposition()
+>>> print('\\n'.join(line for line in text.splitlines()
+...                 if line.startswith(('mars_cycles_total', 'mars_process_count'))))
+mars_cycles_total 2000
+mars_process_count_bucket{le="1"} 0
+mars_process_count_bucket{le="2"} 20
+mars_process_count_bucket{le="4"} 20
+mars_process_count_bucket{le="8"} 20
+mars_process_count_bucket{le="16"} 20
+mars_process_count_bucket{le="64"} 20
+mars_process_count_bucket{le="256"} 20
+mars_process_count_bucket{le="1024"} 20
+mars_process_count_bucket{le="8000"} 20
+mars_process_count_bucket{le="+Inf"} 20
+mars_process_count_sum 40
+mars_process_count_count 20
+"""
+
+import bisect
+import os
+import threading
+
+# Upper bounds of the buckets of the histograms, in seconds per
+# round and in processes
+ROUND_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+PROCESS_BUCKETS = (1, 2, 4, 8, 16, 64, 256, 1024, 8000)
+
+
+class Histogram:
+    """
+    Class to count observations in buckets, as a Prometheus histogram.
+    """
+
+    def __init__(self, buckets):
+        """
+        Initialise the histogram with no observations
+
+        :param buckets: The upper bounds of the buckets, in increasing order
+        """
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is unbounded
+        self.sum = 0
+
+    def observe(self, value):
+        """
+        Records an observation
+
+        :param value: The value observed
+        """
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name):
+        """
+        Returns the lines of the Prometheus text format
+        describing the histogram
+
+        :param name: The name of the metric
+        """
+
+        lines = []
+        total = 0
+
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            lines.append('%s_bucket{le="%s"} %d' % (name, bound, total))
+
+        lines.append('%s_sum %s' % (name, self.sum))
+        lines.append('%s_count %d' % (name, total))
+
+        return lines
+
+
+class Metrics:
+
+    def __init__(self, sample_interval=10000):
+        """
+        Initialise the metrics, with nothing recorded
+
+        :param sample_interval: The number of cycles an interpreter
+        runs between samples
+        """
+
+        self.sample_interval = sample_interval
+
+        self.cycles = 0          # Cycles executed
+        self.rounds = 0          # Rounds run
+        self.battles = 0         # Matches or pairings completed
+        self.processes = 0       # Processes alive at the last sample
+        self.cycles_per_second = 0.0
+        self.queue_depth = 0     # Jobs waiting to be run
+
+        self.round_seconds = Histogram(ROUND_BUCKETS)
+        self.process_count = Histogram(PROCESS_BUCKETS)
+
+        self.__server = None
+
+    def sample(self, cycles, seconds, processes):
+        """
+        Records a sample taken while an interpreter runs
+
+        :param cycles: The number of cycles executed since the last sample
+        :param seconds: The time taken by those cycles
+        :param processes: The number of processes alive
+        """
+
+        if seconds > 0:
+            self.cycles_per_second = cycles / seconds
+
+        self.processes = processes
+        self.process_count.observe(processes)
+
+    def record_round(self, cycles, seconds):
+        """
+        Records a round which has finished
+
+        :param cycles: The number of cycles executed in the round
+        :param seconds: The wall time of the round
+        """
+
+        if seconds > 0:
+            self.cycles_per_second = cycles / seconds
+
+        self.cycles += cycles
+        self.rounds += 1
+        self.round_seconds.observe(seconds)
+
+    def record_battle(self):
+        """
+        Records a match, or a pairing of a tournament, which has finished.
+        """
+
+        self.battles += 1
+
+    def exposition(self):
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+
+        lines = []
+
+        for name, kind, help, value in [
+                ('mars_cycles_total', 'counter', 'Cycles executed', self.cycles),
+                ('mars_rounds_total', 'counter', 'Rounds run', self.rounds),
+                ('mars_battles_total', 'counter', 'Matches or pairings completed', self.battles),
+                ('mars_cycles_per_second', 'gauge', 'Cycles per second over the last sample or round',
+                 self.cycles_per_second),
+                ('mars_processes', 'gauge', 'Processes alive at the last sample', self.processes),
+                ('mars_queue_depth', 'gauge', 'Jobs waiting to be run', self.queue_depth)]:
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            lines.append('%s %s' % (name, value))
+
+        for name, help, histogram in [
+                ('mars_round_seconds', 'Wall time of each round', self.round_seconds),
+                ('mars_process_count', 'Sampled numbers of processes alive', self.process_count)]:
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s histogram' % name)
+            lines.extend(histogram.lines(name))
+
+        peak = self.__peak_rss()
+        if peak is not None:
+            lines.append('# HELP mars_peak_rss_bytes Peak resident memory')
+            lines.append('# TYPE mars_peak_rss_bytes gauge')
+            lines.append('mars_peak_rss_bytes{process="self"} %d' % peak[0])
+            lines.append('mars_peak_rss_bytes{process="children"} %d' % peak[1])
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Writes the metrics to a file, replacing it in a single step
+        so that a collector never reads a partly written file
+
+        :param path: The path of the file
+        """
+
+        temporary = path + '.tmp'
+
+        with open(temporary, 'w') as outfile:
+            outfile.write(self.exposition())
+
+        os.replace(temporary, path)
+
+    def serve(self, port=9100, host='127.0.0.1'):
+        """
+        Starts serving the metrics over HTTP from a background thread
+
+        :param port: The TCP port on which to listen, or 0 for any
+        :param host: The host name or address on which to listen
+
+        :return: The address on which the metrics are served
+        """
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.exposition().encode()
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+        return self.__server.server_address
+
+    def close(self):
+        """
+        Stops serving the metrics over HTTP.
+        """
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    @staticmethod
+    def __peak_rss():
+        """
+        Returns the peak resident memory, in bytes, of the process and
+        of its finished child processes, or None where it cannot be read.
+        """
+
+        try:
+            import resource
+
+        except ImportError:
+            return None
+
+        # Linux reports kilobytes, and macOS bytes
+        scale = 1 if os.uname().sysname == 'Darwin' else 1024
+
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
@@ -0,0 +1,203 @@
+#! /usr/bin/python
+
+"""
+Classes to track which program owns each word of the core.
+A word is owned by the program which last wrote to it, or by
+the program loaded there, and owners are held in a byte array
+parallel to the core. Alongside it, running counts are kept
+for each program of
+
+    coverage    the number of words it owns
+    hits        its writes to words owned by another program
+    self_hits   its writes to words it already owns
+
+Writing a whole instruction counts as a single write.
+
+>>> from core import Core
+>>> from assemblytoken import AssemblyToken as Token
+>>> from interpreter import Interpreter
+>>> core = Core(100)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 0, Token.DIRECT, 1, 0)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 0, Token.DIRECT, 1, 50)
+>>> core.put_instr(Token.DAT, Token.NULL, Token.NULL, Token.IMMEDIATE, 0, 52)
+>>> interpreter = Interpreter(core, [0, 50], ownership=True)
+>>> ownership = interpreter.ownership
+>>> ownership.claim(0, 1, 0)
+>>> ownership.claim(50, 3, 1)
+>>> survivors = interpreter.run(5)
+>>> print(ownership.owner(3), ownership.owner(54), ownership.owner(60))
+0 1 None
+>>> print(ownership.to_dict())
+{'coverage': [6, 6], 'hits': [0, 0], 'self_hits': [0, 2]}
+>>> core = Core(100)
+>>> core.put_instr(Token.ADD, Token.DIRECT, 1, Token.DIRECT, 2, 0)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 1, Token.IMMEDIATE, 1, 1)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 2)
+>>> interpreter = Interpreter(core, [0], ownership=True)
+>>> interpreter.ownership.claim(0, 3, 0)
+>>> survivors = interpreter.run(1)
+>>> print(interpreter.ownership.to_dict())
+{'coverage': [3], 'hits': [0], 'self_hits': [1]}
+"""
+
+from array import array
+
+
+class Ownership:
+
+    # Owner of a word which no program has written
+    UNOWNED = 255
+
+    def __init__(self, coresize, count):
+        """
+        Initialise the ownership with no words owned
+
+        :param coresize: The size of the core
+        :param count: The number of programs, at most 255
+        """
+
+        if count > self.UNOWNED:
+            raise RuntimeError('Too many programs to track ownership')
+
+        self.owners = bytearray([self.UNOWNED]) * coresize
+
+        self.coverage = array('L', [0]) * count
+        self.hits = array('L', [0]) * count
+        self.self_hits = array('L', [0]) * count
+
+        self.writer = 0  # Number of the program which is executing
+
+    def owner(self, address):
+        """
+        Returns the number of the program which owns a word,
+        or None if no program owns it.
+
+        :param address: The address of the word
+        """
+
+        owner = self.owners[address]
+
+        return None if owner == self.UNOWNED else owner
+
+    def claim(self, address, length, program):
+        """
+        Marks a range of words as owned by a program, without
+        counting any writes, as when the program is loaded
+
+        :param address: The address of the first word
+        :param length: The number of words, wrapping around
+        the end of the core if necessary
+        :param program: The number of the program
+        """
+
+        for offset in range(length):
+            self.__own((address + offset) % len(self.owners), program)
+
+    def record_write(self, address):
+        """
+        Records a write to a word by the executing program
+
+        :param address: The address of the word
+        """
+
+        writer = self.writer
+        owner = self.owners[address]
+
+        if owner == writer:
+            self.self_hits[writer] += 1
+
+        else:
+            if owner != self.UNOWNED:
+                self.hits[writer] += 1
+
+            self.__own(address, writer)
+
+    def to_dict(self):
+        """
+        Returns the counts for each program as a dictionary,
+        suitable for conversion to JSON.
+        """
+
+        return {'coverage': self.coverage.tolist(),
+                'hits': self.hits.tolist(),
+                'self_hits': self.self_hits.tolist()}
+
+    def __own(self, address, program):
+        """
+        Changes the owner of a word, keeping coverage up to date
+
+        :param address: The address of the word
+        :param program: The number of the new owner
+        """
+
+        owner = self.owners[address]
+        if owner != self.UNOWNED:
+            self.coverage[owner] -= 1
+
+        self.owners[address] = program
+        self.coverage[program] += 1
+
+
+class OwnedCore:
+    """
+    Class to wrap a core, recording each write to it
+    in an Ownership. Reads are passed straight to the core.
+    """
+
+    def __init__(self, core, ownership):
+        """
+        Initialise the wrapped core
+
+        :param core: The core to wrap
+        :param ownership: The ownership in which to record writes
+        """
+
+        self.__core = core
+        self.__write = ownership.record_write
+
+        # Reads are bound directly to the core, so they cost no more
+        # than they would without the wrapper
+        self.instruction = core.instruction
+        self.opcode = core.opcode
+        self.a_field_mode = core.a_field_mode
+        self.a_field_val = core.a_field_val
+        self.b_field_mode = core.b_field_mode
+        self.b_field_val = core.b_field_val
+
+    @property
+    def coresize(self):
+        """
+        Returns the size of the core.
+        """
+
+        return self.__core.coresize
+
+    def put_instr(self, opcode, a_field_mode, a_field_val,
+                  b_field_mode, b_field_val, address):
+        self.__core.put_instr(opcode, a_field_mode, a_field_val,
+                              b_field_mode, b_field_val, address)
+        self.__write(address)
+
+    def put_opcode(self, opcode, address):
+        self.__core.put_opcode(opcode, address)
+        self.__write(address)
+
+    def put_a_field_mode(self, a_field_mode, address):
+        self.__core.put_a_field_mode(a_field_mode, address)
+        self.__write(address)
+
+    def put_a_field_val(self, a_field_val, address):
+        self.__core.put_a_field_val(a_field_val, address)
+        self.__write(address)
+
+    def put_b_field_mode(self, b_field_mode, address):
+        self.__core.put_b_field_mode(b_field_mode, address)
+        self.__write(address)
+
+    def put_b_field_val(self, b_field_val, address):
+        self.__core.put_b_field_val(b_field_val, address)
+        self.__write(address)
+
+    def put_field_vals(self, a_field_val, b_field_val, address):
+        self.__core.put_field_vals(a_field_val, b_field_val, address)
+        self.__write(address)
@@ -0,0 +1,139 @@
+#! /usr/bin/python
+
+"""
+Chooses random, non-overlapping positions for the warriors of
+each round of a match. The first warrior is always placed at
+address 0, and the others follow it round the core in a random
+order, with random gaps between them, each at least a minimum
+separation, including the gap which wraps around the end of the
+core back to the first warrior.
+
+The random numbers come from a counter-based generator: each is
+a hash of the seed, the round number and its position within the
+round, so the placement of any round is computed directly, without
+generating the rounds before it. Rounds may therefore be run in
+any order, or split across workers, and still be placed the same.
+
+>>> from placement import Placement
+>>> placement = Placement(8000, [4, 10, 1], seed=42, separation=100)
+>>> print(placement.positions(0), placement.positions(1))
+[0, 2770, 4566] [0, 1997, 2641]
+>>> print(Placement(8000, [4, 10, 1], seed=42, separation=100).positions(1))
+[0, 1997, 2641]
+>>> print(placement.random(7, 0, 0) == placement.random(7, 0, 0),
+...       placement.random(7, 0, 0) == placement.random(7, 1, 0))
+True False
+>>> Placement(300, [4, 10, 1], seed=1, separation=100)
+Traceback (most recent call last):
+    ...
+RuntimeError: Warriors do not fit in the core with the separation
+"""
+
+MASK = (1 << 64) - 1
+
+# The increment of the SplitMix64 generator, the fractional
+# part of the golden ratio as a 64-bit integer
+GAMMA = 0x9E3779B97F4A7C15
+
+
+def mix(value):
+    """
+    Scrambles a 64-bit integer, as the output function of the
+    SplitMix64 generator
+
+    :param value: The integer to scramble
+
+    :return: The scrambled 64-bit integer
+    """
+
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+
+    return value ^ (value >> 31)
+
+
+class Placement:
+
+    def __init__(self, coresize, lengths, seed=0, separation=100):
+        """
+        Initialise the placement
+
+        :param coresize: The size of the core
+        :param lengths: The number of instructions of each warrior
+        :param seed: The seed from which every round is placed
+        :param separation: The minimum number of words between
+        the end of one warrior and the start of the next
+        """
+
+        self.coresize = coresize
+        self.lengths = lengths
+        self.seed = seed
+        self.separation = separation
+
+        # The number of words left once every warrior and the minimum
+        # gap after each are placed, which are shared out at random
+        self.__free = coresize - sum(lengths) - len(lengths) * separation
+
+        if self.__free < 0:
+            raise RuntimeError('Warriors do not fit in the core with the separation')
+
+    @staticmethod
+    def random(seed, round_number, counter):
+        """
+        Returns a random 64-bit integer, which depends only on
+        the seed, the round and the counter
+
+        :param seed: The seed
+        :param round_number: The number of the round
+        :param counter: The position of the number within the round
+        """
+
+        key = mix((seed * GAMMA + mix(round_number & MASK)) & MASK)
+
+        return mix((key + (counter + 1) * GAMMA) & MASK)
+
+    def positions(self, round_number):
+        """
+        Returns the base address of each warrior in a round
+
+        :param round_number: The number of the round, starting at 0
+
+        :return: The list of base addresses
+        """
+
+        count = len(self.lengths)
+        counter = 0
+
+        def below(limit):
+            # A random integer from 0 to limit - 1, scaling the 64-bit
+            # value into range with a multiplication and a shift
+            nonlocal counter
+
+            value = (self.random(self.seed, round_number, counter) * limit) >> 64
+            counter += 1
+
+            return value
+
+        # Shuffle the order of the warriors after the first
+        order = list(range(1, count))
+        for index in range(len(order) - 1, 0, -1):
+            other = below(index + 1)
+            order[index], order[other] = order[other], order[index]
+
+        # Share the free words between the gaps, by cutting them at
+        # random points: the extra words of each gap are the distances
+        # between consecutive cuts
+        cuts = sorted(below(self.__free + 1) for gap in range(count - 1))
+
+        positions = [0] * count
+        address = self.lengths[0] + self.separation
+        previous = 0
+
+        for number, cut in zip(order, cuts):
+            address += cut - previous
+            previous = cut
+
+            positions[number] = address % self.coresize
+            address += self.lengths[number] + self.separation
+
+        return positions
@@ -0,0 +1,299 @@
+#! /usr/bin/python
+
+"""
+Classes to profile the execution of Red Code programs.
+A profile counts the executions of each opcode and of
+each combination of opcode and addressing modes, along
+with the number of executions, field reads and field
+writes at each core address. All counts are held in
+integer arrays allocated when the profile is created.
+
+Core accesses are counted by a ProfiledCore, which wraps
+the core being profiled. Fetching the instruction to be
+executed is counted as an execution rather than as reads.
+
+>>> import sys
+>>> from core import Core
+>>> from assemblytoken import AssemblyToken as Token
+>>> from interpreter import Interpreter
+>>> core = Core()
+>>> core.put_instr(Token.MOV, Token.DIRECT, 0, Token.DIRECT, 1, 100)
+>>> interpreter = Interpreter(core, [100], profile=True)
+>>> address = interpreter.execute(interpreter.execute(100))
+>>> profile = interpreter.profile
+>>> print(profile.opcodes[Token.MOV], profile.executes[100], profile.executes[101])
+2 1 1
+>>> print(profile.reads[100], profile.writes[101], profile.writes[102])
+5 5 5
+>>> profile.write_opcode_csv(sys.stdout)
+opcode,a_mode,b_mode,count
+MOV,DIRECT,DIRECT,2
+>>> profile.write_address_csv(sys.stdout)
+address,executes,reads,writes
+100,1,5,0
+101,1,5,5
+102,0,0,5
+
+Operands are counted by the fields read and written, so that
+comparing whole instructions reads all of their fields, and
+adding to both fields of an instruction writes two.
+
+>>> core.put_instr(Token.CMP, Token.DIRECT, 1, Token.DIRECT, 2, 200)
+>>> core.put_instr(Token.ADD, Token.DIRECT, 1, Token.DIRECT, 2, 300)
+>>> address = interpreter.execute(200)
+>>> address = interpreter.execute(300)
+>>> print(profile.reads[201], profile.reads[202], profile.reads[301], profile.reads[302])
+5 5 2 2
+>>> print(profile.writes[302])
+2
+"""
+
+import json
+from array import array
+
+from assemblytoken import AssemblyToken as Token
+
+
+class Profile:
+
+    # Addressing modes, in the order in which they are counted
+    modes = [Token.IMMEDIATE, Token.DIRECT, Token.INDIRECT, Token.NULL]
+
+    # Index of each addressing mode. Unrecognised modes are
+    # counted as NULL.
+    mode_indices = {Token.IMMEDIATE: 0, Token.DIRECT: 1,
+                    Token.INDIRECT: 2, Token.NULL: 3}
+
+    def __init__(self, coresize):
+        """
+        Initialise the profile, with all counts zero.
+
+        :param coresize: The size of the core being profiled
+        """
+
+        self.coresize = coresize
+
+        # Executions of each opcode, indexed by opcode value
+        self.opcodes = array('L', [0]) * len(Token.catnames)
+
+        # Executions of each combination of opcode and addressing
+        # modes, indexed by triple_index()
+        self.triples = array('L', [0]) * (len(Token.catnames) * len(self.modes) ** 2)
+
+        # Executions, field reads and field writes at each address
+        self.executes = array('L', [0]) * coresize
+        self.reads = array('L', [0]) * coresize
+        self.writes = array('L', [0]) * coresize
+
+    def triple_index(self, opcode, a_mode, b_mode):
+        """
+        Returns the index into the triples array of the
+        specified combination of opcode and addressing modes.
+
+        :param opcode: The numeric value representing the opcode
+        :param a_mode: A-field addressing mode
+        :param b_mode: B-field addressing mode
+        """
+
+        return ((opcode * len(self.modes) + self.mode_indices.get(a_mode, 3)) *
+                len(self.modes) + self.mode_indices.get(b_mode, 3))
+
+    def record_execute(self, address, instruction):
+        """
+        Records the execution of an instruction
+
+        :param address: The address of the instruction
+        :param instruction: The instruction, as returned by Core.instruction()
+        """
+
+        opcode = instruction[0]
+
+        self.executes[address] += 1
+        self.opcodes[opcode] += 1
+        self.triples[self.triple_index(opcode, instruction[1], instruction[3])] += 1
+
+    def to_dict(self):
+        """
+        Returns the profile as a dictionary, suitable
+        for conversion to JSON. Only opcodes and
+        combinations which were executed are included.
+        """
+
+        opcodes = {}
+        for opcode, count in enumerate(self.opcodes):
+            if count > 0:
+                opcodes[Token.catnames[opcode]] = count
+
+        triples = []
+        for opcode, a_mode, b_mode, count in self.__executed_triples():
+            triples.append({'opcode': Token.catnames[opcode],
+                            'a_mode': Token.catnames[a_mode],
+                            'b_mode': Token.catnames[b_mode],
+                            'count': count})
+
+        return {'coresize': self.coresize,
+                'opcodes': opcodes,
+                'triples': triples,
+                'executes': self.executes.tolist(),
+                'reads': self.reads.tolist(),
+                'writes': self.writes.tolist()}
+
+    def write_json(self, stream):
+        """
+        Writes the profile to a stream in JSON form
+
+        :param stream: The stream to which to write
+        """
+
+        json.dump(self.to_dict(), stream)
+
+    def write_opcode_csv(self, stream):
+        """
+        Writes the execution count of each combination of opcode
+        and addressing modes to a stream in CSV form
+
+        :param stream: The stream to which to write
+        """
+
+        lines = ['opcode,a_mode,b_mode,count\n']
+        for opcode, a_mode, b_mode, count in self.__executed_triples():
+            lines.append(Token.catnames[opcode] + ',' + Token.catnames[a_mode] + ',' +
+                         Token.catnames[b_mode] + ',' + str(count) + '\n')
+
+        stream.write(''.join(lines))
+
+    def write_address_csv(self, stream):
+        """
+        Writes the execution, read and write counts of each
+        address which was accessed to a stream in CSV form
+
+        :param stream: The stream to which to write
+        """
+
+        lines = ['address,executes,reads,writes\n']
+        for address in range(self.coresize):
+            if self.executes[address] or self.reads[address] or self.writes[address]:
+                lines.append(str(address) + ',' + str(self.executes[address]) + ',' +
+                             str(self.reads[address]) + ',' +
+                             str(self.writes[address]) + '\n')
+
+        stream.write(''.join(lines))
+
+    def __executed_triples(self):
+        """
+        Returns a list of (opcode, a_mode, b_mode, count) for
+        each combination of opcode and addressing modes which
+        was executed.
+        """
+
+        triples = []
+        for index, count in enumerate(self.triples):
+            if count > 0:
+                opcode, modes = divmod(index, len(self.modes) ** 2)
+                a_index, b_index = divmod(modes, len(self.modes))
+                triples.append((opcode, self.modes[a_index], self.modes[b_index], count))
+
+        return triples
+
+
+class ProfiledCore:
+    """
+    Class to wrap a core, counting each read and write
+    of a field at each address in a profile. Writing a
+    whole instruction counts as writing all five fields,
+    and writing both field values as writing two.
+    """
+
+    def __init__(self, core, profile):
+        """
+        Initialise the profiled core
+
+        :param core: The core to wrap
+        :param profile: The profile in which to count accesses
+        """
+
+        self.__core = core
+        self.__reads = profile.reads
+        self.__writes = profile.writes
+
+    @property
+    def coresize(self):
+        """
+        Returns the size of the core.
+        """
+
+        return self.__core.coresize
+
+    def instruction(self, address):
+        """
+        Returns the whole instruction at the specified
+        address. This is not counted as a read.
+        """
+
+        return self.__core.instruction(address)
+
+    def read_instruction(self, address):
+        """
+        Returns the whole instruction at the specified address,
+        counted as reading all five fields. Used where an
+        instruction is read as an operand, not executed.
+        """
+
+        value = self.__core.instruction(address)
+        self.__reads[address] += 5
+        return value
+
+    def opcode(self, address):
+        value = self.__core.opcode(address)
+        self.__reads[address] += 1
+        return value
+
+    def a_field_mode(self, address):
+        value = self.__core.a_field_mode(address)
+        self.__reads[address] += 1
+        return value
+
+    def a_field_val(self, address):
+        value = self.__core.a_field_val(address)
+        self.__reads[address] += 1
+        return value
+
+    def b_field_mode(self, address):
+        value = self.__core.b_field_mode(address)
+        self.__reads[address] += 1
+        return value
+
+    def b_field_val(self, address):
+        value = self.__core.b_field_val(address)
+        self.__reads[address] += 1
+        return value
+
+    def put_instr(self, opcode, a_field_mode, a_field_val,
+                  b_field_mode, b_field_val, address):
+        self.__core.put_instr(opcode, a_field_mode, a_field_val,
+                              b_field_mode, b_field_val, address)
+        self.__writes[address] += 5
+
+    def put_opcode(self, opcode, address):
+        self.__core.put_opcode(opcode, address)
+        self.__writes[address] += 1
+
+    def put_a_field_mode(self, a_field_mode, address):
+        self.__core.put_a_field_mode(a_field_mode, address)
+        self.__writes[address] += 1
+
+    def put_a_field_val(self, a_field_val, address):
+        self.__core.put_a_field_val(a_field_val, address)
+        self.__writes[address] += 1
+
+    def put_b_field_mode(self, b_field_mode, address):
+        self.__core.put_b_field_mode(b_field_mode, address)
+        self.__writes[address] += 1
+
+    def put_b_field_val(self, b_field_val, address):
+        self.__core.put_b_field_val(b_field_val, address)
+        self.__writes[address] += 1
+
+    def put_field_vals(self, a_field_val, b_field_val, address):
+        self.__core.put_field_vals(a_field_val, b_field_val, address)
+        self.__writes[address] += 2
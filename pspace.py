@@ -0,0 +1,124 @@
+#! /usr/bin/python
+
+"""
+Private storage (P-space) for the warriors in a match. Each
+warrior has its own array of integer cells, which only it can
+read, with LDP, and write, with STP. The cells survive from one
+round of a match to the next, and may be saved to a file and
+loaded again, so that they also survive between matches.
+
+Before the first round, cell 0 of each warrior holds -1 and the
+other cells hold 0. After each round, cell 0 holds the result of
+the round for that warrior: 0 if it lost, otherwise the number
+of warriors which survived.
+
+>>> import io
+>>> from pspace import PSpace
+>>> pspace = PSpace(2, 4)
+>>> print(pspace.cells[0].tolist())
+[-1, 0, 0, 0]
+>>> pspace.cells[1][3] = 42
+>>> pspace.record_result([1])
+>>> print(pspace.cells[0].tolist(), pspace.cells[1].tolist())
+[0, 0, 0, 0] [1, 0, 0, 42]
+>>> stream = io.BytesIO()
+>>> pspace.save(stream)
+>>> print(len(stream.getvalue()))
+80
+>>> print(PSpace.load(io.BytesIO(stream.getvalue())).cells[1].tolist())
+[1, 0, 0, 42]
+"""
+
+import struct
+import sys
+from array import array
+
+
+class PSpace:
+
+    # Layout of the header of a saved P-space: an identifying tag,
+    # the format version, the number of warriors and the number of
+    # cells each, all little-endian. The cells of each warrior
+    # follow, as little-endian 64-bit integers.
+    header = struct.Struct('<4sIII')
+    tag = b'RCPS'
+    version = 1
+
+    def __init__(self, count, size):
+        """
+        Initialise the P-space of each warrior
+
+        :param count: The number of warriors
+        :param size: The number of cells for each warrior
+        """
+
+        if size < 1:
+            raise RuntimeError('P-space size must be at least 1')
+
+        self.size = size
+
+        # The cells of each warrior, indexed by warrior number
+        self.cells = []
+        for number in range(count):
+            cells = array('q', [0]) * size
+            cells[0] = -1
+            self.cells.append(cells)
+
+    def record_result(self, survivors):
+        """
+        Records the result of a round in cell 0 of each warrior
+
+        :param survivors: The numbers of the warriors which survived
+        """
+
+        for number, cells in enumerate(self.cells):
+            cells[0] = len(survivors) if number in survivors else 0
+
+    def save(self, stream):
+        """
+        Writes the P-space to a binary stream
+
+        :param stream: The binary stream to which to write
+        """
+
+        stream.write(self.header.pack(self.tag, self.version, len(self.cells), self.size))
+
+        for cells in self.cells:
+            if sys.byteorder == 'big':
+                cells = array('q', cells)
+                cells.byteswap()
+
+            stream.write(cells.tobytes())
+
+    @staticmethod
+    def load(stream):
+        """
+        Reads a P-space written by save()
+
+        :param stream: The binary stream from which to read
+
+        :return: The P-space
+        """
+
+        data = stream.read(PSpace.header.size)
+        if len(data) < PSpace.header.size:
+            raise RuntimeError('P-space is truncated')
+
+        tag, version, count, size = PSpace.header.unpack(data)
+
+        if tag != PSpace.tag or version != PSpace.version:
+            raise RuntimeError('Unrecognised P-space')
+
+        pspace = PSpace(count, size)
+
+        for cells in pspace.cells:
+            data = stream.read(8 * size)
+            if len(data) < 8 * size:
+                raise RuntimeError('P-space is truncated')
+
+            cells[:] = array('q', data)
+
+            if sys.byteorder == 'big':
+                cells.byteswap()
+
+        return pspace
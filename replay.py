@@ -0,0 +1,241 @@
+#! /usr/bin/python
+
+"""
+Records battles so that they can be replayed from any cycle.
+Execution is deterministic once the warriors have been loaded,
+so a replay holds only the state of the battle at the start,
+which captures where each warrior was placed, along with
+keyframes saved at regular intervals. Seeking to a cycle
+restores the nearest keyframe at or before it, and executes
+forward from there, so no more than an interval of cycles is
+ever executed again.
+
+Keyframes are held in the form written by
+Interpreter.save_state().
+
+>>> import io
+>>> from core import Core
+>>> from interpreter import Interpreter
+>>> from battle import Warrior
+>>> from replay import Replay
+>>> dwarf = Warrior.from_file('benchmarks/dwarf.red')
+>>> def battle():
+...     core = Core(800)
+...     core.load(dwarf.image, 0)
+...     core.load(dwarf.image, 400)
+...     return Interpreter(core, [0, 400])
+>>> replay = Replay(interval=100)
+>>> print(replay.record(battle(), max_cycles=1000), replay.cycles)
+[0, 1] 1000
+>>> print(replay.keyframes())
+[0, 100, 200, 300, 400, 500, 600, 700, 800, 900, 1000]
+>>> stream = io.BytesIO()
+>>> replay.save(stream)
+>>> replay = Replay.load(io.BytesIO(stream.getvalue()))
+>>> interpreter = replay.seek(250)
+>>> expected = battle()
+>>> survivors = expected.run(250)
+>>> print(interpreter.cycle, interpreter.core.fields() == expected.core.fields())
+250 True
+>>> def limited():
+...     core = Core(800)
+...     core.load(dwarf.image, 0)
+...     core.load(dwarf.image, 400)
+...     return Interpreter(core, [0, 400], read_limit=10, write_limit=10)
+>>> replay = Replay(interval=2)
+>>> print(replay.record(limited()), replay.cycles)
+[] 8
+>>> stream = io.BytesIO()
+>>> replay.save(stream)
+>>> replay = Replay.load(io.BytesIO(stream.getvalue()))
+>>> print(replay.read_limit, replay.write_limit)
+10 10
+>>> interpreter = replay.seek(5)
+>>> expected = limited()
+>>> survivors = expected.run(5)
+>>> print(interpreter.core.fields() == expected.core.fields())
+True
+"""
+
+import bisect
+import io
+import struct
+
+from core import Core
+from interpreter import Interpreter
+
+
+class Replay:
+
+    # Layout of the header of a saved replay: an identifying tag,
+    # the format version, the keyframe interval, the number of
+    # keyframes, the maximum number of processes per program, the
+    # number of cycles recorded and the read and write limits, with
+    # -1 for none, all little-endian. Each keyframe follows, as its
+    # cycle and length, then the saved state.
+    header = struct.Struct('<4sIIIqqqq')
+    keyframe_header = struct.Struct('<qI')
+    tag = b'RCRP'
+    version = 2
+
+    def __init__(self, interval=1000):
+        """
+        Initialise an empty replay
+
+        :param interval: The number of cycles between keyframes
+        """
+
+        if interval < 1:
+            raise RuntimeError('Keyframe interval must be at least 1')
+
+        self.interval = interval
+        self.max_processes = None
+        self.read_limit = None
+        self.write_limit = None
+        self.cycles = 0  # Number of cycles recorded
+
+        # The cycle of each keyframe, in order, and the saved states
+        self.__cycles = []
+        self.__states = []
+
+    def keyframes(self):
+        """
+        Returns the cycle of each keyframe, in order.
+        """
+
+        return list(self.__cycles)
+
+    def record(self, interpreter, max_cycles=80000):
+        """
+        Runs a battle to completion, as Interpreter.run() does,
+        recording keyframes as it goes
+
+        :param interpreter: The interpreter, with the warriors loaded
+        :param max_cycles: The maximum number of cycles to execute
+
+        :return: The numbers of the programs with processes left
+        """
+
+        self.max_processes = interpreter.max_processes
+        self.read_limit = interpreter.read_limit
+        self.write_limit = interpreter.write_limit
+        self.__cycles = []
+        self.__states = []
+
+        self.__keyframe(interpreter)
+
+        # A lone program runs until it dies, otherwise
+        # execution stops when there is a single survivor
+        finish = 1 if len(interpreter.programs) > 1 else 0
+
+        remaining = len(interpreter.survivors())
+        while remaining > finish and interpreter.cycle < max_cycles:
+            remaining = interpreter.step()
+
+            if interpreter.cycle % self.interval == 0:
+                self.__keyframe(interpreter)
+
+        self.cycles = interpreter.cycle
+
+        return interpreter.survivors()
+
+    def seek(self, cycle):
+        """
+        Restores the battle as it was at the start of a cycle
+
+        :param cycle: The cycle, from 0 up to the number of cycles recorded
+
+        :return: A new interpreter, holding the battle at that cycle
+        """
+
+        if len(self.__states) == 0:
+            raise RuntimeError('Nothing has been recorded')
+
+        if cycle < 0 or cycle > self.cycles:
+            raise IndexError('Invalid cycle specified')
+
+        # The nearest keyframe at or before the cycle
+        index = bisect.bisect_right(self.__cycles, cycle) - 1
+        state = self.__states[index]
+
+        coresize = Interpreter.state_header.unpack_from(state)[2]
+        interpreter = Interpreter(Core(coresize), [], max_processes=self.max_processes,
+                                  read_limit=self.read_limit, write_limit=self.write_limit)
+        interpreter.load_state(state)
+
+        while interpreter.cycle < cycle:
+            interpreter.step()
+
+        return interpreter
+
+    def save(self, stream):
+        """
+        Writes the replay to a binary stream
+
+        :param stream: The binary stream to which to write
+        """
+
+        stream.write(self.header.pack(self.tag, self.version, self.interval,
+                                      len(self.__states),
+                                      -1 if self.max_processes is None else self.max_processes,
+                                      self.cycles,
+                                      -1 if self.read_limit is None else self.read_limit,
+                                      -1 if self.write_limit is None else self.write_limit))
+
+        for cycle, state in zip(self.__cycles, self.__states):
+            stream.write(self.keyframe_header.pack(cycle, len(state)))
+            stream.write(state)
+
+    @staticmethod
+    def load(stream):
+        """
+        Reads a replay written by save()
+
+        :param stream: The binary stream from which to read
+
+        :return: The replay
+        """
+
+        data = stream.read(Replay.header.size)
+        if len(data) < Replay.header.size:
+            raise RuntimeError('Replay is truncated')
+
+        (tag, version, interval, count, max_processes, cycles,
+         read_limit, write_limit) = Replay.header.unpack(data)
+
+        if tag != Replay.tag or version != Replay.version:
+            raise RuntimeError('Unrecognised replay')
+
+        replay = Replay(interval)
+        replay.max_processes = None if max_processes < 0 else max_processes
+        replay.read_limit = None if read_limit < 0 else read_limit
+        replay.write_limit = None if write_limit < 0 else write_limit
+        replay.cycles = cycles
+
+        for number in range(count):
+            data = stream.read(Replay.keyframe_header.size)
+            if len(data) < Replay.keyframe_header.size:
+                raise RuntimeError('Replay is truncated')
+
+            cycle, length = Replay.keyframe_header.unpack(data)
+            state = stream.read(length)
+            if len(state) < length:
+                raise RuntimeError('Replay is truncated')
+
+            replay.__cycles.append(cycle)
+            replay.__states.append(state)
+
+        return replay
+
+    def __keyframe(self, interpreter):
+        """
+        Saves the current state of a battle as a keyframe
+
+        :param interpreter: The interpreter executing the battle
+        """
+
+        stream = io.BytesIO()
+        interpreter.save_state(stream)
+
+        self.__cycles.append(interpreter.cycle)
+        self.__states.append(stream.getvalue())
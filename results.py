@@ -0,0 +1,282 @@
+#! /usr/bin/python
+
+"""
+Stores the results of matches in a local SQLite database, so
+that they outlive the process which produced them. Warriors are
+identified by the hash of their image, and match settings by a
+canonical JSON string.
+
+Each match is stored as one row for every ordered pair of
+warriors in it, from the point of view of the first, indexed
+for head-to-head and history queries. The standings of each
+warrior under each settings are kept up to date as results are
+recorded, so that a leaderboard is read from an index rather
+than totalled from every result.
+
+Results are written in batches, each in a single transaction.
+Several processes, such as the workers of a tournament, may
+each open the same database and record results into it.
+
+>>> from battle import Match, Warrior
+>>> from results import ResultStore
+>>> imp = Warrior.from_source('Imp', 'MOV 0, 1')
+>>> bomb = Warrior.from_source('Bomb', 'DAT #0, #0')
+>>> dwarf = Warrior.from_file('benchmarks/dwarf.red')
+>>> store = ResultStore(':memory:')
+>>> for first, second in [(imp, bomb), (imp, dwarf), (dwarf, bomb)]:
+...     match = Match([first, second], coresize=800, max_cycles=1000)
+...     store.record(match, match.run(rounds=2))
+>>> store.flush()
+>>> settings = Match([imp, bomb], coresize=800, max_cycles=1000).settings
+>>> for row in store.leaderboard(settings):
+...     print(row['name'], row['rounds'], row['score'], row['average'])
+Imp 4 8 2.0
+dwarf 4 8 2.0
+Bomb 4 0 0.0
+>>> print(store.head_to_head(imp.key, bomb.key))
+{'matches': 1, 'rounds': 2, 'wins': 2, 'losses': 0, 'ties': 0, 'score': 6}
+>>> print([row['opponent'] for row in store.history(imp.key)])
+['dwarf', 'Bomb']
+>>> store.close()
+"""
+
+import json
+import sqlite3
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS warriors (
+    hash TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    image TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    warrior TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    rounds INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    ties INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    cycles INTEGER NOT NULL,
+    recorded REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS results_pair ON results (warrior, opponent, settings);
+CREATE INDEX IF NOT EXISTS results_history ON results (warrior, id);
+CREATE INDEX IF NOT EXISTS results_opponent ON results (opponent, settings);
+
+CREATE TABLE IF NOT EXISTS standings (
+    warrior TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    rounds INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    ties INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    average REAL NOT NULL,
+    PRIMARY KEY (warrior, settings)
+);
+
+CREATE INDEX IF NOT EXISTS standings_leaderboard ON standings (settings, average DESC);
+'''
+
+# Adds the result of a match to the standings of a warrior
+UPDATE_STANDINGS = '''
+INSERT INTO standings (warrior, settings, rounds, wins, losses, ties, score, average)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (warrior, settings) DO UPDATE SET
+    rounds = rounds + excluded.rounds,
+    wins = wins + excluded.wins,
+    losses = losses + excluded.losses,
+    ties = ties + excluded.ties,
+    score = score + excluded.score,
+    average = CAST(score + excluded.score AS REAL) / (rounds + excluded.rounds)
+'''
+
+
+def settings_key(settings):
+    """
+    Returns the canonical form of a dictionary of match settings,
+    by which results are grouped
+
+    :param settings: The settings, as given by Match.settings
+
+    :return: The settings as a JSON string with sorted keys
+    """
+
+    return json.dumps(settings, sort_keys=True)
+
+
+class ResultStore:
+
+    def __init__(self, path, batch_size=1000, timeout=30.0):
+        """
+        Opens the store, creating the database if it does not exist
+
+        :param path: The path of the database file
+        :param batch_size: The number of matches recorded before
+        they are written in a single transaction
+        :param timeout: The number of seconds to wait for another
+        process to finish writing
+        """
+
+        self.batch_size = batch_size
+
+        self.__connection = sqlite3.connect(path, timeout=timeout)
+        self.__connection.row_factory = sqlite3.Row
+
+        # Write-ahead logging lets readers continue while another
+        # process writes a batch
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.executescript(SCHEMA)
+
+        self.__pending = []  # Matches recorded but not yet written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+    def record(self, match, result):
+        """
+        Records the result of a match, writing the batch
+        once it is full
+
+        :param match: The Match which was run
+        :param result: The MatchResult of the match
+        """
+
+        self.__pending.append((match.warriors, settings_key(match.settings), result))
+
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every recorded match in a single transaction.
+        """
+
+        if len(self.__pending) == 0:
+            return
+
+        warriors = {}
+        results = []
+        standings = []
+        now = time.time()
+
+        for match_warriors, settings, result in self.__pending:
+            keys = [warrior.key for warrior in match_warriors]
+
+            for index, warrior in enumerate(match_warriors):
+                warriors[keys[index]] = (keys[index], warrior.name, warrior.length,
+                                         json.dumps(warrior.image))
+
+                row = (result.rounds, result.wins[index], result.losses[index],
+                       result.ties[index], result.score(index))
+
+                standings.append((keys[index], settings) + row +
+                                 (result.score(index) / result.rounds if result.rounds else 0.0,))
+
+                for other in range(len(match_warriors)):
+                    if other != index:
+                        results.append((keys[index], keys[other], settings) + row +
+                                       (result.cycles, now))
+
+        with self.__connection:
+            self.__connection.executemany(
+                'INSERT OR IGNORE INTO warriors (hash, name, length, image) VALUES (?, ?, ?, ?)',
+                warriors.values())
+
+            self.__connection.executemany(
+                'INSERT INTO results (warrior, opponent, settings, rounds, wins, losses, '
+                'ties, score, cycles, recorded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                results)
+
+            self.__connection.executemany(UPDATE_STANDINGS, standings)
+
+        self.__pending = []
+
+    def leaderboard(self, settings, limit=None):
+        """
+        Returns the standings of every warrior under the specified
+        settings, in order of average score per round, then name
+
+        :param settings: The match settings, as given by Match.settings
+        :param limit: The number of warriors to return, or None for all
+
+        :return: A list of dictionaries holding the hash, name, rounds,
+        wins, losses, ties, score and average score of each warrior
+        """
+
+        query = ('SELECT standings.warrior AS hash, warriors.name AS name, rounds, wins, '
+                 'losses, ties, score, average FROM standings '
+                 'JOIN warriors ON warriors.hash = standings.warrior '
+                 'WHERE settings = ? ORDER BY average DESC, name')
+        parameters = [settings_key(settings)]
+
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+
+        return [dict(row) for row in self.__connection.execute(query, parameters)]
+
+    def head_to_head(self, warrior, opponent, settings=None):
+        """
+        Returns the totals of every match between two warriors,
+        from the point of view of the first
+
+        :param warrior: The hash of the warrior
+        :param opponent: The hash of the opponent
+        :param settings: If given, only matches with these settings are included
+
+        :return: A dictionary of the number of matches and the
+        total rounds, wins, losses, ties and score
+        """
+
+        query = ('SELECT COUNT(*) AS matches, TOTAL(rounds) AS rounds, TOTAL(wins) AS wins, '
+                 'TOTAL(losses) AS losses, TOTAL(ties) AS ties, TOTAL(score) AS score '
+                 'FROM results WHERE warrior = ? AND opponent = ?')
+        parameters = [warrior, opponent]
+
+        if settings is not None:
+            query += ' AND settings = ?'
+            parameters.append(settings_key(settings))
+
+        row = self.__connection.execute(query, parameters).fetchone()
+
+        return {name: int(row[name]) for name in row.keys()}
+
+    def history(self, warrior, limit=100):
+        """
+        Returns the most recent results of a warrior, latest first
+
+        :param warrior: The hash of the warrior
+        :param limit: The number of results to return
+
+        :return: A list of dictionaries holding the name and hash of
+        the opponent, the settings, and the rounds, wins, losses,
+        ties and score of the warrior in each match
+        """
+
+        rows = self.__connection.execute(
+            'SELECT warriors.name AS opponent, results.opponent AS hash, settings, rounds, '
+            'wins, losses, ties, score, cycles, recorded FROM results '
+            'JOIN warriors ON warriors.hash = results.opponent '
+            'WHERE results.warrior = ? ORDER BY results.id DESC LIMIT ?',
+            (warrior, limit))
+
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """
+        Writes any recorded matches and closes the database.
+        """
+
+        self.flush()
+        self.__connection.close()
@@ -0,0 +1,125 @@
+#! /usr/bin/python
+
+"""
+Scores warriors against a benchmark set of opponents, abandoning
+a warrior as soon as it can no longer beat a threshold score.
+Each round is worth at most three points, so after every round
+the best score a warrior can still achieve is known, and once
+that is no higher than the threshold the remaining rounds are
+not fought.
+
+So that poor warriors are abandoned as early as possible, the
+opponents are fought in order of how many points warriors have
+lost against them so far, and, among those equal, of how much
+the points scored against them vary between rounds. Opponents
+which have not yet been fought come first.
+
+>>> from battle import Warrior
+>>> from scoring import BenchmarkRunner
+>>> imp = Warrior.from_source('Imp', 'MOV 0, 1')
+>>> bomb = Warrior.from_source('Bomb', 'DAT #0, #0')
+>>> runner = BenchmarkRunner([bomb, imp], rounds=2, coresize=800, max_cycles=500)
+>>> print(runner.order())
+[0, 1]
+>>> print(runner.score(imp))
+(8, True)
+>>> print(runner.order())
+[1, 0]
+>>> print(runner.score(bomb, threshold=4))
+(0, False)
+>>> print(runner.rounds_fought, runner.rounds_abandoned)
+7 1
+"""
+
+from battle import Match
+
+
+class BenchmarkRunner:
+
+    def __init__(self, opponents, rounds=1, **settings):
+        """
+        Initialise the runner
+
+        :param opponents: The list of opponent warriors
+        :param rounds: The number of rounds against each opponent
+        :param settings: Keyword arguments to Match, such as coresize
+        """
+
+        self.opponents = opponents
+        self.rounds = rounds
+        self.settings = settings
+
+        self.rounds_fought = 0     # Number of rounds fought
+        self.rounds_abandoned = 0  # Number of rounds not fought
+
+        # The number of rounds fought against each opponent, and the
+        # total and sum of squares of the points scored against it
+        self.__counts = [0] * len(opponents)
+        self.__totals = [0] * len(opponents)
+        self.__squares = [0] * len(opponents)
+
+    def order(self):
+        """
+        Returns the order in which to fight the opponents, as a list
+        of indices, most points lost and most variable first.
+        """
+
+        keys = []
+        for index in range(len(self.opponents)):
+            count = self.__counts[index]
+
+            if count == 0:
+                keys.append((-1, 0, index))
+
+            else:
+                mean = self.__totals[index] / count
+                variance = self.__squares[index] / count - mean * mean
+                keys.append((mean, -variance, index))
+
+        return [index for mean, variance, index in sorted(keys)]
+
+    def score(self, warrior, threshold=None):
+        """
+        Scores a warrior against every opponent, stopping once
+        it can no longer score more than a threshold
+
+        :param warrior: The warrior to score
+        :param threshold: The score to beat, or None to fight
+        every round
+
+        :return: A pair of the score, and False if the warrior was
+        abandoned, in which case the score is the points it had
+        scored when abandoned
+        """
+
+        total = 0
+        remaining = 3 * self.rounds * len(self.opponents)
+
+        for index in self.order():
+            match = Match([warrior, self.opponents[index]], **self.settings)
+
+            for round_number in range(self.rounds):
+                survivors = match.run_round(round_number)[0]
+
+                if 0 not in survivors:
+                    points = 0
+
+                elif len(survivors) == 1:
+                    points = 3
+
+                else:
+                    points = 1
+
+                total += points
+                remaining -= 3
+
+                self.rounds_fought += 1
+                self.__counts[index] += 1
+                self.__totals[index] += points
+                self.__squares[index] += points * points
+
+                if threshold is not None and total + remaining <= threshold:
+                    self.rounds_abandoned += remaining // 3
+                    return total, False
+
+        return total, True
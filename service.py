@@ -0,0 +1,557 @@
+#! /usr/bin/python
+
+"""
+A local battle service, which accepts matches over a TCP port
+or a Unix socket and runs them on a pool of worker processes,
+so that many clients share one set of warm simulators rather
+than each starting a Python process per battle.
+
+Clients send one JSON request per line, holding an id of their
+choosing, the warriors as Red Code source, the number of rounds
+and any match settings, for example
+
+    {"id": 1, "warriors": [{"name": "Imp", "source": "MOV 0, 1"},
+                           {"name": "Bomb", "source": "DAT #0"}],
+     "rounds": 3, "settings": {"coresize": 8000}}
+
+and receive JSON lines tagged with the same id: a "queued" and
+then a "started" status, the survivors and cycles of each round
+as it finishes, and finally either the result of the match or
+an error.
+
+Requests wait in a bounded queue for a worker. Once it is full,
+the service stops reading from clients until a worker is free,
+so a client submitting faster than matches can be run is slowed
+down rather than growing the queue without limit. Each worker
+process assembles the warriors itself, and keeps a core of each
+size it has used, up to a limit, which it clears and reuses for
+later rounds.
+
+>>> import asyncio, json
+>>> from service import BattleService
+>>> async def submit(request):
+...     service = BattleService(workers=1)
+...     await service.start(port=0)
+...     reader, writer = await asyncio.open_connection(*service.address[:2])
+...     writer.write(json.dumps(request).encode() + b'\\n')
+...     replies = []
+...     while not replies or replies[-1].keys() & {'result', 'error'} == set():
+...         replies.append(json.loads(await reader.readline()))
+...     writer.close()
+...     await service.close()
+...     return replies
+>>> replies = asyncio.run(submit({'id': 'a', 'rounds': 2,
+...     'warriors': [{'name': 'Imp', 'source': 'MOV 0, 1'},
+...                  {'name': 'Bomb', 'source': 'DAT #0, #0'}],
+...     'settings': {'coresize': 800, 'max_cycles': 500}}))
+>>> for reply in replies:
+...     print(reply)
+{'id': 'a', 'status': 'queued'}
+{'id': 'a', 'status': 'started'}
+{'id': 'a', 'round': 0, 'survivors': [0], 'cycles': 1}
+{'id': 'a', 'round': 1, 'survivors': [0], 'cycles': 1}
+{'id': 'a', 'result': {'wins': [2, 0], 'losses': [0, 2], 'ties': [0, 0], 'scores': [6, 0], 'rounds': 2, 'cycles': 2}}
+>>> replies = asyncio.run(submit({'id': 'b',
+...     'warriors': [{'name': 'Bad', 'source': 'MOV 0'}]}))
+>>> print(replies[-1])
+{'id': 'b', 'error': 'RuntimeError: Expecting COMMA in line 1'}
+>>> replies = asyncio.run(submit({'id': 'c', 'warriors': ['MOV 0, 1']}))
+>>> print(replies[-1])
+{'id': None, 'error': 'ValueError: Warrior must be a JSON object'}
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from battle import Match, MatchResult, Warrior
+from core import Core
+
+# Match settings which a request may give
+SETTINGS = {'coresize', 'max_cycles', 'max_processes', 'read_limit', 'write_limit',
+            'seed', 'separation'}
+
+# The largest core a request may ask for
+MAX_CORESIZE = 1000000
+
+# The number of cores of different sizes a worker keeps for reuse
+MAX_WORKER_CORES = 8
+
+# The queue on which a worker process reports progress, and the
+# cores it keeps for reuse, by size, set when the worker starts.
+# Once MAX_WORKER_CORES are kept, a core of any other size is
+# created for its match alone.
+worker_progress = None
+worker_cores = {}
+
+
+def initialise_worker(progress, coresizes):
+    """
+    Prepares a worker process, creating a core of each of the
+    sizes expected to be used
+
+    :param progress: The multiprocessing queue on which to report progress
+    :param coresizes: The sizes of the cores to create
+    """
+
+    global worker_progress
+
+    worker_progress = progress
+
+    for coresize in coresizes:
+        worker_cores[coresize] = Core(coresize)
+
+
+def run_in_worker(number, warriors, rounds, settings):
+    """
+    Runs a match in a worker process, reporting the result of
+    each round, and then the result of the match or the error
+    which prevented it, on the progress queue. Errors are never
+    raised, so that one bad request cannot break the pool.
+
+    :param number: The number of the job, which tags its reports
+    :param warriors: A list of (name, source) pairs
+    :param rounds: The number of rounds
+    :param settings: A dictionary of keyword arguments to Match
+    """
+
+    try:
+        match = Match([Warrior.from_source(name, source) for name, source in warriors],
+                      **settings)
+
+        core = worker_cores.get(match.coresize)
+        if core is None:
+            core = Core(match.coresize)
+
+            if len(worker_cores) < MAX_WORKER_CORES:
+                worker_cores[match.coresize] = core
+        result = MatchResult(len(match.warriors))
+
+        for round_number in range(rounds):
+            start = time.perf_counter()
+            survivors, cycles, ownership = match.run_round(round_number, core)
+            result.record(survivors, cycles)
+
+            # The time taken is for the metrics of the service,
+            # and is not passed on to the client
+            worker_progress.put((number, {'round': round_number,
+                                          'survivors': sorted(survivors),
+                                          'cycles': cycles},
+                                 time.perf_counter() - start))
+
+        worker_progress.put((number, {'result': result.to_dict()}, None))
+
+    except Exception as error:
+        worker_progress.put((number, {'error': type(error).__name__ + ': ' + str(error)}, None))
+
+
+class Job:
+    """
+    Class to model a match waiting for, or being run by, a worker.
+    """
+
+    def __init__(self, number, request, connection):
+        """
+        Initialise the job
+
+        :param number: The number of the job, unique within the service
+        :param request: The decoded request
+        :param connection: The Connection which submitted the job
+        """
+
+        self.number = number
+        self.request = request
+        self.connection = connection
+
+        # Set once the result or error of the job has been reported
+        self.finished = asyncio.get_running_loop().create_future()
+
+    def send(self, message):
+        """
+        Sends a message about the job to its client, tagged
+        with the id the client gave
+
+        :param message: The dictionary to send
+        """
+
+        self.connection.send(dict({'id': self.request.get('id')}, **message))
+
+
+class Connection:
+    """
+    Class to send JSON lines to a client in order, from a
+    single task, so that concurrent jobs never interleave
+    or wait on each other's writes.
+    """
+
+    def __init__(self, writer):
+        """
+        Initialise the connection and start its writing task
+
+        :param writer: The asyncio StreamWriter of the client
+        """
+
+        self.__writer = writer
+        self.__messages = asyncio.Queue()
+        self.__task = asyncio.get_running_loop().create_task(self.__write_messages())
+
+    def send(self, message):
+        """
+        Queues a message to be written to the client
+
+        :param message: The dictionary to send
+        """
+
+        self.__messages.put_nowait(message)
+
+    async def close(self):
+        """
+        Writes any queued messages, then closes the connection.
+        """
+
+        self.__messages.put_nowait(None)
+        await self.__task
+
+        self.__writer.close()
+
+    async def __write_messages(self):
+        """
+        Writes queued messages until the connection is closed,
+        discarding them if the client has gone away.
+        """
+
+        while True:
+            message = await self.__messages.get()
+            if message is None:
+                break
+
+            try:
+                self.__writer.write(json.dumps(message).encode() + b'\n')
+                await self.__writer.drain()
+
+            except ConnectionError:
+                pass
+
+
+class BattleService:
+
+    def __init__(self, workers=None, queue_size=64, coresizes=(8000,), metrics=None):
+        """
+        Initialise the service
+
+        :param workers: The number of worker processes, defaulting
+        to the number of processors
+        :param queue_size: The number of jobs which may wait for a
+        worker before the service stops reading requests
+        :param coresizes: The sizes of core which each worker
+        creates when it starts
+        :param metrics: An optional Metrics, in which the rounds and
+        matches run and the jobs waiting are recorded
+        """
+
+        self.workers = workers or os.cpu_count()
+        self.queue_size = queue_size
+        self.coresizes = coresizes
+        self.metrics = metrics
+
+        self.__server = None
+        self.__path = None         # Path of the Unix socket, if any
+        self.__executor = None
+        self.__jobs = None         # Jobs waiting for a worker
+        self.__running = {}        # Jobs sent to a worker, by number
+        self.__dispatchers = []    # Tasks handing jobs to workers
+        self.__connections = set() # Tasks serving clients
+        self.__next_number = 0
+
+        self.__progress = None
+        self.__progress_thread = None
+
+    @property
+    def address(self):
+        """
+        Returns the address on which the service is listening.
+        """
+
+        return self.__server.sockets[0].getsockname()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Starts the worker processes and begins listening
+
+        :param host: The host name or address on which to listen
+        :param port: The TCP port on which to listen, or 0 for any
+        :param path: If given, the path of a Unix socket on which
+        to listen instead of a TCP port
+        """
+
+        loop = asyncio.get_running_loop()
+
+        self.__progress = multiprocessing.Queue()
+        self.__executor = ProcessPoolExecutor(max_workers=self.workers,
+                                              initializer=initialise_worker,
+                                              initargs=(self.__progress, self.coresizes))
+
+        # Reports from the workers are read by a thread, which
+        # hands each one to the event loop
+        self.__progress_thread = threading.Thread(target=self.__read_progress,
+                                                  args=(loop,), daemon=True)
+        self.__progress_thread.start()
+
+        # Start every worker now, so that the first requests
+        # do not wait for them
+        await asyncio.gather(*[loop.run_in_executor(self.__executor, os.getpid)
+                               for worker in range(self.workers)])
+
+        self.__jobs = asyncio.Queue(self.queue_size)
+        self.__dispatchers = [loop.create_task(self.__dispatch())
+                              for worker in range(self.workers)]
+
+        if path is not None:
+            self.__server = await asyncio.start_unix_server(self.__serve, path=path)
+            self.__path = path
+
+        else:
+            self.__server = await asyncio.start_server(self.__serve, host, port)
+
+    async def serve_forever(self):
+        """
+        Serves clients until the task is cancelled.
+        """
+
+        await self.__server.serve_forever()
+
+    async def close(self):
+        """
+        Stops listening, abandons any jobs still queued and
+        stops the worker processes.
+        """
+
+        self.__server.close()
+        await self.__server.wait_closed()
+
+        if self.__path is not None:
+            os.unlink(self.__path)
+
+        for task in self.__dispatchers + list(self.__connections):
+            task.cancel()
+
+        await asyncio.gather(*self.__dispatchers, *self.__connections,
+                             return_exceptions=True)
+
+        self.__executor.shutdown(cancel_futures=True)
+
+        self.__progress.put(None)
+        self.__progress_thread.join()
+        self.__progress.close()
+
+    async def __serve(self, reader, writer):
+        """
+        Reads the requests of a client, queueing a job for each,
+        until the client disconnects
+
+        :param reader: The asyncio StreamReader of the client
+        :param writer: The asyncio StreamWriter of the client
+        """
+
+        self.__connections.add(asyncio.current_task())
+        connection = Connection(writer)
+
+        try:
+            async for line in reader:
+                if not line.strip():
+                    continue
+
+                try:
+                    request = self.__parse(line)
+
+                except (ValueError, TypeError) as error:
+                    connection.send({'id': None, 'error': type(error).__name__ + ': ' + str(error)})
+                    continue
+
+                job = Job(self.__next_number, request, connection)
+                self.__next_number += 1
+
+                job.send({'status': 'queued'})
+
+                # Waits while the queue is full, so no more requests
+                # are read from this client until a worker is free
+                await self.__jobs.put(job)
+
+                if self.metrics is not None:
+                    self.metrics.queue_depth = self.__jobs.qsize()
+
+        except (ConnectionError, asyncio.CancelledError):
+            # The client has gone away, or the service is closing
+            pass
+
+        finally:
+            self.__connections.discard(asyncio.current_task())
+            await connection.close()
+
+    @staticmethod
+    def __parse(line):
+        """
+        Decodes and checks a request
+
+        :param line: The line of JSON received
+
+        :return: The request as a dictionary
+        """
+
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError('Request must be a JSON object')
+
+        if not isinstance(request.get('warriors'), list) or not request['warriors']:
+            raise ValueError('Request has no warriors')
+
+        for warrior in request['warriors']:
+            if not isinstance(warrior, dict):
+                raise ValueError('Warrior must be a JSON object')
+
+            if not isinstance(warrior.get('source'), str):
+                raise ValueError('Warrior has no source')
+
+            if not isinstance(warrior.get('name', ''), str):
+                raise ValueError('Warrior name must be a string')
+
+        settings = request.get('settings', {})
+        if not isinstance(settings, dict):
+            raise ValueError('Settings must be a JSON object')
+
+        unknown = set(settings) - SETTINGS
+        if unknown:
+            raise ValueError('Unknown settings: ' + ', '.join(sorted(unknown)))
+
+        for name, value in settings.items():
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+                raise ValueError('Setting %s must be an integer' % name)
+
+        coresize = settings.get('coresize', 8000)
+        if coresize is None or not 1 <= coresize <= MAX_CORESIZE:
+            raise ValueError('Core size must be from 1 to %d' % MAX_CORESIZE)
+
+        if not isinstance(request.get('rounds', 1), int) or request.get('rounds', 1) < 1:
+            raise ValueError('Rounds must be a positive integer')
+
+        return request
+
+    async def __dispatch(self):
+        """
+        Hands queued jobs to a worker one at a time, so that
+        there is never more than one job per worker in the pool.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self.__jobs.get()
+
+            if self.metrics is not None:
+                self.metrics.queue_depth = self.__jobs.qsize()
+            request = job.request
+
+            self.__running[job.number] = job
+            job.send({'status': 'started'})
+
+            try:
+                await loop.run_in_executor(
+                    self.__executor, run_in_worker, job.number,
+                    [(warrior.get('name', 'Warrior %d' % index), warrior['source'])
+                     for index, warrior in enumerate(request['warriors'])],
+                    request.get('rounds', 1), request.get('settings', {}))
+
+                # The worker has returned, but its final report
+                # may not yet have been read from the queue
+                await job.finished
+
+            except Exception as error:
+                if not job.finished.done():
+                    job.send({'error': type(error).__name__ + ': ' + str(error)})
+
+            finally:
+                del self.__running[job.number]
+
+    def __receive(self, number, message, seconds):
+        """
+        Passes a report from a worker to the client of the job
+
+        :param number: The number of the job
+        :param message: The report
+        :param seconds: The time taken by the round reported, or None
+        """
+
+        if self.metrics is not None:
+            if seconds is not None:
+                self.metrics.record_round(message['cycles'], seconds)
+
+            elif 'result' in message:
+                self.metrics.record_battle()
+
+        job = self.__running.get(number)
+        if job is None:
+            return
+
+        job.send(message)
+
+        if 'result' in message or 'error' in message:
+            job.finished.set_result(None)
+
+    def __read_progress(self, loop):
+        """
+        Reads reports from the workers until the service closes,
+        handing each to the event loop
+
+        :param loop: The event loop of the service
+        """
+
+        while True:
+            report = self.__progress.get()
+            if report is None:
+                break
+
+            loop.call_soon_threadsafe(self.__receive, *report)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run matches for clients on a pool of workers')
+    parser.add_argument('--host', default='127.0.0.1', help='host on which to listen')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port on which to listen')
+    parser.add_argument('--unix', default=None, help='Unix socket on which to listen instead')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help='jobs which may wait for a worker')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='TCP port on which to serve Prometheus metrics')
+    args = parser.parse_args()
+
+    async def main():
+        metrics = None
+        if args.metrics_port is not None:
+            from metrics import Metrics
+
+            metrics = Metrics()
+            print('Serving metrics on', metrics.serve(args.metrics_port, args.host))
+
+        service = BattleService(workers=args.workers, queue_size=args.queue_size,
+                                metrics=metrics)
+        await service.start(args.host, args.port, args.unix)
+        print('Listening on', service.address)
+
+        try:
+            await service.serve_forever()
+
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(main())
+
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,280 @@
+#! /usr/bin/python
+
+"""
+A core held in shared memory, so that other processes can
+observe a battle as it runs. The creating process executes
+the battle in a SharedCore exactly as in a Core, while any
+number of observers attach to the same memory by its name
+and read the core in place, with no copying or pickling.
+Observers attach read-only by default.
+
+The memory holds the size of the core, followed by the five
+fields of each word in address order, as native 32-bit
+integers. This is the layout returned by Core.fields().
+
+>>> from assemblytoken import AssemblyToken as Token
+>>> from interpreter import Interpreter
+>>> from sharedcore import SharedCore
+>>> core = SharedCore(100)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 0, Token.DIRECT, 1, 10)
+>>> observer = SharedCore.attach(core.name)
+>>> print(observer.coresize)
+100
+>>> survivors = Interpreter(core, [10]).run(3)
+>>> print(observer.disassemble(10, 14), end='')
+10  MOV 0, 1
+11  MOV 0, 1
+12  MOV 0, 1
+13  MOV 0, 1
+>>> observer.put_opcode(Token.DAT, 10)
+Traceback (most recent call last):
+TypeError: cannot modify read-only memory
+>>> observer.close()
+>>> core.put_instr(Token.MOV, Token.IMMEDIATE, 100 * 2 ** 40 + 7, Token.DIRECT, -1, 20)
+>>> core.print_instruction(20)
+MOV #7, -1
+>>> core.close()
+>>> core.unlink()
+"""
+
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+
+from assemblytoken import AssemblyToken as Token
+from core import Core
+
+# Names of the shared memory created by this process
+created = set()
+
+
+class SharedCore(Core):
+
+    def __init__(self, size=8000, name=None):
+        """
+        Initialise the core in a new block of shared memory.
+        The core will initially be filled with NULLs.
+
+        :param size: The size of the core
+        :param name: The name of the shared memory, which by
+        default is chosen by the system
+        """
+
+        assert isinstance(size, int)
+
+        self.__memory = shared_memory.SharedMemory(name, create=True,
+                                                   size=4 * (1 + 5 * size))
+        created.add(self.__memory.name)
+
+        self.__fields = self.__memory.buf.cast('i')
+        self.__fields[0] = size
+        self.__fields[1:] = array('i', [Token.NULL]) * (5 * size)
+        self.__size = size
+
+    @staticmethod
+    def attach(name, readonly=True):
+        """
+        Attaches to a core created by another SharedCore,
+        usually in another process
+
+        :param name: The name of the shared memory
+        :param readonly: If True, any attempt to write to the core fails
+
+        :return: The attached core
+        """
+
+        memory = shared_memory.SharedMemory(name)
+
+        # Only the creator should remove the memory, so an observer
+        # in another process stops the resource tracker from
+        # removing it when the observer exits
+        if memory.name not in created:
+            resource_tracker.unregister(memory._name, 'shared_memory')
+
+        core = SharedCore.__new__(SharedCore)
+        core.__memory = memory
+        core.__fields = memory.buf.cast('i')
+
+        if readonly:
+            core.__fields = core.__fields.toreadonly()
+
+        core.__size = core.__fields[0]
+
+        return core
+
+    @property
+    def name(self):
+        """
+        Returns the name of the shared memory, by which
+        observers attach to the core.
+        """
+
+        return self.__memory.name
+
+    @property
+    def coresize(self):
+        """
+        Returns the size of the core.
+        """
+
+        return self.__size
+
+    def close(self):
+        """
+        Closes access to the core from this process.
+        """
+
+        self.__fields.release()
+        self.__memory.close()
+
+    def unlink(self):
+        """
+        Removes the shared memory once every process has closed
+        it. Should be called only by the creator of the core.
+        """
+
+        created.discard(self.__memory.name)
+        self.__memory.unlink()
+
+    def __reduce(self, value):
+        """
+        Returns a field value to be written to the memory. A value a
+        core size or more from zero is taken modulo the size of the
+        core, as Core does, so that it fits in a 32-bit field.
+
+        :param value: The field value
+
+        :return: The value to write
+        """
+
+        if -self.__size < value < self.__size:
+            return value
+
+        return value % self.__size
+
+    def opcode(self, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        return self.__fields[1 + 5 * address]
+
+    def a_field_mode(self, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        return self.__fields[2 + 5 * address]
+
+    def a_field_val(self, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        return self.__fields[3 + 5 * address]
+
+    def b_field_mode(self, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        return self.__fields[4 + 5 * address]
+
+    def b_field_val(self, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        return self.__fields[5 + 5 * address]
+
+    def instruction(self, address):
+        """
+        Returns the whole instruction at the specified address,
+        as a list of the opcode, A-field mode, A-field value,
+        B-field mode and B-field value. The list is a copy.
+        """
+
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        return self.__fields[1 + 5 * address:6 + 5 * address].tolist()
+
+    def put_instr(self, opcode, a_field_mode, a_field_val,
+                  b_field_mode, b_field_val, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        if a_field_mode != Token.NULL:
+            a_field_val = self.__reduce(a_field_val)
+
+        if b_field_mode != Token.NULL:
+            b_field_val = self.__reduce(b_field_val)
+
+        index = 1 + 5 * address
+        self.__fields[index:index + 5] = array('i', [opcode, a_field_mode, a_field_val,
+                                                     b_field_mode, b_field_val])
+
+    def load(self, image, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        for instruction in image:
+            self.put_instr(*instruction, address)
+
+            # Increment the address, wrapping around
+            # to the start of the core if necessary
+            address += 1
+            if address == self.__size:
+                address = 0
+
+    def clear(self):
+        self.__fields[1:] = array('i', [Token.NULL]) * (5 * self.__size)
+
+    def fields(self):
+        values = array('i')
+        values.frombytes(self.__memory.buf[4:])
+
+        return values
+
+    def put_fields(self, values):
+        if len(values) != 5 * self.__size:
+            raise IndexError('Fields do not match the size of the core')
+
+        values = list(values)
+        for index in range(0, len(values), 5):
+            for mode, value in ((index + 1, index + 2), (index + 3, index + 4)):
+                if values[mode] != Token.NULL:
+                    values[value] = self.__reduce(values[value])
+
+        self.__fields[1:] = array('i', values)
+
+    def put_opcode(self, opcode, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        self.__fields[1 + 5 * address] = opcode
+
+    def put_a_field_mode(self, a_field_mode, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        self.__fields[2 + 5 * address] = a_field_mode
+
+    def put_a_field_val(self, a_field_val, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        self.__fields[3 + 5 * address] = self.__reduce(a_field_val)
+
+    def put_b_field_mode(self, b_field_mode, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        self.__fields[4 + 5 * address] = b_field_mode
+
+    def put_b_field_val(self, b_field_val, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        self.__fields[5 + 5 * address] = self.__reduce(b_field_val)
+
+    def put_field_vals(self, a_field_val, b_field_val, address):
+        if address < 0 or address >= self.__size:
+            raise IndexError('Invalid address specified')
+
+        self.__fields[3 + 5 * address] = self.__reduce(a_field_val)
+        self.__fields[5 + 5 * address] = self.__reduce(b_field_val)
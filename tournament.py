@@ -0,0 +1,460 @@
+#! /usr/bin/python
+
+"""
+Runs a round-robin tournament, in which every warrior fights
+every other, across a set of local worker processes. Battles
+vary enormously in length, so rather than splitting the pairings
+between the workers in advance, the rounds of each pairing are
+handed out in chunks to whichever worker falls idle, so that no
+worker waits while others still have work.
+
+Every worker is sent the assembled warriors once, when it starts,
+and keeps them, so a chunk is described by just the numbers of
+the two warriors and its rounds. Chunks are sized adaptively: the
+time per round of each pairing is measured as its chunks finish,
+and later chunks are sized to take about a target time, and
+shrink as the tournament nears its end, so that the last chunks
+are spread across every worker rather than left to one.
+
+The pairings with the most rounds left are handed out first.
+A pairing in which neither warrior uses P-space may have several
+chunks running at once, since its rounds are independent. The
+rounds of a pairing using P-space must see the results of those
+before, so its chunks run one at a time, each carrying on the
+P-space left by the last, and the results are the same as if the
+match had been run by a single process.
+
+>>> from battle import Warrior
+>>> from tournament import Tournament
+>>> imp = Warrior.from_source('Imp', 'MOV 0, 1')
+>>> bomb = Warrior.from_source('Bomb', 'DAT #0, #0')
+>>> dwarf = Warrior.from_file('benchmarks/dwarf.red')
+>>> tournament = Tournament([imp, bomb, dwarf], rounds=4, workers=1,
+...                         coresize=800, max_cycles=1000)
+>>> results = tournament.run()
+>>> print(sorted(results))
+[(0, 1), (0, 2), (1, 2)]
+>>> print(results[0, 2].ties, tournament.scores())
+[4, 4] [16, 0, 16]
+>>> tournament = Tournament([imp, bomb, dwarf], rounds=4, workers=2,
+...                         coresize=800, max_cycles=1000)
+>>> print(tournament.run()[0, 2].ties, tournament.scores(), tournament.chunks >= 3)
+[4, 4] [16, 0, 16] True
+
+An error in a worker process is raised by run().
+
+>>> tournament = Tournament([imp, bomb, dwarf], rounds=4, workers=2, coresize=50, seed=1)
+>>> try:
+...     tournament.run()
+... except RuntimeError as error:
+...     print(error)
+Warriors do not fit in the core with the separation
+"""
+
+import heapq
+import math
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+
+from assemblytoken import AssemblyToken as Token
+from battle import Match, MatchResult
+from core import Core
+
+
+def run_worker(connection, warriors, settings):
+    """
+    Runs chunks of rounds in a worker process, as they are received,
+    until it is sent None. An error running a chunk is returned in
+    place of its results, to be raised by the parent process.
+
+    :param connection: The connection on which chunks are received
+    and their results returned
+    :param warriors: The list of warriors in the tournament
+    :param settings: A dictionary of keyword arguments to Match
+    """
+
+    core = Core(settings.get('coresize', 8000))  # Reused for every round
+
+    while True:
+        chunk = connection.recv()
+        if chunk is None:
+            break
+
+        try:
+            result = run_chunk(warriors, settings, core, *chunk)
+
+        except Exception as error:
+            result = error
+
+        connection.send(result)
+
+
+def run_chunk(warriors, settings, core, pairing, first, second,
+              round_number, rounds, pspace):
+    """
+    Runs a chunk of the rounds of a pairing
+
+    :param warriors: The list of warriors in the tournament
+    :param settings: A dictionary of keyword arguments to Match
+    :param core: A Core to reuse, or None to create one per round
+    :param pairing: The number of the pairing
+    :param first: The number of the first warrior
+    :param second: The number of the second warrior
+    :param round_number: The number of the first round of the chunk
+    :param rounds: The number of rounds in the chunk
+    :param pspace: The PSpace left by the last chunk, or None
+
+    :return: A tuple of the number of the pairing, the survivors, cycles
+    and time taken of each round, the P-space of the warriors and the
+    time taken by the chunk
+    """
+
+    start = time.perf_counter()
+
+    match = Match([warriors[first], warriors[second]], pspace=pspace, **settings)
+
+    outcomes = []
+    for number in range(round_number, round_number + rounds):
+        round_start = time.perf_counter()
+        survivors, cycles, ownership = match.run_round(number, core)
+        outcomes.append((survivors, cycles, time.perf_counter() - round_start))
+
+    return pairing, outcomes, match.pspace, time.perf_counter() - start
+
+
+class Pairing:
+    """
+    Class to model the progress of a pairing through the tournament.
+    """
+
+    def __init__(self, first, second, rounds, serial):
+        """
+        Initialise the pairing with no rounds run
+
+        :param first: The number of the first warrior
+        :param second: The number of the second warrior
+        :param rounds: The number of rounds to run
+        :param serial: True if the chunks must run one at a time
+        """
+
+        self.first = first
+        self.second = second
+        self.serial = serial
+
+        self.next_round = 0       # Number of the next round to hand out
+        self.remaining = rounds   # Number of rounds not yet handed out
+        self.running = 0          # Number of chunks being run
+        self.pspace = None        # P-space left by the last chunk
+
+        self.result = MatchResult(2)
+
+        # Time taken by the rounds run so far
+        self.rounds_timed = 0
+        self.time = 0.0
+
+    @property
+    def ready(self):
+        """
+        Returns True if a chunk of the pairing may be handed out.
+        """
+
+        return self.remaining > 0 and not (self.serial and self.running > 0)
+
+
+class Tournament:
+
+    def __init__(self, warriors, rounds=100, workers=None, target_time=0.25,
+                 metrics=None, **settings):
+        """
+        Initialise the tournament
+
+        :param warriors: The list of warriors
+        :param rounds: The number of rounds of each pairing
+        :param workers: The number of worker processes, defaulting
+        to the number of processors
+        :param target_time: The number of seconds each chunk should take
+        :param metrics: An optional Metrics, in which the rounds, the
+        pairings completed and the rounds waiting are recorded
+        :param settings: Keyword arguments to Match, such as coresize
+        """
+
+        self.warriors = warriors
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count()
+        self.target_time = target_time
+        self.metrics = metrics
+        self.settings = settings
+
+        self.chunks = 0         # Number of chunks handed out
+        self.busy_time = 0.0    # Total time the workers spent running chunks
+        self.elapsed = 0.0      # Time taken by the tournament
+
+        self.__pairings = []
+        self.__remaining = 0     # Number of rounds not yet handed out
+        self.__rounds_timed = 0  # Number of rounds run by the workers
+
+    def run(self):
+        """
+        Runs every pairing
+
+        :return: A dictionary of the MatchResult of each pairing,
+        keyed by the numbers of its two warriors
+        """
+
+        uses_pspace = [any(instruction[0] in (Token.LDP, Token.STP)
+                           for instruction in warrior.image)
+                       for warrior in self.warriors]
+
+        self.__pairings = [Pairing(first, second, self.rounds,
+                                   uses_pspace[first] or uses_pspace[second])
+                           for first in range(len(self.warriors))
+                           for second in range(first + 1, len(self.warriors))]
+
+        self.__remaining = len(self.__pairings) * self.rounds
+
+        start = time.perf_counter()
+
+        if self.workers == 1:
+            # Avoid the cost of worker processes for a single worker
+            core = Core(self.settings.get('coresize', 8000))
+
+            for number, pairing in enumerate(self.__pairings):
+                rounds = pairing.remaining
+
+                pairing.remaining = 0
+                pairing.running = 1
+                self.__remaining -= rounds
+                self.chunks += 1
+
+                self.__record(run_chunk(self.warriors, self.settings, core, number,
+                                        pairing.first, pairing.second, 0, rounds, None))
+
+        else:
+            self.__run_workers()
+
+        self.elapsed = time.perf_counter() - start
+
+        return {(pairing.first, pairing.second): pairing.result
+                for pairing in self.__pairings}
+
+    def scores(self):
+        """
+        Returns the total score of each warrior over every pairing run.
+        """
+
+        scores = [0] * len(self.warriors)
+
+        for pairing in self.__pairings:
+            scores[pairing.first] += pairing.result.score(0)
+            scores[pairing.second] += pairing.result.score(1)
+
+        return scores
+
+    def __run_workers(self):
+        """
+        Hands out chunks to worker processes as they fall idle,
+        until every round of every pairing has been run.
+        """
+
+        connections = []
+        processes = []
+
+        for worker in range(min(self.workers, len(self.__pairings) * self.rounds)):
+            parent, child = multiprocessing.Pipe()
+
+            process = multiprocessing.Process(target=run_worker,
+                                              args=(child, self.warriors, self.settings),
+                                              daemon=True)
+            process.start()
+            child.close()
+
+            connections.append(parent)
+            processes.append(process)
+
+        # The pairings ready for a chunk, most rounds left first. An
+        # entry is stale once the rounds left of its pairing change.
+        self.__ready = [(-pairing.remaining, number)
+                        for number, pairing in enumerate(self.__pairings)]
+        heapq.heapify(self.__ready)
+
+        try:
+            idle = list(connections)
+            busy = []
+
+            while True:
+                while idle:
+                    chunk = self.__next_chunk()
+                    if chunk is None:
+                        break
+
+                    connection = idle.pop()
+                    connection.send(chunk)
+                    busy.append(connection)
+
+                if not busy:
+                    break
+
+                for connection in wait(busy):
+                    busy.remove(connection)
+                    idle.append(connection)
+
+                    try:
+                        result = connection.recv()
+
+                    except EOFError:
+                        raise RuntimeError('A worker process exited unexpectedly')
+
+                    if isinstance(result, Exception):
+                        raise result
+
+                    self.__record(result)
+
+        finally:
+            for connection in connections:
+                try:
+                    connection.send(None)
+
+                except OSError:
+                    pass  # The worker has already exited
+
+                connection.close()
+
+            for process in processes:
+                process.join()
+
+    def __next_chunk(self):
+        """
+        Chooses the next chunk to hand out
+
+        :return: The arguments to run_chunk() which describe the chunk,
+        after the warriors, settings and core, or None if no pairing
+        is ready
+        """
+
+        while self.__ready:
+            remaining, number = heapq.heappop(self.__ready)
+            pairing = self.__pairings[number]
+
+            if pairing.ready and -remaining == pairing.remaining:
+                break
+
+        else:
+            return None
+
+        rounds = self.__chunk_size(pairing)
+
+        chunk = (number, pairing.first, pairing.second,
+                 pairing.next_round, rounds, pairing.pspace)
+
+        pairing.next_round += rounds
+        pairing.remaining -= rounds
+        pairing.running += 1
+        self.__remaining -= rounds
+        self.chunks += 1
+
+        if pairing.ready:
+            heapq.heappush(self.__ready, (-pairing.remaining, number))
+
+        return chunk
+
+    def __chunk_size(self, pairing):
+        """
+        Returns the number of rounds in the next chunk of a pairing,
+        enough to take about the target time at the rate measured so
+        far, but no more than an even share of the remaining work
+
+        :param pairing: The Pairing
+
+        :return: The number of rounds
+        """
+
+        if pairing.rounds_timed > 0:
+            time_per_round = pairing.time / pairing.rounds_timed
+
+        elif self.__rounds_timed > 0:
+            # Until the pairing has been timed, assume it is average
+            time_per_round = self.busy_time / self.__rounds_timed
+
+        else:
+            # Nothing has been timed yet, so start small
+            return 1
+
+        rounds = int(self.target_time / time_per_round) if time_per_round > 0 else pairing.remaining
+
+        # Near the end of the tournament, split what remains evenly
+        share = math.ceil(self.__remaining / (2 * self.workers))
+
+        return max(1, min(rounds, share, pairing.remaining))
+
+    def __record(self, outcome):
+        """
+        Records the results of a chunk in its pairing
+
+        :param outcome: The value returned by run_chunk()
+        """
+
+        number, outcomes, pspace, elapsed = outcome
+        pairing = self.__pairings[number]
+
+        for survivors, cycles, seconds in outcomes:
+            pairing.result.record(survivors, cycles)
+
+            if self.metrics is not None:
+                self.metrics.record_round(cycles, seconds)
+
+        pairing.running -= 1
+        pairing.pspace = pspace
+        pairing.rounds_timed += len(outcomes)
+        pairing.time += elapsed
+        self.busy_time += elapsed
+        self.__rounds_timed += len(outcomes)
+
+        if self.metrics is not None:
+            self.metrics.queue_depth = self.__remaining
+
+            if pairing.remaining == 0 and pairing.running == 0:
+                self.metrics.record_battle()
+
+        # A serial pairing becomes ready again once its chunk is done
+        if pairing.serial and pairing.ready:
+            heapq.heappush(self.__ready, (-pairing.remaining, number))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from battle import Warrior
+
+    parser = argparse.ArgumentParser(description='Run a round-robin tournament')
+    parser.add_argument('warriors', nargs='+', help='Red Code files of the warriors')
+    parser.add_argument('--rounds', type=int, default=100, help='rounds per pairing')
+    parser.add_argument('--coresize', type=int, default=8000, help='size of the core')
+    parser.add_argument('--cycles', type=int, default=80000, help='maximum cycles per round')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes')
+    parser.add_argument('--metrics', default=None,
+                        help='file to which to write Prometheus metrics')
+    args = parser.parse_args()
+
+    metrics = None
+    if args.metrics is not None:
+        from metrics import Metrics
+
+        metrics = Metrics()
+
+    tournament = Tournament([Warrior.from_file(file) for file in args.warriors],
+                            rounds=args.rounds, workers=args.workers, metrics=metrics,
+                            coresize=args.coresize, max_cycles=args.cycles)
+    tournament.run()
+
+    if metrics is not None:
+        metrics.write(args.metrics)
+
+    for score, warrior in sorted(zip(tournament.scores(), tournament.warriors),
+                                 key=lambda entry: -entry[0]):
+        print('%-24s %d' % (warrior.name, score))
+
+    print('%d chunks in %.2fs, workers busy %.0f%% of the time'
+          % (tournament.chunks, tournament.elapsed,
+             100 * tournament.busy_time / (tournament.elapsed * tournament.workers)))
@@ -0,0 +1,161 @@
+#! /usr/bin/python
+
+"""
+Classes to trace the execution of Red Code programs. A trace
+holds the most recent executions in a ring buffer of fixed
+size, so that the events leading up to the death of a process
+can be examined. Each entry records the cycle, the number of
+the program, the address and opcode of the instruction, and
+the addresses to which its A and B operands resolved. Operands
+are resolved before the instruction is executed, and an absent
+operand is recorded as -1.
+
+The buffer is a set of integer arrays allocated when the trace
+is created, so recording an execution allocates nothing.
+
+>>> import sys
+>>> from tracer import Trace
+>>> from assemblytoken import AssemblyToken as Token
+>>> trace = Trace(2)
+>>> trace.record(0, 0, 100, Token.MOV, 100, 101)
+>>> trace.record(0, 1, 200, Token.JMP, 150, -1)
+>>> trace.record(1, 0, 101, Token.DAT, 101, 101)
+>>> print(len(trace), trace.count)
+2 3
+>>> print(trace.entries())
+[(0, 1, 200, 7, 150, -1), (1, 0, 101, 0, 101, 101)]
+>>> trace.dump(sys.stdout)
+cycle  program  address  opcode        a        b
+    0        1      200  JMP         150        -
+    1        0      101  DAT         101      101
+
+An interpreter keeps a trace when created with a trace size,
+and dumps it whenever a process dies.
+
+>>> from core import Core
+>>> from interpreter import Interpreter
+>>> core = Core(100)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 2, Token.INDIRECT, 2, 10)
+>>> core.put_instr(Token.JMP, Token.DIRECT, 1, Token.NULL, Token.NULL, 11)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 3, 12)
+>>> interpreter = Interpreter(core, [10], trace=8, trace_stream=sys.stdout)
+>>> print(interpreter.run())
+Process of program 0 died executing DAT at 12 in cycle 2
+cycle  program  address  opcode        a        b
+    0        0       10  MOV          12       15
+    1        0       11  JMP          12        -
+    2        0       12  DAT          12       12
+[]
+
+With limits, operands are resolved as the interpreter resolves
+them, so an address written through the B operand is folded
+within the write limit.
+
+>>> core = Core(100)
+>>> core.put_instr(Token.MOV, Token.DIRECT, 1, Token.DIRECT, 3, 10)
+>>> core.put_instr(Token.DAT, Token.IMMEDIATE, 0, Token.IMMEDIATE, 0, 11)
+>>> interpreter = Interpreter(core, [10], trace=8, trace_stream=sys.stdout,
+...                           read_limit=8, write_limit=4)
+>>> print(interpreter.run())
+Process of program 0 died executing DAT at 11 in cycle 1
+cycle  program  address  opcode        a        b
+    0        0       10  MOV          11        9
+    1        0       11  DAT          11       11
+[]
+>>> print(core.instruction(9))
+[0, 19, 0, 19, 0]
+"""
+
+from array import array
+
+from assemblytoken import AssemblyToken as Token
+
+
+class Trace:
+
+    def __init__(self, size):
+        """
+        Initialise the trace, with an empty ring buffer
+
+        :param size: The number of executions held in the buffer
+        """
+
+        if size < 1:
+            raise RuntimeError('Trace size must be at least 1')
+
+        self.size = size
+        self.count = 0  # Total number of executions recorded
+
+        # One array per field of the entries, indexed by position
+        # in the ring buffer
+        self.cycles = array('l', [0]) * size
+        self.programs = array('l', [0]) * size
+        self.addresses = array('l', [0]) * size
+        self.opcodes = array('l', [0]) * size
+        self.a_addresses = array('l', [0]) * size
+        self.b_addresses = array('l', [0]) * size
+
+    def __len__(self):
+        """
+        Returns the number of executions held in the buffer.
+        """
+
+        return min(self.count, self.size)
+
+    def record(self, cycle, program, address, opcode, a_address, b_address):
+        """
+        Records an execution, overwriting the oldest if
+        the buffer is full
+
+        :param cycle: The cycle in which the instruction was executed
+        :param program: The number of the program executing it
+        :param address: The address of the instruction
+        :param opcode: The numeric value representing the opcode
+        :param a_address: The address to which the A operand resolved
+        :param b_address: The address to which the B operand resolved
+        """
+
+        index = self.count % self.size
+
+        self.cycles[index] = cycle
+        self.programs[index] = program
+        self.addresses[index] = address
+        self.opcodes[index] = opcode
+        self.a_addresses[index] = a_address
+        self.b_addresses[index] = b_address
+
+        self.count += 1
+
+    def entries(self):
+        """
+        Returns the executions held in the buffer, oldest first
+
+        :return: A list of (cycle, program, address, opcode,
+        a_address, b_address) tuples
+        """
+
+        entries = []
+        for number in range(self.count - len(self), self.count):
+            index = number % self.size
+            entries.append((self.cycles[index], self.programs[index],
+                            self.addresses[index], self.opcodes[index],
+                            self.a_addresses[index], self.b_addresses[index]))
+
+        return entries
+
+    def dump(self, stream):
+        """
+        Writes the executions held in the buffer to a stream,
+        oldest first, as a table
+
+        :param stream: The stream to which to write
+        """
+
+        lines = ['cycle  program  address  opcode        a        b\n']
+        for cycle, program, address, opcode, a_address, b_address in self.entries():
+            lines.append('{:>5}  {:>7}  {:>7}  {:<6}  {:>7}  {:>7}\n'.format(
+                cycle, program, address, Token.catnames[opcode],
+                a_address if a_address >= 0 else '-',
+                b_address if b_address >= 0 else '-'))
+
+        stream.write(''.join(lines))